@@ -0,0 +1,36 @@
+"""Add materialized contact_clusters table
+
+Revision ID: 3f9c2a7d41b6
+Revises: 10ddfc97c838
+Create Date: 2026-10-16 09:12:05.318442
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f9c2a7d41b6'
+down_revision: Union[str, None] = '10ddfc97c838'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Populate with: python -m app.cli.backfill_clusters
+    op.create_table('contact_clusters',
+    sa.Column('primary_id', sa.Integer(), nullable=False),
+    sa.Column('emails', sa.JSON(), nullable=False),
+    sa.Column('phone_numbers', sa.JSON(), nullable=False),
+    sa.Column('secondary_ids', sa.JSON(), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['primary_id'], ['contacts.id'], ),
+    sa.PrimaryKeyConstraint('primary_id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('contact_clusters')
@@ -0,0 +1,38 @@
+"""Add contact_merges table recording the identifiers behind each merge
+
+Revision ID: 5d1e8a6f2c93
+Revises: 7b2e91c4d0a8
+Create Date: 2026-10-16 23:05:41.502317
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5d1e8a6f2c93'
+down_revision: Union[str, None] = '7b2e91c4d0a8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Merges made before this revision left no record; erasure only keeps
+    # those clusters together through shared identifiers
+    op.create_table('contact_merges',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('email', sa.String(), nullable=False),
+    sa.Column('phone_number', sa.String(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_contact_merges_email'), 'contact_merges', ['email'], unique=False)
+    op.create_index(op.f('ix_contact_merges_phone_number'), 'contact_merges', ['phone_number'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_contact_merges_phone_number'), table_name='contact_merges')
+    op.drop_index(op.f('ix_contact_merges_email'), table_name='contact_merges')
+    op.drop_table('contact_merges')
@@ -0,0 +1,51 @@
+"""Replace duplicate contact indexes with partial and composite ones
+
+Revision ID: 7b2e91c4d0a8
+Revises: 3f9c2a7d41b6
+Create Date: 2026-10-16 14:37:52.104118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7b2e91c4d0a8'
+down_revision: Union[str, None] = '3f9c2a7d41b6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+ACTIVE = sa.text('deleted_at IS NULL')
+
+
+def upgrade() -> None:
+    # Each of these duplicated another index (ix_contacts_id duplicates the primary key)
+    op.drop_index('idx_email', table_name='contacts')
+    op.drop_index('idx_phone_number', table_name='contacts')
+    op.drop_index('idx_linked_id', table_name='contacts')
+    op.drop_index(op.f('ix_contacts_email'), table_name='contacts')
+    op.drop_index(op.f('ix_contacts_phone_number'), table_name='contacts')
+    op.drop_index(op.f('ix_contacts_linked_id'), table_name='contacts')
+    op.drop_index(op.f('ix_contacts_id'), table_name='contacts')
+
+    op.create_index('ix_contacts_active_email', 'contacts', ['email'], unique=False,
+                    postgresql_where=ACTIVE, sqlite_where=ACTIVE)
+    op.create_index('ix_contacts_active_phone_number', 'contacts', ['phone_number'], unique=False,
+                    postgresql_where=ACTIVE, sqlite_where=ACTIVE)
+    op.create_index('ix_contacts_linked_id_created_at', 'contacts', ['linked_id', 'created_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_contacts_linked_id_created_at', table_name='contacts')
+    op.drop_index('ix_contacts_active_phone_number', table_name='contacts')
+    op.drop_index('ix_contacts_active_email', table_name='contacts')
+
+    op.create_index(op.f('ix_contacts_id'), 'contacts', ['id'], unique=False)
+    op.create_index(op.f('ix_contacts_linked_id'), 'contacts', ['linked_id'], unique=False)
+    op.create_index(op.f('ix_contacts_phone_number'), 'contacts', ['phone_number'], unique=False)
+    op.create_index(op.f('ix_contacts_email'), 'contacts', ['email'], unique=False)
+    op.create_index('idx_linked_id', 'contacts', ['linked_id'])
+    op.create_index('idx_phone_number', 'contacts', ['phone_number'])
+    op.create_index('idx_email', 'contacts', ['email'])
@@ -1,22 +1,74 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy.ext.asyncio import AsyncSession
-from app.schemas.request import IdentifyRequest
-from app.schemas.response import IdentifyResponse
-from app.services.identity_service import IdentityService
-from app.database import get_db
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import Response, StreamingResponse
+from pydantic import BaseModel
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from app.schemas.request import IdentifyRequest, BatchIdentifyRequest, EraseContactsRequest
+from app.schemas.response import IdentifyResponse, BatchIdentifyResponse, ContactMembersPage, EraseContactsResponse
+from app.services.identity_service import IdentityService, IdentifiersConflict, BrokenContactLink
+from app.services.identity_index import IdentityIndex, get_identity_index
+from app.services.contact_cache import ContactCache, contact_cache, get_contact_cache
+from app.services.identifier_locks import IdentifierLocks, get_identifier_locks
+from app.services.group_commit import GroupCommitWriter, get_group_commit_writer
+from app.services.single_flight import SingleFlight, identify_flights, get_identify_flights
+from app.services.identifier_filter import IdentifierFilter, identifier_filter, get_identifier_filter
+from app.services.contact_members import list_members, iter_clusters
+from app.services.contact_erasure import erase_contacts
+from app.services.sharding import ShardCoordinator, get_shard_coordinator
+from app.database import (
+    ReplicaRouter, get_db, get_session_factory, get_read_session_factory, get_replica_router, get_pool_stats
+)
+from typing import Optional
 
 # Create router instance
 router = APIRouter()
 
+def json_response(model: BaseModel) -> Response:
+    """Serialize a response model the service built itself
+    
+    Returning a Response bypasses FastAPI's response_model handling, which
+    would validate the model again, convert it to plain Python objects and
+    encode those with json.dumps. pydantic's serializer writes the same
+    compact JSON directly. The routes keep response_model for the schema.
+    """
+    return Response(content=model.model_dump_json(), media_type="application/json")
+
 @router.get("/health")
 async def health_check():
     """Health check endpoint for the API routes"""
     return {"status": "ok", "message": "API routes are working"}
 
+@router.get("/cache/stats")
+async def cache_stats():
+    """Hit, miss and eviction counters of the consolidated-response cache"""
+    return contact_cache.stats()
+
+@router.get("/db/pool/stats")
+async def pool_stats():
+    """Checkout, wait and occupancy counters of the database connection pool"""
+    return get_pool_stats()
+
+@router.get("/identifier-filter/stats")
+async def identifier_filter_stats():
+    """Size, fill and false positive rates of the negative-lookup filter"""
+    return identifier_filter.stats()
+
+@router.get("/identify/flights/stats")
+async def flight_stats():
+    """Leader and follower counts of coalesced identify calls"""
+    return identify_flights.stats()
+
 @router.post("/identify", response_model=IdentifyResponse, status_code=200)
 async def identify(
     request: IdentifyRequest,
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_db),
+    index: Optional[IdentityIndex] = Depends(get_identity_index),
+    cache: Optional[ContactCache] = Depends(get_contact_cache),
+    locks: Optional[IdentifierLocks] = Depends(get_identifier_locks),
+    replicas: Optional[ReplicaRouter] = Depends(get_replica_router),
+    writer: Optional[GroupCommitWriter] = Depends(get_group_commit_writer),
+    flights: Optional[SingleFlight] = Depends(get_identify_flights),
+    identifier_filter: Optional[IdentifierFilter] = Depends(get_identifier_filter),
+    shards: Optional[ShardCoordinator] = Depends(get_shard_coordinator)
 ) -> IdentifyResponse:
     """
     Identify and consolidate customer contact information.
@@ -34,12 +86,26 @@ async def identify(
     Args:
         request: IdentifyRequest containing email and/or phoneNumber
         db: Database session (injected by FastAPI)
+        index: Shared in-memory identity index (injected by FastAPI)
+        cache: Shared consolidated-response cache (injected by FastAPI)
+        locks: Shared identifier lock table (injected by FastAPI)
+        replicas: Read replica router, if a replica is configured (injected by FastAPI)
+        writer: Group-commit writer, if group commit is enabled (injected by FastAPI)
+        flights: Shared table of in-flight identify calls (injected by FastAPI)
+        identifier_filter: Shared filter of known identifiers (injected by FastAPI)
+        shards: Shard coordinator, if contacts are sharded (injected by FastAPI)
     
     Returns:
         IdentifyResponse with consolidated contact information
     """
-    # Initialize the identity service with the database session
-    identity_service = IdentityService(db)
+    if shards is not None:
+        return json_response(await shards.identify(request.email, request.phoneNumber))
+    
+    # Initialize the identity service with the database session and the shared index
+    identity_service = IdentityService(
+        db, index=index, cache=cache, locks=locks, replicas=replicas, writer=writer, flights=flights,
+        identifier_filter=identifier_filter
+    )
     
     # Process the customer contact information
     customer_response = await identity_service.identify_contact(
@@ -48,4 +114,182 @@ async def identify(
     )
     
     # Return the consolidated customer information
-    return customer_response
\ No newline at end of file
+    return json_response(customer_response)
+
+@router.get("/identity", response_model=IdentifyResponse, status_code=200)
+async def lookup_identity(
+    email: Optional[str] = Query(None, description="Customer's email address"),
+    phone: Optional[str] = Query(None, description="Customer's phone number"),
+    db: AsyncSession = Depends(get_db),
+    index: Optional[IdentityIndex] = Depends(get_identity_index),
+    cache: Optional[ContactCache] = Depends(get_contact_cache),
+    replicas: Optional[ReplicaRouter] = Depends(get_replica_router),
+    identifier_filter: Optional[IdentifierFilter] = Depends(get_identifier_filter),
+    shards: Optional[ShardCoordinator] = Depends(get_shard_coordinator)
+) -> IdentifyResponse:
+    """
+    Look up a customer without creating or linking contacts.
+    
+    Returns the same consolidated contact as POST /identify for a known
+    customer, but never writes: unknown identifiers give 404, an email and
+    phone belonging to two different customers give 409, and a cluster whose
+    links point at a missing contact gives 500.
+    """
+    if not email and not phone:
+        raise HTTPException(status_code=422, detail="At least one of email or phone must be provided")
+    
+    identity_service = IdentityService(
+        db, index=index, cache=cache, replicas=replicas, identifier_filter=identifier_filter
+    )
+    try:
+        if shards is not None:
+            response = await shards.lookup(email, phone)
+        else:
+            response = await identity_service.lookup_contact(email, phone)
+    except IdentifiersConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except BrokenContactLink as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if response is None:
+        raise HTTPException(status_code=404, detail="Contact not found")
+    return json_response(response)
+
+@router.post("/identify/batch", response_model=BatchIdentifyResponse, status_code=200)
+async def identify_batch(
+    request: BatchIdentifyRequest,
+    db: AsyncSession = Depends(get_db),
+    index: Optional[IdentityIndex] = Depends(get_identity_index),
+    cache: Optional[ContactCache] = Depends(get_contact_cache),
+    locks: Optional[IdentifierLocks] = Depends(get_identifier_locks),
+    replicas: Optional[ReplicaRouter] = Depends(get_replica_router),
+    identifier_filter: Optional[IdentifierFilter] = Depends(get_identifier_filter),
+    shards: Optional[ShardCoordinator] = Depends(get_shard_coordinator)
+) -> BatchIdentifyResponse:
+    """
+    Identify many customers in a single transaction.
+    
+    Items are applied in request order, so each result is identical to what
+    a sequential POST /identify call would have returned. Clusters are
+    loaded with set-based queries and the batch is committed once.
+    
+    Args:
+        request: BatchIdentifyRequest containing the items to identify
+        db: Database session (injected by FastAPI)
+        index: Shared in-memory identity index (injected by FastAPI)
+        cache: Shared consolidated-response cache (injected by FastAPI)
+        locks: Shared identifier lock table (injected by FastAPI)
+        replicas: Read replica router, if a replica is configured (injected by FastAPI)
+        identifier_filter: Shared filter of known identifiers (injected by FastAPI)
+        shards: Sharded storage, if configured (injected by FastAPI)
+    
+    Returns:
+        BatchIdentifyResponse with one consolidated contact per item
+    """
+    if shards is not None:
+        raise HTTPException(status_code=501, detail="Batch identify is not available with sharded storage")
+    identity_service = IdentityService(
+        db, index=index, cache=cache, locks=locks, replicas=replicas, identifier_filter=identifier_filter
+    )
+    results = await identity_service.identify_batch(
+        [(item.email, item.phoneNumber) for item in request.items]
+    )
+    return json_response(BatchIdentifyResponse.model_construct(results=results))
+
+@router.post("/identify/batch/stream", status_code=200)
+async def identify_batch_stream(
+    request: BatchIdentifyRequest,
+    session_factory: async_sessionmaker = Depends(get_session_factory),
+    index: Optional[IdentityIndex] = Depends(get_identity_index),
+    cache: Optional[ContactCache] = Depends(get_contact_cache),
+    locks: Optional[IdentifierLocks] = Depends(get_identifier_locks),
+    replicas: Optional[ReplicaRouter] = Depends(get_replica_router),
+    identifier_filter: Optional[IdentifierFilter] = Depends(get_identifier_filter),
+    shards: Optional[ShardCoordinator] = Depends(get_shard_coordinator)
+) -> StreamingResponse:
+    """
+    Streaming variant of the batch endpoint.
+    
+    Emits one IdentifyResponse per line (NDJSON) as soon as each item is
+    resolved. The batch is still a single transaction: it is committed after
+    the last line, and a failure aborts the stream and rolls everything back.
+    """
+    if shards is not None:
+        raise HTTPException(status_code=501, detail="Batch identify is not available with sharded storage")
+    pairs = [(item.email, item.phoneNumber) for item in request.items]
+    
+    async def generate_results():
+        # The session must live as long as the stream, not the request handler
+        async with session_factory() as db:
+            identity_service = IdentityService(
+                db, index=index, cache=cache, locks=locks, replicas=replicas, identifier_filter=identifier_filter
+            )
+            async for response in identity_service.iter_identify_batch(pairs):
+                yield response.model_dump_json() + "\n"
+    
+    return StreamingResponse(generate_results(), media_type="application/x-ndjson")
+
+@router.post("/contacts/erase", response_model=EraseContactsResponse, status_code=200)
+async def erase(
+    request: EraseContactsRequest,
+    session_factory: async_sessionmaker = Depends(get_session_factory),
+    index: Optional[IdentityIndex] = Depends(get_identity_index),
+    cache: Optional[ContactCache] = Depends(get_contact_cache),
+    replicas: Optional[ReplicaRouter] = Depends(get_replica_router),
+    locks: Optional[IdentifierLocks] = Depends(get_identifier_locks),
+    shards: Optional[ShardCoordinator] = Depends(get_shard_coordinator)
+) -> EraseContactsResponse:
+    """
+    Erase every contact carrying one of the emails or phone numbers.
+    
+    Contacts are soft-deleted, in one transaction per chunk of identifiers.
+    A cluster that loses the record bridging two of its groups is split, and
+    the oldest contact of each group becomes its primary. Only the clusters
+    touching the identifiers are recomputed.
+    """
+    if shards is not None:
+        raise HTTPException(status_code=501, detail="Erasure is not available with sharded storage")
+    erased_ids, primary_ids = await erase_contacts(
+        session_factory, request.emails, request.phoneNumbers,
+        index=index, cache=cache, replicas=replicas, locks=locks
+    )
+    return json_response(EraseContactsResponse.model_construct(erasedContactIds=erased_ids, primaryContactIds=primary_ids))
+
+@router.get("/contacts/export", status_code=200)
+async def export_contacts(
+    session_factory: async_sessionmaker = Depends(get_read_session_factory)
+) -> StreamingResponse:
+    """
+    Export every cluster as NDJSON, one consolidated contact per line.
+    
+    The contacts table is read with server-side cursors in chunks, so the
+    export runs in bounded memory however many contacts there are. It is
+    served by the read replica unless that lags too far behind.
+    """
+    async def generate_clusters():
+        # The session must live as long as the stream, not the request handler
+        async with session_factory() as db:
+            async for contact in iter_clusters(db):
+                yield contact.model_dump_json() + "\n"
+    
+    return StreamingResponse(generate_clusters(), media_type="application/x-ndjson")
+
+@router.get("/contacts/{primary_id}/members", response_model=ContactMembersPage, status_code=200)
+async def contact_members(
+    primary_id: int,
+    limit: int = Query(100, ge=1, le=1000, description="Members per page"),
+    cursor: Optional[str] = Query(None, description="nextCursor of the previous page"),
+    db: AsyncSession = Depends(get_db)
+) -> ContactMembersPage:
+    """
+    List the contacts of a cluster page by page, oldest first.
+    
+    Uses keyset pagination on (createdAt, id), so deep pages of very large
+    clusters are as cheap as the first one.
+    """
+    try:
+        page = await list_members(db, primary_id, limit=limit, cursor=cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if page is None:
+        raise HTTPException(status_code=404, detail="Primary contact not found")
+    return page
@@ -0,0 +1,113 @@
+"""
+Backfill the materialized contact_clusters table
+
+Rebuilds one summary row per active primary contact from the contacts
+table. Run it once after applying the migration that adds the table, and
+after bulk imports.
+
+Usage:
+    python -m app.cli.backfill_clusters [--chunk-size 1000] [--only-missing]
+
+Primaries are processed in id order, one transaction per chunk, so the
+command can be interrupted and re-run safely.
+"""
+
+import argparse
+import sys
+import time
+from collections import defaultdict
+from typing import Optional, List
+
+from sqlalchemy import create_engine, select, delete, insert
+from app.config import settings
+from app.models.contact import Contact, ContactCluster
+from app.services.contact_graph import summarize_cluster
+
+
+def backfill_clusters(database_url: str, chunk_size: int = 1000, only_missing: bool = False) -> int:
+    """Rebuild cluster summaries and return the number of rows written"""
+    clusters = ContactCluster.__table__
+    engine = create_engine(database_url)
+    written = 0
+    started = time.perf_counter()
+    try:
+        with engine.connect() as connection:
+            last_id = 0
+            while True:
+                primaries = connection.execute(
+                    select(Contact.id, Contact.email, Contact.phone_number, Contact.created_at)
+                    .where(
+                        Contact.link_precedence == "primary",
+                        Contact.deleted_at.is_(None),
+                        Contact.id > last_id
+                    )
+                    .order_by(Contact.id)
+                    .limit(chunk_size)
+                ).all()
+                if not primaries:
+                    break
+                primary_ids = [primary.id for primary in primaries]
+                last_id = primary_ids[-1]
+
+                versions = dict(connection.execute(
+                    select(clusters.c.primary_id, clusters.c.version)
+                    .where(clusters.c.primary_id.in_(primary_ids))
+                ).all())
+                if only_missing:
+                    primaries = [primary for primary in primaries if primary.id not in versions]
+                    primary_ids = [primary.id for primary in primaries]
+
+                secondaries_by_primary = defaultdict(list)
+                for secondary in connection.execute(
+                    select(Contact.id, Contact.email, Contact.phone_number, Contact.created_at, Contact.linked_id)
+                    .where(
+                        Contact.linked_id.in_(primary_ids),
+                        Contact.link_precedence == "secondary",
+                        Contact.deleted_at.is_(None)
+                    )
+                    .order_by(Contact.id)
+                ):
+                    secondaries_by_primary[secondary.linked_id].append(secondary)
+
+                rows = []
+                for primary in primaries:
+                    emails, phone_numbers, secondary_ids = summarize_cluster(
+                        primary, secondaries_by_primary[primary.id]
+                    )
+                    rows.append({
+                        "primary_id": primary.id,
+                        "emails": emails,
+                        "phone_numbers": phone_numbers,
+                        "secondary_ids": secondary_ids,
+                        # Bump versions so stale in-flight updates fail their optimistic check
+                        "version": versions.get(primary.id, 0) + 1,
+                    })
+
+                if rows:
+                    connection.execute(delete(clusters).where(clusters.c.primary_id.in_(primary_ids)))
+                    connection.execute(insert(clusters), rows)
+                connection.commit()
+
+                written += len(rows)
+                elapsed = max(time.perf_counter() - started, 1e-9)
+                print(f"Backfilled {written} clusters ({written / elapsed:.0f} clusters/sec)")
+    finally:
+        engine.dispose()
+
+    return written
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Rebuild the contact_clusters summary table")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="Primaries per transaction")
+    parser.add_argument("--only-missing", action="store_true", help="Skip clusters that already have a row")
+    parser.add_argument("--database-url", default=settings.sync_database_url, help="Synchronous SQLAlchemy URL")
+    args = parser.parse_args(argv)
+
+    total = backfill_clusters(args.database_url, chunk_size=args.chunk_size, only_missing=args.only_missing)
+    print(f"Done: {total} cluster summaries written")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,393 @@
+"""
+Streaming bulk importer for historical orders
+
+Reads CSV or NDJSON files of (email, phoneNumber, timestamp) records and
+writes them into the ``contacts`` table with the same primary/secondary
+semantics as ``IdentityService``, without going through the HTTP API.
+
+Usage:
+    python -m app.cli.import_contacts orders.csv [--chunk-size 5000]
+
+Records are processed in file order with bounded memory: each chunk is
+resolved against the stored clusters its emails and phone numbers touch,
+so only the chunk and those clusters are kept in memory, however large the
+table is. After every chunk the importer commits and writes a checkpoint,
+so an interrupted run can be resumed by running the same command again.
+
+Cluster summaries touched by the import are dropped; run
+``python -m app.cli.backfill_clusters --only-missing`` afterwards to rebuild
+them. Running services keep their own in-memory index; restart them after
+an import so they pick up the new rows.
+
+On PostgreSQL the ids of each chunk's new rows come from the ``contacts``
+id sequence, so the service may keep inserting while the import runs. On
+other databases (SQLite) ids continue from the largest id stored when the
+chunk starts: stop the service first, or a row it inserts meanwhile makes
+the chunk fail with a duplicate id (the chunk is rolled back and the next
+run resumes it). Either way the importer doesn't take the service's
+identifier locks, so a customer identified while their history is being
+imported can end up with two clusters until a request with identifiers
+from both merges them.
+"""
+
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Optional, List, Dict, Tuple, Iterator
+
+from sqlalchemy import create_engine, insert, update, delete, select, func, text, Connection
+from app.config import settings
+from app.models.contact import Contact, ContactCluster, ContactMerge
+from app.services.contact_graph import CLUSTER_QUERY_CHUNK_SIZE, build_cluster_query
+from app.services.identity_index import IdentityIndex
+
+# A single input record: (email, phone_number, created_at)
+Record = Tuple[Optional[str], Optional[str], datetime]
+
+EMAIL_COLUMNS = ("email",)
+PHONE_COLUMNS = ("phoneNumber", "phone_number", "phone")
+TIMESTAMP_COLUMNS = ("timestamp", "createdAt", "created_at")
+
+COPY_COLUMNS = ("id", "email", "phone_number", "linked_id", "link_precedence", "created_at", "updated_at")
+
+# Postgres drivers whose cursors can stream COPY FROM STDIN; others use INSERT
+COPY_DRIVERS = ("psycopg2", "psycopg")
+
+
+def parse_timestamp(value: Optional[str]) -> datetime:
+    """Parse an ISO-8601 timestamp into naive UTC, defaulting to now"""
+    if not value:
+        return datetime.utcnow()
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def _first_present(record: Dict, columns: Tuple[str, ...]) -> Optional[str]:
+    for column in columns:
+        value = record.get(column)
+        if value not in (None, ""):
+            return str(value).strip()
+    return None
+
+
+def read_records(path: str, file_format: str) -> Iterator[Record]:
+    """Stream records from a CSV or NDJSON file, one at a time"""
+    with open(path, newline="", encoding="utf-8") as handle:
+        if file_format == "csv":
+            rows = csv.DictReader(handle)
+        else:
+            rows = (json.loads(line) for line in handle if line.strip())
+
+        for row in rows:
+            email = _first_present(row, EMAIL_COLUMNS)
+            phone_number = _first_present(row, PHONE_COLUMNS)
+            yield (
+                email.lower() if email else None,
+                phone_number,
+                parse_timestamp(_first_present(row, TIMESTAMP_COLUMNS))
+            )
+
+
+class ClusterBuilder:
+    """Offline version of the identify_contact scenarios
+
+    Mirrors ``IdentityService.identify_with_index``: the same identifier
+    index decides between a new primary, an exact match, a partial match
+    (new secondary) and a merge of two primaries (older one wins). Instead of
+    writing immediately, the resulting inserts and re-links are buffered so
+    they can be written in bulk. One builder handles one chunk, over an index
+    of the clusters that chunk touches (see load_chunk_index).
+    """
+
+    def __init__(self, index: IdentityIndex, primary_created_at: Dict[int, datetime], next_id: int):
+        self.index = index
+        self.primary_created_at = primary_created_at
+        self.next_id = next_id
+        self.inserts: List[Dict] = []
+        # (newer primary id, older primary id), in the order they happened
+        self.relinks: List[Tuple[int, int]] = []
+        # Evidence rows for the merges (see ContactMerge)
+        self.merges: List[Dict] = []
+
+    def apply(self, email: Optional[str], phone_number: Optional[str], created_at: datetime) -> None:
+        """Apply one record in arrival order"""
+        if not email and not phone_number:
+            return
+
+        email_primary_id = self.index.primary_for_email(email)
+        phone_primary_id = self.index.primary_for_phone(phone_number)
+
+        if email_primary_id is None and phone_primary_id is None:
+            # Scenario A: New primary contact
+            contact_id = self._insert(email, phone_number, None, "primary", created_at)
+            self.index.add_contact(contact_id, email, phone_number, contact_id)
+            self.primary_created_at[contact_id] = created_at
+        elif self.index.contact_for_pair(email, phone_number) is not None:
+            # Scenario C: Exact match, nothing to write
+            return
+        elif email_primary_id is not None and phone_primary_id is not None and email_primary_id != phone_primary_id:
+            # Scenario D: Older primary absorbs the newer one
+            if self.primary_created_at[email_primary_id] <= self.primary_created_at[phone_primary_id]:
+                older_id, newer_id = email_primary_id, phone_primary_id
+            else:
+                older_id, newer_id = phone_primary_id, email_primary_id
+            self.relinks.append((newer_id, older_id))
+            self.merges.append({"email": email, "phone_number": phone_number, "created_at": created_at})
+            self.index.merge(older_id, newer_id)
+            del self.primary_created_at[newer_id]
+        else:
+            # Scenario B: Partial match, add a secondary if any identifier is new
+            primary_id = email_primary_id if email_primary_id is not None else phone_primary_id
+            if (email and email_primary_id is None) or (phone_number and phone_primary_id is None):
+                contact_id = self._insert(email, phone_number, primary_id, "secondary", created_at)
+                self.index.add_contact(contact_id, email, phone_number, primary_id)
+
+    def _insert(self, email: Optional[str], phone_number: Optional[str], linked_id: Optional[int],
+                link_precedence: str, created_at: datetime) -> int:
+        contact_id = self.next_id
+        self.next_id += 1
+        self.inserts.append({
+            "id": contact_id,
+            "email": email,
+            "phone_number": phone_number,
+            "linked_id": linked_id,
+            "link_precedence": link_precedence,
+            "created_at": created_at,
+            "updated_at": created_at,
+        })
+        return contact_id
+
+    def drain(self) -> Tuple[List[Dict], List[Tuple[int, int]], List[Dict]]:
+        """Hand over buffered writes and start a new chunk"""
+        inserts, relinks, merges = self.inserts, self.relinks, self.merges
+        self.inserts, self.relinks, self.merges = [], [], []
+        return inserts, relinks, merges
+
+
+def load_chunk_index(connection: Connection, records: List[Record]) -> Tuple[IdentityIndex, Dict[int, datetime]]:
+    """Index the stored clusters a chunk of records can match or merge
+
+    Returns the index and the creation time of each of its primaries. The
+    same cluster query as identify is used, split like load_contact_graph so
+    the IN lists stay within driver parameter limits.
+    """
+    emails = list(dict.fromkeys(email for email, _, _ in records if email))
+    phone_numbers = list(dict.fromkeys(phone_number for _, phone_number, _ in records if phone_number))
+
+    index = IdentityIndex()
+    index.begin_load()
+    primary_created_at: Dict[int, datetime] = {}
+    for start in range(0, max(len(emails), len(phone_numbers)), CLUSTER_QUERY_CHUNK_SIZE):
+        query = build_cluster_query(
+            emails[start:start + CLUSTER_QUERY_CHUNK_SIZE],
+            phone_numbers[start:start + CLUSTER_QUERY_CHUNK_SIZE]
+        ).with_only_columns(
+            Contact.id, Contact.email, Contact.phone_number, Contact.linked_id,
+            Contact.link_precedence, Contact.created_at
+        ).where(Contact.deleted_at.is_(None))
+        for row in connection.execute(query):
+            index.load_row(row.id, row.email, row.phone_number, row.linked_id, row.link_precedence)
+            if row.link_precedence == "primary":
+                primary_created_at[row.id] = row.created_at
+    index.finish_load()
+    return index, primary_created_at
+
+
+def copy_contacts(connection: Connection, rows: List[Dict]) -> None:
+    """Bulk insert rows with COPY on Postgres (psycopg2 or psycopg 3)"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([
+            "" if row[column] is None else (
+                row[column].isoformat() if isinstance(row[column], datetime) else row[column]
+            )
+            for column in COPY_COLUMNS
+        ])
+    buffer.seek(0)
+
+    statement = f"COPY contacts ({', '.join(COPY_COLUMNS)}) FROM STDIN WITH (FORMAT csv)"
+    cursor = connection.connection.cursor()
+    try:
+        if connection.dialect.driver == "psycopg2":
+            cursor.copy_expert(statement, buffer)
+        else:
+            with cursor.copy(statement) as copy:
+                copy.write(buffer.getvalue())
+    finally:
+        cursor.close()
+
+
+def write_chunk(connection: Connection, inserts: List[Dict], relinks: List[Tuple[int, int]],
+                merges: List[Dict] = ()) -> None:
+    """Write one chunk of buffered inserts followed by its re-links and merge evidence"""
+    if inserts:
+        if connection.dialect.name == "postgresql" and connection.dialect.driver in COPY_DRIVERS:
+            copy_contacts(connection, inserts)
+        else:
+            connection.execute(insert(Contact.__table__), inserts)
+
+    # Summaries of clusters that gained members or were merged are now stale
+    touched_primary_ids = {row["linked_id"] for row in inserts if row["linked_id"] is not None}
+    for newer_id, older_id in relinks:
+        touched_primary_ids.update((newer_id, older_id))
+    if touched_primary_ids:
+        clusters = ContactCluster.__table__
+        connection.execute(delete(clusters).where(clusters.c.primary_id.in_(touched_primary_ids)))
+
+    if relinks:
+        now = datetime.utcnow()
+        contacts = Contact.__table__
+        # Repoint the demoted primary's secondaries first, then demote it,
+        # in merge order so chained merges end up on the final primary
+        for newer_id, older_id in relinks:
+            connection.execute(
+                update(contacts)
+                .where(contacts.c.linked_id == newer_id)
+                .values(linked_id=older_id, updated_at=now)
+            )
+            connection.execute(
+                update(contacts)
+                .where(contacts.c.id == newer_id)
+                .values(linked_id=older_id, link_precedence="secondary", updated_at=now)
+            )
+    if merges:
+        connection.execute(insert(ContactMerge.__table__), list(merges))
+
+
+def reserve_ids(connection: Connection, inserts: List[Dict], relinks: List[Tuple[int, int]]) -> None:
+    """Give a chunk's new rows ids drawn from the Postgres id sequence
+
+    The builder numbers new rows past the largest stored id. On Postgres
+    those ids are swapped for values taken from the ``contacts`` sequence,
+    the one the running service draws from, so rows it inserts during the
+    import can't collide with imported ones. Values are assigned in
+    ascending order, so ids still follow the order records were applied in.
+    """
+    if connection.dialect.name != "postgresql" or not inserts:
+        return
+    reserved = connection.scalars(
+        text("SELECT nextval(pg_get_serial_sequence('contacts', 'id')) FROM generate_series(1, :count)"),
+        {"count": len(inserts)}
+    ).all()
+    ids = dict(zip((row["id"] for row in inserts), sorted(reserved)))
+    for row in inserts:
+        row["id"] = ids[row["id"]]
+        row["linked_id"] = ids.get(row["linked_id"], row["linked_id"])
+    relinks[:] = [(ids.get(newer_id, newer_id), ids.get(older_id, older_id)) for newer_id, older_id in relinks]
+
+
+def load_checkpoint(checkpoint_path: str, source_path: str) -> int:
+    """Return the number of records already imported from this source"""
+    if not os.path.exists(checkpoint_path):
+        return 0
+    with open(checkpoint_path, encoding="utf-8") as handle:
+        checkpoint = json.load(handle)
+    if checkpoint.get("source") != os.path.abspath(source_path):
+        return 0
+    return int(checkpoint.get("records_done", 0))
+
+
+def save_checkpoint(checkpoint_path: str, source_path: str, records_done: int) -> None:
+    """Atomically record progress after a committed chunk"""
+    temp_path = f"{checkpoint_path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as handle:
+        json.dump({
+            "source": os.path.abspath(source_path),
+            "records_done": records_done,
+            "updated_at": datetime.utcnow().isoformat(),
+        }, handle)
+    os.replace(temp_path, checkpoint_path)
+
+
+def import_contacts(
+    path: str,
+    database_url: str,
+    file_format: Optional[str] = None,
+    chunk_size: int = 5000,
+    checkpoint_path: Optional[str] = None
+) -> int:
+    """
+    Import a file of historical records and return the number processed.
+
+    Each chunk is one transaction: the stored clusters its identifiers touch
+    are loaded first, so the import merges correctly with data already in
+    the table, including rows written by earlier chunks. New rows get their
+    ids per chunk (see reserve_ids). A checkpoint follows every commit. Replaying a chunk after a crash is harmless:
+    already imported records resolve as exact or partial matches and
+    produce no new rows.
+    """
+    file_format = file_format or ("csv" if path.lower().endswith(".csv") else "ndjson")
+    checkpoint_path = checkpoint_path or f"{path}.checkpoint"
+    records_done = load_checkpoint(checkpoint_path, path)
+
+    engine = create_engine(database_url)
+    try:
+        with engine.connect() as connection:
+            started = time.perf_counter()
+            processed = 0
+            chunk: List[Record] = []
+
+            def flush() -> None:
+                nonlocal processed
+                with connection.begin():
+                    index, primary_created_at = load_chunk_index(connection, chunk)
+                    # Read after the clusters, so no loaded row can have a new row's id
+                    next_id = (connection.scalar(select(func.max(Contact.id))) or 0) + 1
+                    builder = ClusterBuilder(index, primary_created_at, next_id)
+                    for email, phone_number, created_at in chunk:
+                        builder.apply(email, phone_number, created_at)
+                    inserts, relinks, merges = builder.drain()
+                    reserve_ids(connection, inserts, relinks)
+                    write_chunk(connection, inserts, relinks, merges)
+                processed += len(chunk)
+                chunk.clear()
+                save_checkpoint(checkpoint_path, path, records_done + processed)
+                elapsed = max(time.perf_counter() - started, 1e-9)
+                print(f"Imported {records_done + processed} records "
+                      f"({processed / elapsed:.0f} records/sec)")
+
+            for position, record in enumerate(read_records(path, file_format)):
+                if position < records_done:
+                    continue
+                chunk.append(record)
+                if len(chunk) >= chunk_size:
+                    flush()
+
+            if chunk:
+                flush()
+    finally:
+        engine.dispose()
+
+    return records_done + processed
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Bulk import historical orders into the contacts table")
+    parser.add_argument("path", help="CSV or NDJSON file with email, phoneNumber and timestamp fields")
+    parser.add_argument("--format", choices=["csv", "ndjson"], help="Input format (default: from file extension)")
+    parser.add_argument("--chunk-size", type=int, default=5000, help="Records per transaction")
+    parser.add_argument("--checkpoint", help="Checkpoint file (default: <path>.checkpoint)")
+    parser.add_argument("--database-url", default=settings.sync_database_url, help="Synchronous SQLAlchemy URL")
+    args = parser.parse_args(argv)
+
+    total = import_contacts(
+        args.path,
+        args.database_url,
+        file_format=args.format,
+        chunk_size=args.chunk_size,
+        checkpoint_path=args.checkpoint
+    )
+    print(f"Done: {total} records imported from {args.path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -20,6 +20,10 @@ class Settings(BaseSettings):
         default=True,
         description="Enable debug mode with detailed logging"
     )
+    sql_stats_headers: bool = Field(
+        default=False,
+        description="Add X-SQL-Statements and X-SQL-Commits headers to non-streaming responses"
+    )
     host: str = Field(
         default="0.0.0.0",
         description="Host address to bind the server to"
@@ -28,30 +32,188 @@ class Settings(BaseSettings):
         default=8000,
         description="Port number to bind the server to"
     )
+    workers: int = Field(
+        default=1,
+        description="Worker processes started by run.py; with more than one they share the identity index in memory"
+    )
+    shared_index_path: str = Field(
+        default="",
+        description="File backing the identity index shared by workers (default: in /dev/shm or the temp directory)"
+    )
+    shared_index_capacity: int = Field(
+        default=250000,
+        description="Contacts the shared identity index is sized for; beyond that workers fall back to SQL lookups"
+    )
+    shard_urls: str = Field(
+        default="",
+        description="Comma-separated database URLs of the contact shards; empty keeps all contacts in DATABASE_URL"
+    )
+    shard_directory_url: str = Field(
+        default="",
+        description="Database of the identifier directory used with shards (default: DATABASE_URL)"
+    )
+    identity_index_enabled: bool = Field(
+        default=True,
+        description="Serve identifier lookups from the in-memory union-find index; misses are always re-checked in SQL"
+    )
+    identity_locking_enabled: bool = Field(
+        default=True,
+        description="Serialize concurrent identify calls that share an email or phone"
+    )
+    contact_cache_enabled: bool = Field(
+        default=False,
+        description="Cache consolidated contact responses in process memory; only safe while this "
+                    "process (or the workers run.py started with it) is the only writer of the contacts table"
+    )
+    contact_cache_max_entries: int = Field(
+        default=10000,
+        description="Maximum number of cache entries before LRU eviction"
+    )
+    contact_cache_ttl_seconds: float = Field(
+        default=300.0,
+        description="Time to live of each cache entry in seconds"
+    )
+    db_pool_size: int = Field(
+        default=10,
+        description="Connections kept open per process (server databases only)"
+    )
+    db_max_overflow: int = Field(
+        default=20,
+        description="Extra connections allowed above the pool size under load"
+    )
+    db_pool_timeout: float = Field(
+        default=30.0,
+        description="Seconds to wait for a free connection before failing"
+    )
+    db_pool_recycle: int = Field(
+        default=1800,
+        description="Replace connections older than this many seconds (-1 disables)"
+    )
+    db_pool_pre_ping: bool = Field(
+        default=True,
+        description="Check connections for liveness when they are checked out"
+    )
+    db_statement_cache_size: int = Field(
+        default=100,
+        description="Prepared statements cached per asyncpg connection (0 for PgBouncer transaction mode)"
+    )
+    read_replica_url: str = Field(
+        default="",
+        description="Connection string of a read replica for pure reads (empty disables replica routing)"
+    )
+    replica_max_lag_seconds: float = Field(
+        default=1.0,
+        description="Send reads to the primary while the replica lags further behind than this"
+    )
+    replica_read_your_writes_seconds: float = Field(
+        default=5.0,
+        description="Read clusters this process changed from the primary for this many seconds"
+    )
+    replica_lag_check_interval_seconds: float = Field(
+        default=1.0,
+        description="How long a replica lag measurement is reused before querying it again"
+    )
+    identifier_filter_enabled: bool = Field(
+        default=False,
+        description="Skip the lookup query for emails and phones a Bloom filter has never seen; "
+                    "only safe while this process is the only writer of the contacts table"
+    )
+    identifier_filter_path: str = Field(
+        default="identifier_filter.bin",
+        description="File the identifier filter is saved to and restored from (empty disables persistence)"
+    )
+    identifier_filter_capacity: int = Field(
+        default=1000000,
+        description="Identifiers the filter is sized for before it is rebuilt larger"
+    )
+    identifier_filter_error_rate: float = Field(
+        default=0.01,
+        description="Target false positive rate of the identifier filter"
+    )
+    identify_coalescing_enabled: bool = Field(
+        default=True,
+        description="Let concurrent identify calls for the same email and phone share one execution"
+    )
+    group_commit_enabled: bool = Field(
+        default=False,
+        description="Queue identify writes and commit them in micro-batches from one writer task"
+    )
+    group_commit_max_batch: int = Field(
+        default=64,
+        description="Identify calls committed together at most"
+    )
+    group_commit_max_delay_ms: float = Field(
+        default=2.0,
+        description="Longest time a queued identify call waits for its batch to fill up"
+    )
+    chain_flatten_interval_seconds: float = Field(
+        default=3600.0,
+        description="Seconds between background runs flattening multi-hop linked_id chains (0 disables)"
+    )
+    schema_create_if_unversioned: bool = Field(
+        default=False,
+        description="Create tables from the models at startup when the database has no Alembic version; "
+                    "for local development only, deployed databases are migrated with `alembic upgrade head`"
+    )
+    warmup_enabled: bool = Field(
+        default=True,
+        description="Open db_pool_size connections and precompile the hot statements before reporting ready"
+    )
+    warmup_cache_clusters: int = Field(
+        default=0,
+        description="Most recently updated clusters to load into the response cache during warm-up (0 disables)"
+    )
     
     @property
     def async_database_url(self) -> str:
         """Get the async database URL for SQLAlchemy
         
-        Handles Render deployment by converting PostgreSQL URLs to async format.
+        Handles Render deployment by converting PostgreSQL URLs to the asyncpg driver.
         Prioritizes DATABASE_URL environment variable (Render) over database_url setting.
         """
         # Check if DATABASE_URL is provided by Render
         render_database_url = os.environ.get("DATABASE_URL")
         if render_database_url and render_database_url.strip():
-            if render_database_url.startswith("postgresql://"):
-                return render_database_url.replace("postgresql://", "postgresql+psycopg2://")
-            return render_database_url
+            return self._with_async_driver(render_database_url)
         
         # Fallback to the database_url setting
         if self.database_url and self.database_url.strip():
-            if self.database_url.startswith("postgresql://"):
-                return self.database_url.replace("postgresql://", "postgresql+psycopg2://")
-            return self.database_url
+            return self._with_async_driver(self.database_url)
         
         # Final fallback to SQLite for local development
         return "sqlite+aiosqlite:///./bitespeed.db"
     
+    @staticmethod
+    def _with_async_driver(url: str) -> str:
+        """Point plain or synchronous PostgreSQL URLs at asyncpg"""
+        for prefix in ("postgresql+psycopg2://", "postgresql://", "postgres://"):
+            if url.startswith(prefix):
+                return "postgresql+asyncpg://" + url[len(prefix):]
+        return url
+    
+    @property
+    def async_read_replica_url(self) -> str:
+        """Get the async URL of the read replica, or an empty string when none is configured"""
+        if self.read_replica_url and self.read_replica_url.strip():
+            return self._with_async_driver(self.read_replica_url)
+        return ""
+    
+    @property
+    def sync_database_url(self) -> str:
+        """Get a synchronous database URL for CLI tools and migrations
+        
+        Strips the async driver from async_database_url so the same database
+        can be used with a regular SQLAlchemy engine.
+        """
+        url = self.async_database_url
+        if url.startswith("postgresql+psycopg2://"):
+            return url.replace("postgresql+psycopg2://", "postgresql://")
+        if url.startswith("postgresql+asyncpg://"):
+            return url.replace("postgresql+asyncpg://", "postgresql://")
+        if url.startswith("sqlite+aiosqlite://"):
+            return url.replace("sqlite+aiosqlite://", "sqlite://")
+        return url
+    
     class Config:
         env_file = ".env"
 
@@ -1,12 +1,130 @@
-from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+import inspect
+import time
+from functools import wraps
+from contextlib import asynccontextmanager
+from sqlalchemy import event, exc, text
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncEngine, AsyncSession
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from app.config import settings
+from app.metrics import registry, gauge_lines, count_statements, RequestStats, REPLICA_ROUTING
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Union
+
+
+class PoolMetrics:
+    """Checkout and wait counters for a connection pool
+    
+    ``wait`` is the time spent inside the pool handing out a connection:
+    waiting for a free one plus opening a new one when the pool grows.
+    Compare ``checked_out`` and ``wait_seconds_max`` against pool_size and
+    max_overflow when sizing the pool for the number of uvicorn workers.
+    """
+    
+    def __init__(self):
+        self.checkouts = 0
+        self.checkins = 0
+        self.connects = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+    
+    def record_wait(self, seconds: float) -> None:
+        self.wait_seconds_total += seconds
+        self.wait_seconds_max = max(self.wait_seconds_max, seconds)
+    
+    def snapshot(self, pool: Any) -> Dict[str, Any]:
+        """Counters plus the pool's current occupancy"""
+        stats = {
+            "checkouts": self.checkouts,
+            "checkins": self.checkins,
+            "connects": self.connects,
+            "timeouts": self.timeouts,
+            "wait_seconds_total": round(self.wait_seconds_total, 6),
+            "wait_seconds_max": round(self.wait_seconds_max, 6),
+            "wait_seconds_avg": round(self.wait_seconds_total / self.checkouts, 6) if self.checkouts else 0.0,
+        }
+        if isinstance(pool, AsyncAdaptedQueuePool):
+            stats.update(
+                pool_size=pool.size(),
+                checked_out=pool.checkedout(),
+                overflow=pool.overflow(),
+                idle=pool.checkedin(),
+            )
+        return stats
+
+
+# Counters for the application engine's pool
+pool_metrics = PoolMetrics()
+
+
+class InstrumentedAsyncPool(AsyncAdaptedQueuePool):
+    """Queue pool that records how long checkouts wait"""
+    
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            pool_metrics.timeouts += 1
+            raise
+        finally:
+            pool_metrics.record_wait(time.perf_counter() - started)
+
+
+def engine_options(database_url: str) -> Dict[str, Any]:
+    """Pool and driver options for create_async_engine
+    
+    SQLite keeps SQLAlchemy's default pool; server databases get the
+    instrumented queue pool sized from settings, and asyncpg gets its
+    prepared statement cache size.
+    """
+    url = make_url(database_url)
+    if url.get_backend_name() == "sqlite":
+        return {}
+    
+    options: Dict[str, Any] = {
+        "poolclass": InstrumentedAsyncPool,
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_timeout": settings.db_pool_timeout,
+        "pool_recycle": settings.db_pool_recycle,
+        "pool_pre_ping": settings.db_pool_pre_ping,
+    }
+    if url.get_driver_name() == "asyncpg":
+        options["connect_args"] = {
+            # asyncpg's own cache and SQLAlchemy's per-connection cache
+            "statement_cache_size": settings.db_statement_cache_size,
+            "prepared_statement_cache_size": settings.db_statement_cache_size,
+        }
+    return options
+
+
+def instrument_pool(bind: Union[AsyncEngine, Engine]) -> None:
+    """Count connects, checkouts and checkins through pool events"""
+    sync_engine = bind.sync_engine if isinstance(bind, AsyncEngine) else bind
+    
+    @event.listens_for(sync_engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        pool_metrics.connects += 1
+    
+    @event.listens_for(sync_engine, "checkout")
+    def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+        pool_metrics.checkouts += 1
+    
+    @event.listens_for(sync_engine, "checkin")
+    def _on_checkin(dbapi_connection, connection_record):
+        pool_metrics.checkins += 1
+
 
 # Create async engine
 engine = create_async_engine(
     settings.async_database_url,
     echo=settings.debug,
-    future=True
+    future=True,
+    **engine_options(settings.async_database_url)
 )
+instrument_pool(engine)
+count_statements(engine)
 
 # Create async session factory
 AsyncSessionLocal = async_sessionmaker(
@@ -14,7 +132,237 @@ AsyncSessionLocal = async_sessionmaker(
     expire_on_commit=False
 )
 
+# Optional read replica for pure reads; the pool is not instrumented so
+# pool_metrics keeps describing the primary
+replica_engine: Optional[AsyncEngine] = None
+ReplicaSessionLocal: Optional[async_sessionmaker] = None
+if settings.async_read_replica_url:
+    replica_engine = create_async_engine(
+        settings.async_read_replica_url,
+        echo=settings.debug,
+        future=True,
+        **{
+            key: value for key, value in engine_options(settings.async_read_replica_url).items()
+            if key != "poolclass"
+        }
+    )
+    count_statements(replica_engine)
+    ReplicaSessionLocal = async_sessionmaker(replica_engine, expire_on_commit=False)
+
+
+# Replication delay reported by a PostgreSQL standby; 0 when fully replayed
+# or when the database is not a standby at all
+POSTGRES_LAG_QUERY = text(
+    "SELECT COALESCE(CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END, 0)"
+)
+
+
+class ReplicaRouter:
+    """Decide whether a pure read may be served by the read replica
+    
+    Reads go to the primary when the replica lags more than
+    ``max_lag_seconds`` (measured at most once per ``lag_check_interval``)
+    or touch a cluster this process changed within the last
+    ``read_your_writes_seconds``. The window never drops below the allowed
+    lag, so replica reads can be cached like primary reads.
+    """
+    
+    # Recent writes tracked before expired entries are pruned
+    MAX_TRACKED_WRITES = 100000
+    
+    def __init__(
+        self,
+        replica_factory: async_sessionmaker,
+        max_lag_seconds: float = 1.0,
+        read_your_writes_seconds: float = 5.0,
+        lag_check_interval: float = 1.0
+    ):
+        self.replica_factory = replica_factory
+        self.max_lag_seconds = max_lag_seconds
+        self.read_your_writes_seconds = max(read_your_writes_seconds, max_lag_seconds)
+        self.lag_check_interval = lag_check_interval
+        self.lag_seconds: Optional[float] = None
+        self._lag_checked_at = float("-inf")
+        self._written_at: Dict[int, float] = {}
+    
+    def record_writes(self, primary_ids: Iterable[int]) -> None:
+        """Remember clusters whose changes were just committed"""
+        now = time.monotonic()
+        for primary_id in primary_ids:
+            self._written_at[primary_id] = now
+        if len(self._written_at) > self.MAX_TRACKED_WRITES:
+            cutoff = now - self.read_your_writes_seconds
+            self._written_at = {
+                primary_id: written_at for primary_id, written_at in self._written_at.items()
+                if written_at > cutoff
+            }
+    
+    def recently_written(self, primary_ids: Iterable[int]) -> bool:
+        """Check whether any of the clusters changed inside the read-your-writes window"""
+        cutoff = time.monotonic() - self.read_your_writes_seconds
+        return any(self._written_at.get(primary_id, cutoff) > cutoff for primary_id in primary_ids)
+    
+    async def measure_lag(self) -> float:
+        """Query the replica for its replication delay in seconds"""
+        async with self.replica_factory() as session:
+            if session.bind.dialect.name != "postgresql":
+                return 0.0
+            return float(await session.scalar(POSTGRES_LAG_QUERY))
+    
+    async def replica_usable(self) -> bool:
+        """Check the (cached) replica lag against max_lag_seconds"""
+        now = time.monotonic()
+        if now - self._lag_checked_at >= self.lag_check_interval:
+            self._lag_checked_at = now
+            try:
+                self.lag_seconds = await self.measure_lag()
+            except Exception:
+                # An unreachable replica counts as infinitely behind
+                self.lag_seconds = None
+        return self.lag_seconds is not None and self.lag_seconds <= self.max_lag_seconds
+    
+    @asynccontextmanager
+    async def read_session(self, primary_ids: Iterable[int] = ()) -> AsyncIterator[Optional[AsyncSession]]:
+        """Yield a replica session, or None when the primary must serve the read"""
+        if self.recently_written(primary_ids):
+            REPLICA_ROUTING.inc("primary_recent_write")
+            yield None
+        elif not await self.replica_usable():
+            REPLICA_ROUTING.inc("primary_lagging")
+            yield None
+        else:
+            REPLICA_ROUTING.inc("replica")
+            async with self.replica_factory() as session:
+                yield session
+
+
+# Routes pure reads when a replica is configured
+replica_router: Optional[ReplicaRouter] = None
+if ReplicaSessionLocal is not None:
+    replica_router = ReplicaRouter(
+        ReplicaSessionLocal,
+        max_lag_seconds=settings.replica_max_lag_seconds,
+        read_your_writes_seconds=settings.replica_read_your_writes_seconds,
+        lag_check_interval=settings.replica_lag_check_interval_seconds
+    )
+
 # Dependency to get DB session
 async def get_db():
     async with AsyncSessionLocal() as session:
-        yield session
\ No newline at end of file
+        yield session
+
+# Dependency to get the session factory for handlers that outlive the request scope
+def get_session_factory() -> async_sessionmaker:
+    return AsyncSessionLocal
+
+# Dependency to get the replica router, or None without a replica
+def get_replica_router() -> Optional[ReplicaRouter]:
+    return replica_router
+
+# Dependency to get a session factory for long pure reads such as exports,
+# pointing at the replica unless it lags too far behind
+async def get_read_session_factory() -> async_sessionmaker:
+    if replica_router is not None and await replica_router.replica_usable():
+        REPLICA_ROUTING.inc("replica")
+        return replica_router.replica_factory
+    if replica_router is not None:
+        REPLICA_ROUTING.inc("primary_lagging")
+    return AsyncSessionLocal
+
+# Pool counters and occupancy of the application engine
+def get_pool_stats() -> Dict[str, Any]:
+    return pool_metrics.snapshot(engine.pool)
+
+
+def _collect_pool_metrics() -> List[str]:
+    """Expose the pool stats as db_pool_* gauges on /metrics"""
+    lines: List[str] = []
+    for name, value in get_pool_stats().items():
+        lines.extend(gauge_lines(f"db_pool_{name}", f"Connection pool {name.replace('_', ' ')}", value))
+    return lines
+
+
+registry.add_collector(_collect_pool_metrics)
+
+
+class StatementBudgetExceeded(AssertionError):
+    """Raised when a block issues more SQL statements or commits than allowed"""
+
+
+class StatementCounter:
+    """Count SQL statements and commits the current task issues through an engine
+    
+    Usage:
+        with StatementCounter(engine) as counter:
+            await service.identify_contact(email, phone_number)
+        assert counter.commits == 1
+    
+    Counting goes through the per-request RequestStats, so concurrent
+    requests and background tasks (warm-up, chain flattening) are not
+    counted; tasks started inside the block are. Every statement is
+    recorded (executemany counts once, as a single round trip), and
+    statements credited by the group-commit writer add to ``count``. With
+    ``max_statements`` or ``max_commits`` the block raises
+    StatementBudgetExceeded, listing the SQL it ran, when it goes over
+    budget. It also works as a decorator on sync and async functions:
+    
+        with StatementCounter(engine, 6, max_commits=1):
+            await service.identify_contact(email, phone_number)
+    
+        @StatementCounter(engine, 6)
+        async def merge_two_customers(): ...
+    """
+    
+    def __init__(self, bind: Union[AsyncEngine, Engine], max_statements: Optional[int] = None,
+                 max_commits: Optional[int] = None):
+        self.engine = bind.sync_engine if isinstance(bind, AsyncEngine) else bind
+        self.max_statements = max_statements
+        self.max_commits = max_commits
+        self._stats = RequestStats(record=True, engine=self.engine)
+        count_statements(self.engine)
+    
+    @property
+    def statements(self) -> List[str]:
+        return self._stats.queries
+    
+    @property
+    def count(self) -> int:
+        return self._stats.statements
+    
+    @property
+    def commits(self) -> int:
+        return self._stats.commits
+    
+    def __enter__(self) -> "StatementCounter":
+        self._stats.__enter__()
+        return self
+    
+    def __exit__(self, exc_type, exc, traceback) -> None:
+        self._stats.__exit__(exc_type, exc, traceback)
+        if exc_type is not None:
+            return
+        if self.max_statements is not None and self.count > self.max_statements:
+            raise StatementBudgetExceeded(
+                f"{self.count} SQL statements issued, budget is {self.max_statements}:\n"
+                + "\n".join(f"  {statement.strip()}" for statement in self.statements)
+            )
+        if self.max_commits is not None and self.commits > self.max_commits:
+            raise StatementBudgetExceeded(
+                f"{self.commits} commits issued, budget is {self.max_commits}"
+            )
+    
+    def __call__(self, func):
+        counter_args = (self.engine, self.max_statements, self.max_commits)
+        if inspect.iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with StatementCounter(*counter_args):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+        
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with StatementCounter(*counter_args):
+                return func(*args, **kwargs)
+        return wrapper
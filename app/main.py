@@ -1,7 +1,17 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
+from fastapi.responses import JSONResponse
 from app.api.routes import router
-from app.database import engine
-from app.models.contact import Base
+from app.database import engine, AsyncSessionLocal, ReplicaSessionLocal, replica_router
+from app.config import settings
+from app.services.identity_index import get_identity_index
+from app.services.contact_cache import get_contact_cache
+from app.services.chain_flattener import run_chain_flattener
+from app.services.group_commit import group_commit_writer
+from app.services.identifier_filter import identifier_filter, get_identifier_filter
+from app.services.identifier_locks import get_identifier_locks
+from app.services.sharding import get_shard_coordinator
+from app.startup import startup_report, check_schema_version, run_warmup
+from app import metrics
 from datetime import datetime
 import asyncio
 
@@ -19,21 +29,114 @@ app = FastAPI(
     },
 )
 
-# Initialize database tables on startup
+# Check the schema, load in-memory state and start warming up
 @app.on_event("startup")
 async def startup_event():
-    """Create database tables if they don't exist"""
-    # Import here to avoid circular imports
-    from sqlalchemy import text
-    # Use a simple approach that doesn't require greenlet
-    try:
-        async with engine.connect() as conn:
-            # Create tables using SQLAlchemy's metadata
-            await conn.run_sync(Base.metadata.create_all)
-            await conn.commit()
-    except Exception as e:
-        print(f"Warning: Could not create tables automatically: {e}")
-        # Continue anyway, as tables might already exist
+    """Verify the schema version, hydrate the index and filter, then warm up in the background
+    
+    Index and filter hydration finish before the first request is served,
+    because requests keep them up to date as they write. Warm-up only saves
+    latency, so it runs while the server already answers /health, and
+    /ready reports ready once it is done. Each phase's duration is logged.
+    """
+    with startup_report.phase("schema_check"):
+        try:
+            startup_report.schema_status = await check_schema_version(
+                engine, create_if_unversioned=settings.schema_create_if_unversioned
+            )
+        except Exception as e:
+            startup_report.schema_status = "error"
+            print(f"Warning: Could not check the database schema version: {e}")
+    if startup_report.schema_status == "outdated":
+        print("Warning: Database schema is behind the migrations, run `alembic upgrade head`")
+    elif startup_report.schema_status == "unmigrated":
+        print("Warning: Database has never been migrated, run `alembic upgrade head`")
+    
+    # Create the shard and directory tables and finish merges a crash interrupted
+    shard_coordinator = get_shard_coordinator()
+    if shard_coordinator is not None:
+        with startup_report.phase("shard_recovery"):
+            try:
+                await shard_coordinator.create_schema()
+                recovered = await shard_coordinator.recover()
+                if recovered:
+                    print(f"Finished {recovered} interrupted cross-shard merges")
+            except Exception as e:
+                print(f"Warning: Could not recover shard migrations, requests will finish them: {e}")
+    
+    # Hydrate the in-memory identifier index from the contacts table; with
+    # several workers the first one builds the shared index for all of them
+    identity_index = get_identity_index()
+    if identity_index is not None:
+        with startup_report.phase("hydrate_index"):
+            try:
+                async with AsyncSessionLocal() as session:
+                    await identity_index.hydrate(session)
+            except Exception as e:
+                identity_index.clear()
+                print(f"Warning: Could not hydrate identity index, falling back to SQL lookups: {e}")
+    
+    # Restore the negative-lookup filter from disk and catch up on newer contacts
+    if get_identifier_filter() is not None:
+        with startup_report.phase("hydrate_identifier_filter"):
+            try:
+                if settings.identifier_filter_path:
+                    identifier_filter.load(settings.identifier_filter_path)
+                async with AsyncSessionLocal() as session:
+                    await identifier_filter.hydrate(session)
+                if settings.identifier_filter_path:
+                    identifier_filter.save(settings.identifier_filter_path)
+            except Exception as e:
+                identifier_filter.reset(identifier_filter.capacity)
+                print(f"Warning: Could not build identifier filter, every request will run its lookup query: {e}")
+    
+    # Periodically flatten multi-hop linked_id chains left by older data; with
+    # several workers only the one holding the flattener lock does the work
+    if settings.chain_flatten_interval_seconds > 0:
+        flattener_lock_path = None
+        if settings.workers > 1:
+            from app.services.shared_index import worker_file_path
+            flattener_lock_path = worker_file_path("flattener")
+        app.state.chain_flattener = asyncio.create_task(run_chain_flattener(
+            AsyncSessionLocal, settings.chain_flatten_interval_seconds,
+            cache=get_contact_cache(), replicas=replica_router, lock_path=flattener_lock_path,
+            locks=get_identifier_locks()
+        ))
+    
+    # Open pool connections, precompile hot statements and fill the cache
+    if settings.warmup_enabled:
+        app.state.warmup = asyncio.create_task(run_warmup(
+            startup_report, AsyncSessionLocal, settings.db_pool_size,
+            replica_factory=ReplicaSessionLocal, cache=get_contact_cache(),
+            cache_clusters=settings.warmup_cache_clusters
+        ))
+    else:
+        startup_report.finish()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop background jobs and the group-commit writer, and persist the identifier filter"""
+    startup_report.ready = False
+    for name in ("warmup", "chain_flattener"):
+        task = getattr(app.state, name, None)
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+    await group_commit_writer.close()
+    
+    # Save the filter with this run's inserts so the next start only catches up
+    if settings.identifier_filter_path and identifier_filter.ready:
+        try:
+            identifier_filter.save(settings.identifier_filter_path)
+        except OSError as e:
+            print(f"Warning: Could not save identifier filter: {e}")
+
+# Report the SQL issued by each request, only when asked for
+if settings.sql_stats_headers:
+    app.add_middleware(metrics.SQLStatsHeaders)
 
 # Mount API routes under /api prefix
 app.include_router(router, prefix="/api")
@@ -54,4 +157,14 @@ async def health_check():
         "status": "healthy", 
         "timestamp": datetime.utcnow().isoformat()
     }
-    return health_status
\ No newline at end of file
+    return health_status
+
+@app.get("/ready")
+async def readiness_check():
+    """Readiness probe: 503 until startup warm-up is done and the schema is usable"""
+    return JSONResponse(startup_report.stats(), status_code=200 if startup_report.ready else 503)
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Prometheus metrics: per-scenario latency, step timings, SQL per request and pool stats"""
+    return Response(content=metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
@@ -0,0 +1,351 @@
+"""
+Prometheus metrics for the identify hot path
+
+A deliberately small implementation of the Prometheus text exposition
+format (counters and fixed-bucket histograms with labels), so recording an
+observation is a dict lookup, a bisect and two additions. ``GET /metrics``
+renders everything registered in ``registry``.
+
+SQL statements and commits are attributed to the request that issued them
+through a context variable, so concurrent requests don't see each other's
+queries.
+"""
+
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from functools import wraps
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+class Counter:
+    """Monotonic counter with optional labels"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labelvalues: str, amount: float = 1) -> None:
+        self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def value(self, *labelvalues: str) -> float:
+        return self._values.get(labelvalues, 0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        if not self.labelnames and not self._values:
+            lines.append(f"{self.name} 0")
+        for labelvalues, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labelvalues)} {_format_value(value)}")
+        return lines
+
+
+class Gauge:
+    """Unlabeled value that can go up and down"""
+
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self._value = 0.0
+
+    def set(self, value: float) -> None:
+        self._value = value
+
+    def value(self) -> float:
+        return self._value
+
+    def render(self) -> List[str]:
+        return gauge_lines(self.name, self.documentation, self._value)
+
+
+class Histogram:
+    """Fixed-bucket histogram with optional labels
+
+    Observations are stored per bucket and only made cumulative when
+    rendered, so ``observe`` touches a single bucket.
+    """
+
+    def __init__(self, name: str, documentation: str, buckets: Sequence[float], labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(sorted(buckets))
+        self.labelnames = tuple(labelnames)
+        # labels -> [per-bucket counts (last one is +Inf), sum, count]
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *labelvalues: str) -> None:
+        series = self._series.get(labelvalues)
+        if series is None:
+            series = self._series[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def count(self, *labelvalues: str) -> int:
+        series = self._series.get(labelvalues)
+        return series[2] if series else 0
+
+    def sum(self, *labelvalues: str) -> float:
+        series = self._series.get(labelvalues)
+        return series[1] if series else 0.0
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        names = self.labelnames + ("le",)
+        for labelvalues, (counts, total, count) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                labels = _format_labels(names, labelvalues + (_format_value(bound),))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, labelvalues)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Registry:
+    """Metrics rendered by /metrics, plus collectors for values read on demand"""
+
+    def __init__(self):
+        self._metrics: List[Union[Counter, Gauge, Histogram]] = []
+        self._collectors: List[Callable[[], List[str]]] = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector: Callable[[], List[str]]) -> None:
+        """Register a function returning exposition lines at scrape time"""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            lines.extend(collector())
+        return "\n".join(lines) + "\n"
+
+
+def gauge_lines(name: str, documentation: str, value: float) -> List[str]:
+    """Exposition lines of an unlabeled gauge, for collectors"""
+    return [f"# HELP {name} {documentation}", f"# TYPE {name} gauge", f"{name} {_format_value(value)}"]
+
+
+registry = Registry()
+
+# Label for identify calls that finished without recording a scenario
+UNKNOWN_SCENARIO = "unknown"
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+IDENTIFY_DURATION = registry.register(Histogram(
+    "identify_request_duration_seconds",
+    "Latency of identify calls by scenario (A new, B partial, C exact, D merge, unknown)",
+    LATENCY_BUCKETS, ("scenario",)
+))
+STEP_DURATION = registry.register(Histogram(
+    "identify_step_duration_seconds",
+    "Time spent in IdentityService steps (nested steps are also counted in their caller)",
+    LATENCY_BUCKETS, ("step",)
+))
+STATEMENTS_PER_REQUEST = registry.register(Histogram(
+    "identify_sql_statements_per_request",
+    "SQL statements issued by one identify call",
+    (0, 1, 2, 3, 4, 5, 6, 8, 10, 15, 20, 50), ("scenario",)
+))
+COMMITS_PER_REQUEST = registry.register(Histogram(
+    "identify_sql_commits_per_request",
+    "Commits issued by one identify call",
+    (0, 1, 2, 3, 5), ("scenario",)
+))
+CHAIN_COMPRESSIONS = registry.register(Counter(
+    "contact_chain_compressions_total",
+    "Contacts repointed to their root primary while resolving a multi-hop chain"
+))
+CHAIN_MAX_DEPTH = registry.register(Gauge(
+    "contact_chain_max_depth",
+    "Deepest linked_id chain in hops found by the last chain flattening run (1 when flat)"
+))
+REPLICA_ROUTING = registry.register(Counter(
+    "db_read_routing_total",
+    "Pure reads by where they were served (replica, or primary and why)",
+    ("route",)
+))
+SINGLE_FLIGHT_CALLS = registry.register(Counter(
+    "identify_single_flight_calls_total",
+    "Identify calls that ran the work (leader) or shared a concurrent identical call's result (follower)",
+    ("role",)
+))
+IDENTIFIER_FILTER_CHECKS = registry.register(Counter(
+    "identifier_filter_checks_total",
+    "Negative-lookup filter checks by result (miss skips the query; false_positive is a maybe that found nothing)",
+    ("result",)
+))
+GROUP_COMMIT_BATCH_SIZE = registry.register(Histogram(
+    "identify_group_commit_batch_size",
+    "Identify calls committed together by the group-commit writer",
+    (1, 2, 4, 8, 16, 32, 64, 128, 256)
+))
+CLUSTER_SIZE = registry.register(Histogram(
+    "identify_cluster_size",
+    "Contacts in the cluster returned by an identify call",
+    (1, 2, 3, 5, 10, 20, 50, 100, 250, 1000)
+))
+
+
+_request_stats: ContextVar[Optional["RequestStats"]] = ContextVar("request_stats", default=None)
+
+
+class RequestStats:
+    """SQL activity of the current request or service call
+
+    Used as ``with track_request() as stats:``; statements and commits
+    issued inside the block by the current task are counted on ``stats``.
+    Blocks can be nested: an outer block also counts everything its inner
+    blocks see. With ``record=True`` the SQL text is kept in ``queries``;
+    with an ``engine`` only that engine's statements and commits count.
+    """
+
+    __slots__ = ("statements", "commits", "queries", "engine", "_parent", "_token")
+
+    def __init__(self, record: bool = False, engine: Optional[Engine] = None):
+        self.statements = 0
+        self.commits = 0
+        self.queries: Optional[List[str]] = [] if record else None
+        self.engine = engine
+
+    def __enter__(self) -> "RequestStats":
+        self._parent = _request_stats.get()
+        self._token = _request_stats.set(self)
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        _request_stats.reset(self._token)
+
+
+# A plain class is cheaper to enter than a generator-based context manager
+track_request = RequestStats
+
+
+def _on_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _request_stats.get()
+    while stats is not None:
+        if stats.engine is None or stats.engine is conn.engine:
+            stats.statements += 1
+            if stats.queries is not None:
+                stats.queries.append(statement)
+        stats = stats._parent
+
+
+def _on_commit(conn):
+    stats = _request_stats.get()
+    while stats is not None:
+        if stats.engine is None or stats.engine is conn.engine:
+            stats.commits += 1
+        stats = stats._parent
+
+
+def add_request_statements(statements: int, commits: int) -> None:
+    """Count SQL another task issued on behalf of the current request"""
+    stats = _request_stats.get()
+    while stats is not None:
+        stats.statements += statements
+        stats.commits += commits
+        stats = stats._parent
+
+
+def count_statements(bind: Union[AsyncEngine, Engine]) -> None:
+    """Feed statements and commits on an engine into the current RequestStats"""
+    engine = bind.sync_engine if isinstance(bind, AsyncEngine) else bind
+    if not event.contains(engine, "before_cursor_execute", _on_execute):
+        event.listen(engine, "before_cursor_execute", _on_execute)
+        event.listen(engine, "commit", _on_commit)
+
+
+class SQLStatsHeaders:
+    """ASGI middleware adding X-SQL-Statements and X-SQL-Commits headers
+
+    Headers go out before the body, so only responses sent as one body
+    message carry them; a streamed response keeps issuing SQL after its
+    headers are sent and is left without rather than given a partial count.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+
+        async def send_with_stats(message) -> None:
+            nonlocal start
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if start is not None:
+                if not message.get("more_body", False):
+                    start["headers"] = [
+                        *start.get("headers", ()),
+                        (b"x-sql-statements", str(stats.statements).encode()),
+                        (b"x-sql-commits", str(stats.commits).encode()),
+                    ]
+                await send(start)
+                start = None
+            await send(message)
+
+        with track_request() as stats:
+            await self.app(scope, receive, send_with_stats)
+
+
+def observe_identify(scenario: Optional[str], seconds: float, stats: RequestStats, cluster_size: int) -> None:
+    """Record one completed identify call, under UNKNOWN_SCENARIO if it has none"""
+    scenario = scenario or UNKNOWN_SCENARIO
+    IDENTIFY_DURATION.observe(seconds, scenario)
+    STATEMENTS_PER_REQUEST.observe(stats.statements, scenario)
+    COMMITS_PER_REQUEST.observe(stats.commits, scenario)
+    CLUSTER_SIZE.observe(cluster_size)
+
+
+def timed_step(step: str):
+    """Record the duration of an async IdentityService method"""
+    def decorator(func):
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                STEP_DURATION.observe(time.perf_counter() - started, step)
+        return wrapper
+    return decorator
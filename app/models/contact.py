@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index, JSON, text
 from sqlalchemy.orm import declarative_base, relationship
 from datetime import datetime
 
@@ -16,24 +16,20 @@ class Contact(Base):
     id = Column(
         Integer, 
         primary_key=True, 
-        index=True, 
         autoincrement=True
     )
     phone_number = Column(
         String, 
-        nullable=True, 
-        index=True
+        nullable=True
     )
     email = Column(
         String, 
-        nullable=True, 
-        index=True
+        nullable=True
     )
     linked_id = Column(
         Integer, 
         ForeignKey("contacts.id"), 
-        nullable=True, 
-        index=True
+        nullable=True
     )
     link_precedence = Column(
         String, 
@@ -58,9 +54,101 @@ class Contact(Base):
     # Self-referential relationship for linked contacts
     linked_contact = relationship("Contact", remote_side=[id], backref="secondary_contacts")
     
-    # Database indexes for improved query performance
+    # Indexes matching the hot query shapes:
+    # - identifier lookups only ever look at active rows, so the email and
+    #   phone indexes are partial on deleted_at IS NULL
+    # - secondaries are read by linked_id in created_at order (id breaks ties),
+    #   which the composite index serves without a sort; it also backs the
+    #   linked_id walk of the cluster query and the self-referencing foreign key
     __table_args__ = (
-        Index('idx_email', 'email'),
-        Index('idx_phone_number', 'phone_number'),
-        Index('idx_linked_id', 'linked_id'),
-    )
\ No newline at end of file
+        Index(
+            'ix_contacts_active_email', 'email',
+            postgresql_where=text('deleted_at IS NULL'),
+            sqlite_where=text('deleted_at IS NULL')
+        ),
+        Index(
+            'ix_contacts_active_phone_number', 'phone_number',
+            postgresql_where=text('deleted_at IS NULL'),
+            sqlite_where=text('deleted_at IS NULL')
+        ),
+        Index('ix_contacts_linked_id_created_at', 'linked_id', 'created_at', 'id'),
+    )
+
+
+class ContactCluster(Base):
+    """Materialized summary of a contact cluster
+    
+    One row per primary contact holding exactly what the consolidated
+    response needs: ordered emails, ordered phone numbers and secondary ids.
+    It is maintained by IdentityService in the same transaction as every
+    insert or merge, so reading a cluster costs a single row lookup.
+    
+    The version counter doubles as an optimistic lock: concurrent updates of
+    the same cluster fail instead of silently overwriting each other.
+    """
+    __tablename__ = "contact_clusters"
+    
+    primary_id = Column(
+        Integer, 
+        ForeignKey("contacts.id"), 
+        primary_key=True
+    )
+    emails = Column(
+        JSON, 
+        nullable=False, 
+        default=list
+    )
+    phone_numbers = Column(
+        JSON, 
+        nullable=False, 
+        default=list
+    )
+    secondary_ids = Column(
+        JSON, 
+        nullable=False, 
+        default=list
+    )
+    version = Column(
+        Integer, 
+        nullable=False
+    )
+    updated_at = Column(
+        DateTime, 
+        default=datetime.utcnow, 
+        onupdate=datetime.utcnow, 
+        nullable=False
+    )
+    
+    __mapper_args__ = {"version_id_col": version}
+
+
+class ContactMerge(Base):
+    """Evidence for a merge of two clusters (Scenario D)
+    
+    A merge writes no row carrying both identifiers; the request's email
+    and phone are recorded here instead. When contacts are erased, the
+    remaining ones only stay one cluster if they share an identifier or a
+    recorded pair still connects them.
+    """
+    __tablename__ = "contact_merges"
+    
+    id = Column(
+        Integer, 
+        primary_key=True, 
+        autoincrement=True
+    )
+    email = Column(
+        String, 
+        nullable=False, 
+        index=True
+    )
+    phone_number = Column(
+        String, 
+        nullable=False, 
+        index=True
+    )
+    created_at = Column(
+        DateTime, 
+        default=datetime.utcnow, 
+        nullable=False
+    )
@@ -0,0 +1,106 @@
+from sqlalchemy import Column, Integer, String, DateTime
+from sqlalchemy.orm import declarative_base
+from datetime import datetime
+
+# The directory lives in its own database, apart from the contact shards
+DirectoryBase = declarative_base()
+
+class IdentifierEntry(DirectoryBase):
+    """Global directory entry: which cluster, on which shard, holds an identifier
+
+    ``identifier`` is ``email:<lowercased email>`` or ``phone:<number>``.
+    The primary key doubles as a claim: inserting an entry for a new
+    identifier fails if a concurrent request already claimed it.
+    While the cluster is being moved by a cross-shard merge,
+    ``migration_id`` points at the ShardMigration doing it.
+    """
+    __tablename__ = "identifier_directory"
+
+    identifier = Column(
+        String,
+        primary_key=True
+    )
+    primary_id = Column(
+        Integer,
+        nullable=False,
+        index=True
+    )
+    shard = Column(
+        Integer,
+        nullable=False
+    )
+    migration_id = Column(
+        Integer,
+        nullable=True
+    )
+
+
+class ContactIdBlock(DirectoryBase):
+    """Global contact id counter, so ids stay unique across shards"""
+    __tablename__ = "contact_id_blocks"
+
+    name = Column(
+        String,
+        primary_key=True
+    )
+    next_id = Column(
+        Integer,
+        nullable=False
+    )
+
+
+class ShardMigration(DirectoryBase):
+    """Log of a cross-shard merge moving the newer cluster to the older primary's shard
+
+    ``state`` moves from ``prepared`` (nothing changed yet) to ``copied``
+    (the target shard committed the merged cluster and the directory points
+    at it) to ``done`` (the source shard's copy is deleted). An unfinished
+    migration is rolled forward by recovery.
+    """
+    __tablename__ = "shard_migrations"
+
+    id = Column(
+        Integer,
+        primary_key=True,
+        autoincrement=True
+    )
+    older_primary_id = Column(
+        Integer,
+        nullable=False
+    )
+    newer_primary_id = Column(
+        Integer,
+        nullable=False
+    )
+    source_shard = Column(
+        Integer,
+        nullable=False
+    )
+    target_shard = Column(
+        Integer,
+        nullable=False
+    )
+    # Identifiers of the request that tied the clusters together (see ContactMerge)
+    email = Column(
+        String,
+        nullable=True
+    )
+    phone_number = Column(
+        String,
+        nullable=True
+    )
+    state = Column(
+        String,
+        nullable=False
+    )
+    created_at = Column(
+        DateTime,
+        default=datetime.utcnow,
+        nullable=False
+    )
+    updated_at = Column(
+        DateTime,
+        default=datetime.utcnow,
+        onupdate=datetime.utcnow,
+        nullable=False
+    )
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field, model_validator
-from typing import Optional
+from typing import Optional, List
 
 class IdentifyRequest(BaseModel):
     """Request schema for identifying and consolidating customer contacts"""
@@ -21,4 +21,33 @@ class IdentifyRequest(BaseModel):
         return self
     
     class Config:
-        populate_by_name = True
\ No newline at end of file
+        populate_by_name = True
+
+class BatchIdentifyRequest(BaseModel):
+    """Request schema for identifying many contacts in one transaction"""
+    items: List[IdentifyRequest] = Field(
+        ...,
+        min_length=1,
+        max_length=10000,
+        description="Contacts to identify, applied in the given order"
+    )
+
+class EraseContactsRequest(BaseModel):
+    """Request schema for erasing every contact carrying the given identifiers"""
+    emails: List[str] = Field(
+        default_factory=list,
+        max_length=10000,
+        description="Email addresses whose contacts are erased"
+    )
+    phoneNumbers: List[str] = Field(
+        default_factory=list,
+        max_length=10000,
+        description="Phone numbers whose contacts are erased"
+    )
+    
+    @model_validator(mode='after')
+    def at_least_one_identifier(self):
+        """Ensure there is something to erase"""
+        if not self.emails and not self.phoneNumbers:
+            raise ValueError('At least one email or phone number must be provided')
+        return self
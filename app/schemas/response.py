@@ -1,5 +1,6 @@
 from pydantic import BaseModel, Field
-from typing import List
+from typing import List, Optional
+from datetime import datetime
 
 class ContactResponse(BaseModel):
     """Response schema containing consolidated contact information"""
@@ -20,10 +21,64 @@ class ContactResponse(BaseModel):
         ..., 
         description="IDs of secondary contact records linked to this primary"
     )
+    
+    @classmethod
+    def from_trusted(cls, primary_id: int, emails: List[str], phone_numbers: List[str],
+                     secondary_ids: List[int]) -> "ContactResponse":
+        """Build a response from values the service assembled itself, skipping validation"""
+        return cls.model_construct(
+            primaryContatctId=primary_id,
+            emails=emails,
+            phoneNumbers=phone_numbers,
+            secondaryContactIds=secondary_ids
+        )
 
 class IdentifyResponse(BaseModel):
     """Top-level response schema for the identity reconciliation endpoint"""
     contact: ContactResponse = Field(
         ..., 
         description="Consolidated contact information"
-    )
\ No newline at end of file
+    )
+    
+    @classmethod
+    def from_contact(cls, contact: ContactResponse) -> "IdentifyResponse":
+        """Wrap an already built ContactResponse, skipping validation"""
+        return cls.model_construct(contact=contact)
+
+class BatchIdentifyResponse(BaseModel):
+    """Response schema for the batch identity reconciliation endpoint"""
+    results: List[IdentifyResponse] = Field(
+        ...,
+        description="One consolidated contact per request item, in request order"
+    )
+
+class ContactMember(BaseModel):
+    """A single contact row belonging to a cluster"""
+    id: int = Field(..., description="ID of the contact record")
+    email: Optional[str] = Field(None, description="Email address of this record")
+    phoneNumber: Optional[str] = Field(None, description="Phone number of this record")
+    linkPrecedence: str = Field(..., description="'primary' or 'secondary'")
+    createdAt: datetime = Field(..., description="When the record was created")
+
+class ContactMembersPage(BaseModel):
+    """One page of a cluster's members, oldest first"""
+    primaryContactId: int = Field(..., description="ID of the cluster's primary contact")
+    members: List[ContactMember] = Field(
+        ...,
+        description="Members ordered by (createdAt, id); the primary comes first on the first page"
+    )
+    nextCursor: Optional[str] = Field(
+        None,
+        description="Pass as ?cursor= to get the next page; null on the last page"
+    )
+
+class EraseContactsResponse(BaseModel):
+    """Result of erasing contacts by identifier"""
+    erasedContactIds: List[int] = Field(
+        ...,
+        description="IDs of the contact records that were soft-deleted"
+    )
+    primaryContactIds: List[int] = Field(
+        ...,
+        description="Primary contact IDs of the clusters left behind, one per remaining group"
+    )
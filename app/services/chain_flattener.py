@@ -0,0 +1,191 @@
+import asyncio
+import fcntl
+import os
+from collections import defaultdict
+from contextlib import nullcontext
+from sqlalchemy import Row, select, update, literal
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from app.models.contact import Contact
+from app.services.contact_cache import ContactCache
+from app.services.identifier_locks import IdentifierLocks, identifier_keys
+from app.services.identity_service import IdentityService
+from app.database import ReplicaRouter
+from app.metrics import CHAIN_COMPRESSIONS, CHAIN_MAX_DEPTH
+from datetime import datetime
+from typing import Optional, List, Tuple, Dict
+
+# Root primaries examined per chunk; each chunk's deep clusters are flattened in one transaction
+FLATTEN_CHUNK_SIZE = 1000
+
+
+async def find_deep_links(db: AsyncSession, root_ids: List[int]) -> Tuple[List[Row], int]:
+    """
+    Return the members of the given roots' clusters that have a contact more
+    than one hop from the root, and the deepest chain among them in hops.
+
+    A recursive CTE walks ``linked_id`` downwards from the roots, so chains of
+    any depth are found without a query per hop. Rows carry ``id``,
+    ``linked_id``, ``email``, ``phone_number``, ``root_id`` and ``depth``
+    (0 for the root itself). Roots that are no longer primaries are skipped;
+    without any row deeper than one hop the depth is 1 (flat).
+    """
+    tree = (
+        select(
+            Contact.id, Contact.linked_id, Contact.email, Contact.phone_number,
+            Contact.id.label("root_id"), literal(0).label("depth")
+        )
+        .where(Contact.id.in_(root_ids), Contact.linked_id.is_(None))
+        .cte("link_tree", recursive=True)
+    )
+    tree = tree.union_all(
+        select(
+            Contact.id, Contact.linked_id, Contact.email, Contact.phone_number,
+            tree.c.root_id, tree.c.depth + 1
+        )
+        .join(tree, Contact.linked_id == tree.c.id)
+    )
+    rows = (await db.execute(select(tree).order_by(tree.c.root_id, tree.c.id))).all()
+    deep_roots = {row.root_id for row in rows if row.depth > 1}
+    max_depth = max((row.depth for row in rows), default=1)
+    return [row for row in rows if row.root_id in deep_roots], max(max_depth, 1)
+
+
+async def flatten_chains(
+    session_factory: async_sessionmaker,
+    cache: Optional[ContactCache] = None,
+    chunk_size: int = FLATTEN_CHUNK_SIZE,
+    replicas: Optional[ReplicaRouter] = None,
+    locks: Optional[IdentifierLocks] = None
+) -> int:
+    """
+    Repoint every contact of a multi-hop chain straight at its root primary.
+
+    Root primaries are walked ``chunk_size`` at a time, so only one chunk of
+    clusters is in memory. The deep clusters of a chunk are relinked in one
+    transaction holding the identifier locks of all their members, the lock
+    an identify call merging one of them would need. Under those locks the
+    roots are locked and the clusters read again; a root demoted by a
+    concurrent merge is left for the next run, and each UPDATE only touches
+    rows still linked inside the cluster it read. Returns the number of
+    contacts relinked; the deepest chain found before flattening is recorded
+    in the ``contact_chain_max_depth`` gauge.
+    """
+    relinked = 0
+    max_depth = 1
+    after_id = 0
+    while True:
+        async with session_factory() as session:
+            chunk = (await session.scalars(
+                select(Contact.id)
+                .where(Contact.linked_id.is_(None), Contact.id > after_id)
+                .order_by(Contact.id)
+                .limit(chunk_size)
+            )).all()
+            if not chunk:
+                break
+            after_id = chunk[-1]
+            members, depth = await find_deep_links(session, chunk)
+        max_depth = max(max_depth, depth)
+        if members:
+            relinked += await _flatten_clusters(session_factory, members, cache, replicas, locks)
+
+    CHAIN_MAX_DEPTH.set(max_depth)
+    CHAIN_COMPRESSIONS.inc(amount=relinked)
+    return relinked
+
+
+async def _flatten_clusters(
+    session_factory: async_sessionmaker,
+    members: List[Row],
+    cache: Optional[ContactCache],
+    replicas: Optional[ReplicaRouter],
+    locks: Optional[IdentifierLocks]
+) -> int:
+    """Relink the deep rows of the clusters ``members`` were read from, in one transaction"""
+    keys = identifier_keys(
+        (member.email for member in members), (member.phone_number for member in members)
+    )
+    root_ids = sorted({member.root_id for member in members})
+    relinked = 0
+    async with session_factory() as session:
+        service = IdentityService(session, cache=cache, replicas=replicas)
+        try:
+            async with locks.hold(session, keys) if locks is not None else nullcontext():
+                roots = (await session.scalars(
+                    select(Contact)
+                    .where(Contact.id.in_(root_ids), Contact.link_precedence == "primary")
+                    .order_by(Contact.id)
+                    .with_for_update()
+                )).all()
+                # The clusters as they are now that nobody can merge them
+                current, _ = await find_deep_links(session, [root.id for root in roots])
+                clusters: Dict[int, List[Row]] = defaultdict(list)
+                for member in current:
+                    clusters[member.root_id].append(member)
+                for root in roots:
+                    cluster = clusters.get(root.id)
+                    if not cluster:
+                        continue
+                    linked_ids = [member.id for member in cluster]
+                    contact_ids = [member.id for member in cluster if member.depth > 1]
+                    # Only rows still hanging off this cluster, as read under the locks
+                    result = await session.execute(
+                        update(Contact)
+                        .where(Contact.id.in_(contact_ids), Contact.linked_id.in_(linked_ids))
+                        .values(linked_id=root.id, updated_at=datetime.utcnow())
+                        .execution_options(synchronize_session=False)
+                    )
+                    # Responses only count direct secondaries, so the summary changes too
+                    await service.update_cluster_summary(root)
+                    service.cluster_rewritten([root.id])
+                    relinked += result.rowcount
+                await service.commit()
+        except BaseException:
+            await service.rollback()
+            raise
+    return relinked
+
+
+def claim_flattener(path: str) -> Optional[int]:
+    """Take the flattener lock file; returns its descriptor, or None if another worker holds it"""
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        os.close(fd)
+        return None
+    return fd
+
+
+async def run_chain_flattener(
+    session_factory: async_sessionmaker,
+    interval_seconds: float,
+    cache: Optional[ContactCache] = None,
+    replicas: Optional[ReplicaRouter] = None,
+    lock_path: Optional[str] = None,
+    locks: Optional[IdentifierLocks] = None
+) -> None:
+    """Flatten chains every ``interval_seconds`` until cancelled
+
+    With ``lock_path``, only the worker holding that file's lock flattens;
+    the others try to take it over each interval in case that worker exits.
+    ``locks`` should be the lock table identify calls use.
+    """
+    lock_fd = None
+    try:
+        while True:
+            if lock_path and lock_fd is None:
+                lock_fd = claim_flattener(lock_path)
+            if not lock_path or lock_fd is not None:
+                try:
+                    relinked = await flatten_chains(session_factory, cache=cache, replicas=replicas, locks=locks)
+                    if relinked:
+                        print(f"Flattened {relinked} contacts onto their root primary")
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    print(f"Warning: Chain flattening failed, retrying next interval: {e}")
+            await asyncio.sleep(interval_seconds)
+    finally:
+        if lock_fd is not None:
+            os.close(lock_fd)
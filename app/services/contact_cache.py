@@ -0,0 +1,207 @@
+import asyncio
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from app.config import settings
+from app.schemas.response import ContactResponse
+from typing import Any, Optional, Dict, Tuple
+
+
+class CacheBackend(ABC):
+    """Storage interface for ContactCache
+
+    Implementations must be safe to call from concurrent coroutines. The
+    in-process backend below is the default; a shared store (e.g. Redis) can
+    be plugged in by implementing the same four methods.
+    """
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[Any]:
+        """Return the value for key, or None if missing or expired"""
+
+    @abstractmethod
+    async def set(self, key: str, value: Any) -> None:
+        """Store a value, evicting old entries if needed"""
+
+    @abstractmethod
+    async def delete(self, *keys: str) -> None:
+        """Remove keys if present"""
+
+    @abstractmethod
+    async def clear(self) -> None:
+        """Remove every entry"""
+
+
+class InMemoryCacheBackend(CacheBackend):
+    """Process-local LRU cache with a per-entry time to live"""
+
+    def __init__(self, max_entries: int = 10000, ttl_seconds: float = 300.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = asyncio.Lock()
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def get(self, key: str) -> Optional[Any]:
+        async with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                return None
+
+            self._entries.move_to_end(key)
+            return value
+
+    async def set(self, key: str, value: Any) -> None:
+        async with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    async def delete(self, *keys: str) -> None:
+        async with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    async def clear(self) -> None:
+        async with self._lock:
+            self._entries.clear()
+
+
+class ContactCache:
+    """Cache of consolidated contact responses
+
+    Holds two kinds of entries in one backend:
+    - ``contact:<primary id>`` -> ContactResponse
+    - ``email:<email>`` / ``phone:<phone>`` -> primary id
+
+    Entries are only invalidated when a cluster changes (a new secondary or
+    a merge). To avoid re-caching a response that was built just before a
+    concurrent invalidation, readers take a token with ``begin_read`` and
+    ``store`` refuses responses whose primary was invalidated since then.
+    """
+
+    # Size of the invalidation stamp table; collisions only cause skipped stores
+    STAMP_SLOTS = 4096
+
+    def __init__(self, backend: CacheBackend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.stale_writes = 0
+        self._sequence = 0
+        self._stamps = [0] * self.STAMP_SLOTS
+
+    @staticmethod
+    def _contact_key(primary_id: int) -> str:
+        return f"contact:{primary_id}"
+
+    async def get(self, primary_id: int) -> Optional[ContactResponse]:
+        """Return the cached response for a primary contact"""
+        response = await self.backend.get(self._contact_key(primary_id))
+        if response is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return response
+
+    async def lookup(self, email: Optional[str], phone_number: Optional[str]) -> Optional[ContactResponse]:
+        """Return the cached response when every identifier maps to one cluster
+
+        That is exactly the case where identify_contact would neither create
+        nor link anything, so the cached response is the full answer.
+        """
+        primary_ids = set()
+        if email:
+            primary_ids.add(await self.backend.get(f"email:{email}"))
+        if phone_number:
+            primary_ids.add(await self.backend.get(f"phone:{phone_number}"))
+
+        if len(primary_ids) != 1 or None in primary_ids:
+            self.misses += 1
+            return None
+
+        response = await self.get(primary_ids.pop())
+        if response is None:
+            return None
+        if (email and email not in response.emails) or (phone_number and phone_number not in response.phoneNumbers):
+            # Identifier entry outlived its cluster, treat as a miss
+            self.hits -= 1
+            self.misses += 1
+            return None
+        return response
+
+    def begin_read(self, primary_id: int) -> int:
+        """Take a token before reading the data a response will be built from"""
+        return self._sequence
+
+    async def store(self, response: ContactResponse, token: int) -> None:
+        """Cache a response and its identifiers unless it may be stale"""
+        primary_id = response.primaryContatctId
+        if self._stamps[primary_id % self.STAMP_SLOTS] > token:
+            self.stale_writes += 1
+            return
+
+        await self.backend.set(self._contact_key(primary_id), response)
+        for email in response.emails:
+            await self.backend.set(f"email:{email}", primary_id)
+        for phone_number in response.phoneNumbers:
+            await self.backend.set(f"phone:{phone_number}", primary_id)
+
+    async def invalidate(self, primary_id: int) -> None:
+        """Drop a primary's response and the identifier entries pointing at it"""
+        self._sequence += 1
+        self._stamps[primary_id % self.STAMP_SLOTS] = self._sequence
+        self.invalidations += 1
+
+        key = self._contact_key(primary_id)
+        response = await self.backend.get(key)
+        keys = [key]
+        if response is not None:
+            keys.extend(f"email:{email}" for email in response.emails)
+            keys.extend(f"phone:{phone_number}" for phone_number in response.phoneNumbers)
+        await self.backend.delete(*keys)
+
+    async def clear(self) -> None:
+        """Drop every entry, e.g. after data was changed outside the service"""
+        self._sequence += 1
+        self._stamps = [self._sequence] * self.STAMP_SLOTS
+        await self.backend.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """Counters for monitoring the cache"""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": getattr(self.backend, "evictions", 0),
+            "expirations": getattr(self.backend, "expirations", 0),
+            "invalidations": self.invalidations,
+            "stale_writes": self.stale_writes,
+            "entries": len(self.backend) if hasattr(self.backend, "__len__") else 0,
+        }
+
+
+# Process-wide response cache shared by all requests
+contact_cache = ContactCache(
+    InMemoryCacheBackend(
+        max_entries=settings.contact_cache_max_entries,
+        ttl_seconds=settings.contact_cache_ttl_seconds
+    )
+)
+
+
+# Dependency to get the shared cache, or None when it is disabled
+def get_contact_cache() -> Optional[ContactCache]:
+    return contact_cache if settings.contact_cache_enabled else None
@@ -0,0 +1,201 @@
+from collections import defaultdict
+from sqlalchemy import select, or_
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from app.models.contact import Contact, ContactCluster, ContactMerge
+from app.services.contact_cache import ContactCache
+from app.services.contact_graph import load_contact_graph, ContactGraph
+from app.services.identity_index import IdentityIndex
+from app.services.identifier_locks import IdentifierLocks, identifier_keys
+from app.services.identity_service import IdentityService
+from app.database import ReplicaRouter
+from datetime import datetime
+from contextlib import AsyncExitStack
+from typing import Optional, List, Dict, Tuple, Iterable
+
+# Emails and phones erased per transaction
+ERASE_CHUNK_SIZE = 500
+
+
+def split_components(
+    contacts: Iterable[Contact],
+    merges: Iterable[Tuple[str, str]] = ()
+) -> List[List[Contact]]:
+    """Group contacts into components that still belong together
+
+    Two contacts stay together when they share an email or phone. A merge of
+    two clusters (scenario D) leaves no row carrying both identifiers, so
+    each merge's (email, phone) pair is passed in and ties the carriers of
+    that email to the carriers of that phone. Links are not evidence: they
+    only record which primary a contact ended up under. Each component is
+    ordered oldest first (``created_at``, then id), so its first contact is
+    the one to become primary.
+    """
+    contacts = sorted(contacts, key=lambda contact: (contact.created_at, contact.id))
+    parent = {contact.id: contact.id for contact in contacts}
+
+    def find(contact_id: int) -> int:
+        while parent[contact_id] != contact_id:
+            parent[contact_id] = parent[parent[contact_id]]
+            contact_id = parent[contact_id]
+        return contact_id
+
+    first_carrier: Dict[Tuple[str, str], int] = {}
+    for contact in contacts:
+        for identifier in (("email", contact.email), ("phone", contact.phone_number)):
+            if not identifier[1]:
+                continue
+            carrier = first_carrier.setdefault(identifier, contact.id)
+            parent[find(contact.id)] = find(carrier)
+    for email, phone_number in merges:
+        email_carrier = first_carrier.get(("email", email))
+        phone_carrier = first_carrier.get(("phone", phone_number))
+        if email_carrier is not None and phone_carrier is not None:
+            parent[find(phone_carrier)] = find(email_carrier)
+
+    components: Dict[int, List[Contact]] = defaultdict(list)
+    for contact in contacts:
+        components[find(contact.id)].append(contact)
+    return list(components.values())
+
+
+async def erase_contacts(
+    session_factory: async_sessionmaker,
+    emails: Iterable[str],
+    phone_numbers: Iterable[str],
+    index: Optional[IdentityIndex] = None,
+    cache: Optional[ContactCache] = None,
+    replicas: Optional[ReplicaRouter] = None,
+    locks: Optional[IdentifierLocks] = None,
+    chunk_size: int = ERASE_CHUNK_SIZE
+) -> Tuple[List[int], List[int]]:
+    """
+    Soft-delete every active contact carrying one of the emails or phones.
+
+    Identifiers are processed ``chunk_size`` at a time, one transaction per
+    chunk. Each chunk holds the identifier locks of its emails and phones,
+    as identify and batch calls do, so it can't interleave with a request
+    for the same customer. Only the clusters touching a chunk are loaded
+    (and row-locked). Their remaining contacts are regrouped on shared
+    identifiers and recorded merges (see split_components), since erasing
+    the record that bridged two groups splits the cluster; merge evidence
+    whose email or phone no longer has a carrier is deleted with it. The
+    oldest contact of each group becomes its primary and the others are
+    linked straight to it. Returns the erased contact ids and the primary
+    ids of the clusters left behind.
+
+    The identifier filter is not updated: an erased identifier only stays a
+    "maybe seen", which costs a lookup query and nothing else.
+    """
+    emails = list(dict.fromkeys(email.lower() for email in emails if email))
+    phone_numbers = list(dict.fromkeys(phone for phone in phone_numbers if phone))
+
+    erased_ids: List[int] = []
+    primary_ids: Dict[int, None] = {}
+    for start in range(0, max(len(emails), len(phone_numbers)), chunk_size):
+        chunk_emails = set(emails[start:start + chunk_size])
+        chunk_phones = set(phone_numbers[start:start + chunk_size])
+        async with session_factory() as session, AsyncExitStack() as stack:
+            service = IdentityService(session, index=index, cache=cache, replicas=replicas, locks=locks)
+            if locks is not None:
+                await stack.enter_async_context(locks.hold(session, identifier_keys(chunk_emails, chunk_phones)))
+            try:
+                graph = await load_contact_graph(session, chunk_emails, chunk_phones, for_update=True)
+                service.graph = graph
+                clusters: Dict[int, List[Contact]] = defaultdict(list)
+                for contact in graph.contacts.values():
+                    if contact.deleted_at is None:
+                        clusters[graph.get_primary(contact.id).id].append(contact)
+
+                affected = {
+                    root_id: members for root_id, members in clusters.items()
+                    if any(contact.email in chunk_emails or contact.phone_number in chunk_phones
+                           for contact in members)
+                }
+                merges = await _load_merges(session, [contact for members in affected.values() for contact in members])
+
+                for root_id, members in affected.items():
+                    erased = [
+                        contact for contact in members
+                        if contact.email in chunk_emails or contact.phone_number in chunk_phones
+                    ]
+                    for primary_id in await _resplit_cluster(service, graph, root_id, members, erased, merges):
+                        primary_ids[primary_id] = None
+                    for contact in erased:
+                        # A primary left by an earlier chunk can be erased by a later one
+                        primary_ids.pop(contact.id, None)
+                        erased_ids.append(contact.id)
+                await service.commit()
+            except BaseException:
+                await service.rollback()
+                raise
+
+    return sorted(erased_ids), sorted(primary_ids)
+
+
+async def _load_merges(session, contacts: List[Contact]) -> List[ContactMerge]:
+    """Merge evidence recorded for any identifier of the given contacts"""
+    emails = {contact.email for contact in contacts if contact.email}
+    phone_numbers = {contact.phone_number for contact in contacts if contact.phone_number}
+    if not emails and not phone_numbers:
+        return []
+    result = await session.execute(
+        select(ContactMerge).where(or_(ContactMerge.email.in_(emails), ContactMerge.phone_number.in_(phone_numbers)))
+    )
+    return list(result.scalars().all())
+
+
+async def _resplit_cluster(
+    service: IdentityService,
+    graph: ContactGraph,
+    root_id: int,
+    members: List[Contact],
+    erased: List[Contact],
+    merges: List[ContactMerge]
+) -> List[int]:
+    """Erase contacts of one cluster and relink what remains; returns the new primary ids"""
+    now = datetime.utcnow()
+    for contact in erased:
+        contact.deleted_at = now
+        contact.updated_at = now
+
+    erased_ids = {contact.id for contact in erased}
+    remaining = [contact for contact in members if contact.id not in erased_ids]
+    cluster_emails = {contact.email for contact in members if contact.email}
+    cluster_phones = {contact.phone_number for contact in members if contact.phone_number}
+    emails = {contact.email for contact in remaining if contact.email}
+    phone_numbers = {contact.phone_number for contact in remaining if contact.phone_number}
+    pairs = []
+    for merge in merges:
+        if merge.email not in cluster_emails and merge.phone_number not in cluster_phones:
+            continue
+        if merge.email in emails and merge.phone_number in phone_numbers:
+            pairs.append((merge.email, merge.phone_number))
+        else:
+            # Evidence for an identifier nobody carries any more can't tie anything
+            await service.db.delete(merge)
+    components = split_components(remaining, pairs)
+    survivors = []
+    for component in components:
+        primary = component[0]
+        for contact in component:
+            linked_id = None if contact is primary else primary.id
+            if contact.linked_id != linked_id:
+                previous_linked_id = contact.linked_id
+                contact.linked_id = linked_id
+                contact.link_precedence = "primary" if linked_id is None else "secondary"
+                contact.updated_at = now
+                graph.relink(contact, previous_linked_id)
+            survivors.append((contact.id, contact.email, contact.phone_number, primary.id))
+        await service.update_cluster_summary(primary)
+
+    primary_ids = [component[0].id for component in components]
+    if root_id not in primary_ids:
+        summary = await service.db.get(ContactCluster, root_id)
+        if summary is not None:
+            await service.db.delete(summary)
+    service.cluster_rewritten(
+        [root_id, *primary_ids],
+        [(contact.id, contact.email, contact.phone_number) for contact in erased],
+        survivors
+    )
+    return primary_ids
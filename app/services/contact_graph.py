@@ -0,0 +1,253 @@
+from sqlalchemy import select, and_, or_, false
+from sqlalchemy.sql import ColumnElement
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import Select
+from app.models.contact import Contact
+from typing import Optional, List, Dict, Iterable, Set, Tuple, Any
+
+
+def active_identifier_filter(emails: Iterable[str], phone_numbers: Iterable[str]) -> ColumnElement:
+    """Match active contacts carrying any of the emails or phone numbers
+
+    ``deleted_at IS NULL`` is repeated inside each OR branch so that every
+    branch can use the partial email / phone indexes (SQLite only considers
+    a partial index for an OR branch if the branch itself implies it).
+    """
+    emails = [email for email in emails if email]
+    phone_numbers = [phone for phone in phone_numbers if phone]
+
+    identifier_filters = []
+    if emails:
+        identifier_filters.append(and_(Contact.email.in_(emails), Contact.deleted_at.is_(None)))
+    if phone_numbers:
+        identifier_filters.append(and_(Contact.phone_number.in_(phone_numbers), Contact.deleted_at.is_(None)))
+    if not identifier_filters:
+        # Nothing to match on, keep the statement valid but empty
+        identifier_filters.append(false())
+    return or_(*identifier_filters)
+
+
+def build_cluster_query(emails: Iterable[str], phone_numbers: Iterable[str], for_update: bool = False) -> Select:
+    """Build a single statement that loads every contact cluster touching the identifiers
+
+    The statement uses two recursive CTEs:
+    1. ``ancestors`` starts from the active rows matching any email or phone and
+       walks ``linked_id`` upwards until it reaches the root primaries
+    2. ``members`` starts from those roots and walks ``linked_id`` downwards,
+       collecting every secondary (at any depth) linked to them
+
+    The final SELECT returns full ``Contact`` rows for the matched contacts,
+    their root primaries and all their siblings, ordered by id. With
+    ``for_update`` those rows are also locked (ignored by SQLite).
+    """
+    # Walk up from the matched rows to their root primaries
+    ancestors = (
+        select(Contact.id, Contact.linked_id)
+        .where(active_identifier_filter(emails, phone_numbers))
+        .cte("ancestors", recursive=True)
+    )
+    ancestors = ancestors.union(
+        select(Contact.id, Contact.linked_id)
+        .join(ancestors, Contact.id == ancestors.c.linked_id)
+    )
+
+    # Walk down from the roots to every linked contact
+    members = (
+        select(ancestors.c.id)
+        .where(ancestors.c.linked_id.is_(None))
+        .cte("members", recursive=True)
+    )
+    members = members.union(
+        select(Contact.id)
+        .join(members, Contact.linked_id == members.c.id)
+    )
+
+    query = (
+        select(Contact)
+        .where(Contact.id.in_(select(members.c.id)))
+        .order_by(Contact.id)
+    )
+    if for_update:
+        query = query.with_for_update(of=Contact)
+    return query
+
+
+def build_chain_query(contact_id: int) -> Select:
+    """Build a single statement loading a contact and every row up to its root
+
+    A recursive CTE follows ``linked_id`` upwards from the contact, so chains
+    of any depth cost one round trip instead of one query per hop. Rows come
+    back unordered; follow ``linked_id`` from the contact to order them.
+    """
+    chain = (
+        select(Contact.id, Contact.linked_id)
+        .where(Contact.id == contact_id)
+        .cte("chain", recursive=True)
+    )
+    chain = chain.union(
+        select(Contact.id, Contact.linked_id)
+        .join(chain, Contact.id == chain.c.linked_id)
+    )
+    return select(Contact).where(Contact.id.in_(select(chain.c.id)))
+
+
+def summarize_cluster(primary: Any, secondaries: Iterable[Any]) -> Tuple[List[str], List[str], List[int]]:
+    """Compute the consolidated emails, phone numbers and secondary ids of a cluster
+
+    Emails and phones are listed primary first, then secondaries by
+    ``created_at``; secondary ids keep the given order. Works on ORM objects
+    and plain rows alike, and deduplicates with dicts in O(N).
+    """
+    secondaries = list(secondaries)
+    emails: Dict[str, None] = {}
+    phone_numbers: Dict[str, None] = {}
+    if primary.email:
+        emails[primary.email] = None
+    if primary.phone_number:
+        phone_numbers[primary.phone_number] = None
+
+    for secondary in sorted(secondaries, key=lambda contact: contact.created_at):
+        if secondary.email:
+            emails.setdefault(secondary.email, None)
+        if secondary.phone_number:
+            phone_numbers.setdefault(secondary.phone_number, None)
+
+    return list(emails), list(phone_numbers), [secondary.id for secondary in secondaries]
+
+
+class ContactGraph:
+    """In-memory view of one or more contact clusters
+
+    Holds the rows returned by ``build_cluster_query`` so that matching,
+    primary resolution and secondary lookups can be answered without going
+    back to the database. The rows are live ORM objects from the session;
+    callers that change a contact's ``linked_id`` must report it through
+    ``relink`` so the child lookup stays in sync.
+    """
+
+    def __init__(self, contacts: Iterable[Contact], emails: Iterable[str], phone_numbers: Iterable[str]):
+        self.contacts: Dict[int, Contact] = {}
+        self.emails = {email for email in emails if email}
+        self.phone_numbers = {phone for phone in phone_numbers if phone}
+        # Lookups by identifier and by parent, each holding contact ids
+        self._by_email: Dict[str, Set[int]] = {}
+        self._by_phone: Dict[str, Set[int]] = {}
+        self._children: Dict[int, Set[int]] = {}
+        for contact in contacts:
+            self.add(contact)
+
+    def __contains__(self, contact_id: int) -> bool:
+        return contact_id in self.contacts
+
+    def __len__(self) -> int:
+        return len(self.contacts)
+
+    def covers(self, email: Optional[str], phone_number: Optional[str]) -> bool:
+        """Check whether the graph was loaded for the given identifiers"""
+        if email and email not in self.emails:
+            return False
+        if phone_number and phone_number not in self.phone_numbers:
+            return False
+        return True
+
+    def add(self, contact: Contact) -> None:
+        """Track a contact loaded from or written to the database"""
+        if contact.id in self.contacts:
+            return
+        self.contacts[contact.id] = contact
+        if contact.email:
+            self._by_email.setdefault(contact.email, set()).add(contact.id)
+        if contact.phone_number:
+            self._by_phone.setdefault(contact.phone_number, set()).add(contact.id)
+        if contact.linked_id is not None:
+            self._children.setdefault(contact.linked_id, set()).add(contact.id)
+
+    def relink(self, contact: Contact, previous_linked_id: Optional[int]) -> None:
+        """Record that a contact's ``linked_id`` changed"""
+        if contact.id not in self.contacts:
+            return
+        if previous_linked_id is not None:
+            self._children.get(previous_linked_id, set()).discard(contact.id)
+        if contact.linked_id is not None:
+            self._children.setdefault(contact.linked_id, set()).add(contact.id)
+
+    def find_matching(self, email: Optional[str], phone_number: Optional[str]) -> List[Contact]:
+        """Return active contacts matching the email or phone, ordered by id"""
+        contact_ids = set()
+        if email:
+            contact_ids |= self._by_email.get(email, set())
+        if phone_number:
+            contact_ids |= self._by_phone.get(phone_number, set())
+        return [
+            contact for contact in self._ordered(contact_ids)
+            if contact.deleted_at is None
+        ]
+
+    def get_primary(self, contact_id: int) -> Optional[Contact]:
+        """Follow ``linked_id`` to the root primary, or None if the chain leaves the graph"""
+        path = self.get_path(contact_id)
+        return path[-1] if path is not None else None
+
+    def get_path(self, contact_id: int) -> Optional[List[Contact]]:
+        """Contacts visited from ``contact_id`` up to its root primary (inclusive)
+
+        Returns None if the chain leaves the graph.
+        """
+        contact = self.contacts.get(contact_id)
+        if contact is None:
+            return None
+
+        path = [contact]
+        if contact.link_precedence == "primary":
+            return path
+
+        while contact.linked_id is not None:
+            contact = self.contacts.get(contact.linked_id)
+            if contact is None:
+                return None
+            path.append(contact)
+
+        return path
+
+    def get_secondaries(self, primary_id: int) -> List[Contact]:
+        """Return active secondaries linked directly to the primary, ordered by id"""
+        return [
+            contact for contact in self._ordered(self._children.get(primary_id, set()))
+            if contact.link_precedence == "secondary"
+            and contact.deleted_at is None
+        ]
+
+    def _ordered(self, contact_ids: Iterable[int]) -> List[Contact]:
+        return [self.contacts[contact_id] for contact_id in sorted(contact_ids)]
+
+
+# Identifiers per IN (...) list, keeps statements well under driver parameter limits
+CLUSTER_QUERY_CHUNK_SIZE = 500
+
+
+async def load_contact_graph(
+    db: AsyncSession,
+    emails: Iterable[str],
+    phone_numbers: Iterable[str],
+    chunk_size: int = CLUSTER_QUERY_CHUNK_SIZE,
+    for_update: bool = False
+) -> ContactGraph:
+    """Load every cluster touching the identifiers
+
+    A single request needs one round trip; large batches are split into
+    set-based queries of at most ``chunk_size`` emails and phones each.
+    """
+    emails = list(dict.fromkeys(email for email in emails if email))
+    phone_numbers = list(dict.fromkeys(phone for phone in phone_numbers if phone))
+
+    contacts: List[Contact] = []
+    for start in range(0, max(len(emails), len(phone_numbers)), chunk_size):
+        query = build_cluster_query(
+            emails[start:start + chunk_size],
+            phone_numbers[start:start + chunk_size],
+            for_update=for_update
+        )
+        result = await db.execute(query)
+        contacts.extend(result.scalars().all())
+
+    return ContactGraph(contacts, emails, phone_numbers)
@@ -0,0 +1,123 @@
+import base64
+from datetime import datetime
+from sqlalchemy import select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.contact import Contact
+from app.schemas.response import ContactMember, ContactMembersPage, ContactResponse
+from app.services.contact_graph import summarize_cluster
+from typing import Optional, List, Tuple, AsyncIterator
+
+EXPORT_CHUNK_SIZE = 1000
+
+
+def encode_cursor(created_at: datetime, contact_id: int) -> str:
+    """Opaque keyset cursor for the (created_at, id) position of a member"""
+    raw = f"{created_at.isoformat()}|{contact_id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Inverse of encode_cursor; raises ValueError for malformed cursors"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("utf-8")
+        created_at, contact_id = raw.split("|")
+        return datetime.fromisoformat(created_at), int(contact_id)
+    except (ValueError, UnicodeDecodeError) as exc:
+        raise ValueError("Invalid cursor") from exc
+
+
+def _to_member(contact: Contact) -> ContactMember:
+    return ContactMember(
+        id=contact.id,
+        email=contact.email,
+        phoneNumber=contact.phone_number,
+        linkPrecedence=contact.link_precedence,
+        createdAt=contact.created_at
+    )
+
+
+async def list_members(
+    db: AsyncSession,
+    primary_id: int,
+    limit: int = 100,
+    cursor: Optional[str] = None
+) -> Optional[ContactMembersPage]:
+    """
+    Return one page of a cluster's members, or None if there is no such primary.
+    
+    Members are ordered by (created_at, id). The primary is always the oldest
+    member of its cluster, so it leads the first page; the rest are read
+    with a keyset condition on ix_contacts_linked_id_created_at, so every
+    page costs the same however deep into a large cluster it is.
+    """
+    members: List[Contact] = []
+    if cursor is None:
+        primary = await db.get(Contact, primary_id)
+        if primary is None or primary.link_precedence != "primary" or primary.deleted_at is not None:
+            return None
+        members.append(primary)
+        after = None
+    else:
+        after = decode_cursor(cursor)
+    
+    # Fetch one extra row to know whether another page follows
+    query = (
+        select(Contact)
+        .where(
+            Contact.linked_id == primary_id,
+            Contact.link_precedence == "secondary",
+            Contact.deleted_at.is_(None)
+        )
+        .order_by(Contact.created_at, Contact.id)
+        .limit(limit - len(members) + 1)
+    )
+    if after is not None:
+        query = query.where(tuple_(Contact.created_at, Contact.id) > tuple_(*after))
+    members.extend((await db.scalars(query)).all())
+    
+    next_cursor = None
+    if len(members) > limit:
+        members = members[:limit]
+        next_cursor = encode_cursor(members[-1].created_at, members[-1].id)
+    
+    return ContactMembersPage(
+        primaryContactId=primary_id,
+        members=[_to_member(member) for member in members],
+        nextCursor=next_cursor
+    )
+
+
+async def iter_clusters(db: AsyncSession, chunk_size: int = EXPORT_CHUNK_SIZE) -> AsyncIterator[ContactResponse]:
+    """
+    Yield the consolidated contact of every active cluster, in primary id order.
+    
+    Primaries are streamed with a server-side cursor; each chunk's
+    secondaries are streamed too, grouped by primary, so memory stays bounded
+    by one chunk of primaries plus the largest cluster in it.
+    """
+    primaries = await db.stream_scalars(
+        select(Contact)
+        .where(Contact.link_precedence == "primary", Contact.deleted_at.is_(None))
+        .order_by(Contact.id)
+        .execution_options(yield_per=chunk_size)
+    )
+    async for chunk in primaries.partitions(chunk_size):
+        secondaries = await db.stream_scalars(
+            select(Contact)
+            .where(
+                Contact.linked_id.in_([primary.id for primary in chunk]),
+                Contact.link_precedence == "secondary",
+                Contact.deleted_at.is_(None)
+            )
+            .order_by(Contact.linked_id, Contact.created_at, Contact.id)
+            .execution_options(yield_per=chunk_size)
+        )
+        # Both streams are in primary id order, so walk them in lockstep
+        pending = await anext(secondaries, None)
+        for primary in chunk:
+            members = []
+            while pending is not None and pending.linked_id == primary.id:
+                members.append(pending)
+                pending = await anext(secondaries, None)
+            emails, phone_numbers, secondary_ids = summarize_cluster(primary, members)
+            yield ContactResponse.from_trusted(primary.id, emails, phone_numbers, secondary_ids)
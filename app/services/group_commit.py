@@ -0,0 +1,176 @@
+import asyncio
+import contextvars
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.orm.exc import StaleDataError
+from app.config import settings
+from app.database import AsyncSessionLocal, ReplicaRouter, replica_router
+from app.schemas.response import IdentifyResponse
+from app.services.identity_service import IdentityService, STALE_SUMMARY_ATTEMPTS
+from app.services.identity_index import IdentityIndex, get_identity_index
+from app.services.contact_cache import ContactCache, get_contact_cache
+from app.services.identifier_locks import IdentifierLocks, get_identifier_locks
+from app.services.identifier_filter import IdentifierFilter, get_identifier_filter
+from app.metrics import GROUP_COMMIT_BATCH_SIZE, track_request, add_request_statements
+from typing import Optional, List, Tuple
+
+
+class GroupCommitWriter:
+    """Apply identify calls in micro-batches, one transaction per batch
+
+    Callers enqueue their (email, phone) and wait on a future. A single
+    writer task takes whatever is queued once ``max_delay_seconds`` have
+    passed since the first item, or as soon as ``max_batch`` items are
+    waiting, applies them in arrival order exactly like POST /identify/batch
+    and commits once. Futures resolve only after that commit, so every
+    caller gets a durable answer while the commit cost is shared.
+
+    If a batch fails, its items are retried one transaction each, so only
+    the item that caused the failure sees the exception.
+
+    The writer task runs in a context of its own. Each caller is credited
+    with an even share of its batch's statements and with the batch commit,
+    so per-request SQL metrics stay meaningful.
+    """
+
+    def __init__(
+        self,
+        session_factory: async_sessionmaker,
+        index: Optional[IdentityIndex] = None,
+        cache: Optional[ContactCache] = None,
+        locks: Optional[IdentifierLocks] = None,
+        replicas: Optional[ReplicaRouter] = None,
+        identifier_filter: Optional[IdentifierFilter] = None,
+        max_batch: int = 64,
+        max_delay_seconds: float = 0.002
+    ):
+        self.session_factory = session_factory
+        self.index = index
+        self.cache = cache
+        self.locks = locks
+        self.replicas = replicas
+        self.identifier_filter = identifier_filter
+        self.max_batch = max_batch
+        self.max_delay_seconds = max_delay_seconds
+        self.batches = 0
+        # Queue, wake-up event and task belong to the event loop that started them
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._full: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def _ensure_started(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._full = asyncio.Event()
+            self._task = None
+        if self._task is None or self._task.done():
+            # Tasks copy the current context; an empty one keeps the writer's
+            # SQL off the RequestStats of whichever caller happened to start it
+            self._task = contextvars.Context().run(loop.create_task, self._run())
+
+    async def submit(self, email: Optional[str], phone_number: Optional[str]) -> Tuple[IdentifyResponse, str]:
+        """Queue one identify call and return its response and scenario once committed"""
+        self._ensure_started()
+        future = self._loop.create_future()
+        self._queue.put_nowait((email, phone_number, future))
+        if self._queue.qsize() >= self.max_batch:
+            self._full.set()
+        response, scenario, statements, commits = await future
+        add_request_statements(statements, commits)
+        return response, scenario
+
+    async def close(self) -> None:
+        """Stop the writer task and fail calls that are queued or in its current batch"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        while not self._queue.empty():
+            _, _, future = self._queue.get_nowait()
+            if not future.done():
+                future.set_exception(RuntimeError("Group commit writer stopped"))
+
+    async def _run(self) -> None:
+        batch: List[tuple] = []
+        try:
+            while True:
+                batch = [await self._queue.get()]
+                if self._queue.qsize() + 1 < self.max_batch:
+                    self._full.clear()
+                    try:
+                        await asyncio.wait_for(self._full.wait(), self.max_delay_seconds)
+                    except asyncio.TimeoutError:
+                        pass
+                while len(batch) < self.max_batch and not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                await self._flush(batch)
+                batch = []
+        except asyncio.CancelledError:
+            # These items are off the queue, so close() can't fail them
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(RuntimeError("Group commit writer stopped"))
+            raise
+
+    async def _flush(self, batch: List[tuple]) -> None:
+        """Commit one micro-batch and resolve the futures of its callers"""
+        GROUP_COMMIT_BATCH_SIZE.observe(len(batch))
+        self.batches += 1
+        try:
+            with track_request() as stats:
+                results = await self._apply([(email, phone_number) for email, phone_number, _ in batch])
+        except Exception as e:
+            if len(batch) > 1:
+                # Retry one transaction per item so only the culprit fails
+                for item in batch:
+                    await self._flush([item])
+            elif not batch[0][2].done():
+                batch[0][2].set_exception(e)
+            return
+
+        share, remainder = divmod(stats.statements, len(batch))
+        for position, ((_, _, future), (response, scenario)) in enumerate(zip(batch, results)):
+            # Callers that gave up still had their write committed
+            if not future.done():
+                future.set_result((response, scenario, share + (position < remainder), stats.commits))
+
+    async def _apply(self, pairs: List[Tuple[Optional[str], Optional[str]]]) -> List[Tuple[IdentifyResponse, str]]:
+        async with self.session_factory() as db:
+            service = IdentityService(
+                db, index=self.index, cache=self.cache, locks=self.locks, replicas=self.replicas,
+                identifier_filter=self.identifier_filter
+            )
+            for attempt in range(STALE_SUMMARY_ATTEMPTS):
+                try:
+                    results = []
+                    async for response in service.iter_identify_batch(pairs):
+                        results.append((response, service.scenario))
+                    return results
+                except StaleDataError:
+                    # A concurrent writer changed a cluster summary; run the batch again
+                    if attempt == STALE_SUMMARY_ATTEMPTS - 1:
+                        raise
+
+
+# Process-wide writer shared by all requests
+group_commit_writer = GroupCommitWriter(
+    AsyncSessionLocal,
+    index=get_identity_index(),
+    cache=get_contact_cache(),
+    locks=get_identifier_locks(),
+    replicas=replica_router,
+    identifier_filter=get_identifier_filter(),
+    max_batch=settings.group_commit_max_batch,
+    max_delay_seconds=settings.group_commit_max_delay_ms / 1000
+)
+
+
+# Dependency to get the shared writer, or None unless group commit is enabled
+def get_group_commit_writer() -> Optional[GroupCommitWriter]:
+    return group_commit_writer if settings.group_commit_enabled else None
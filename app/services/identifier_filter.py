@@ -0,0 +1,258 @@
+import hashlib
+import math
+import os
+import struct
+from datetime import datetime, timedelta
+from sqlalchemy import select, func, or_
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.contact import Contact
+from app.config import settings
+from app.metrics import registry, gauge_lines, IDENTIFIER_FILTER_CHECKS
+from typing import Optional, List
+
+# Rows updated this long before the last sync are read again on catch-up, for
+# transactions that took a lower id or timestamp but committed after it
+CATCH_UP_MARGIN = timedelta(minutes=10)
+
+
+def database_identity(url: str) -> bytes:
+    """Stable 16-byte id of a database URL, without its password"""
+    rendered = make_url(url).render_as_string(hide_password=True)
+    return hashlib.blake2b(rendered.encode("utf-8"), digest_size=16).digest()
+
+
+class IdentifierFilter:
+    """Bloom filter over every email and phone number in the contacts table
+
+    ``might_contain`` never answers False for an identifier that was added,
+    so a False is a definite miss: the customer is new and the lookup query
+    can be skipped. A True may be a false positive, which only costs the
+    query that would have run anyway.
+
+    The filter is hydrated at startup, persisted to disk so a restart only
+    has to catch up on what changed since, and updated by ``IdentityService``
+    on every insert. It only sees inserts made through this process until
+    the next restart, so a miss is only trustworthy while this process is
+    the sole writer of the contacts table; the setting is off by default.
+
+    A saved file records the database it was built from and the newest
+    ``updated_at`` it had read. It is refused for another database, and
+    rebuilt if the table's newest ``updated_at`` went back in time. The
+    catch-up reads rows above the id ``watermark`` and rows updated since
+    shortly before the last sync, so a lower id that committed late isn't
+    missed.
+    """
+
+    MAGIC = b"IDBLOOM2"
+    # magic, capacity, error rate, bits, hashes, items, watermark, database id,
+    # newest updated_at read (microseconds since the epoch, 0 if none)
+    HEADER = struct.Struct("<8sQdQIQQ16sq")
+
+    def __init__(self, capacity: int = 1000000, error_rate: float = 0.01, database_id: bytes = b""):
+        self.database_id = database_id.ljust(16, b"\0")[:16]
+        self.error_rate = error_rate
+        self.definite_misses = 0
+        self.maybe_hits = 0
+        self.false_positives = 0
+        self.reset(capacity)
+
+    def reset(self, capacity: int) -> None:
+        """Drop every identifier and size the filter for ``capacity`` of them"""
+        self.capacity = max(capacity, 1)
+        self.num_bits = max(8, math.ceil(-self.capacity * math.log(self.error_rate) / math.log(2) ** 2))
+        self.num_hashes = max(1, round(self.num_bits / self.capacity * math.log(2)))
+        self._bits = bytearray((self.num_bits + 7) // 8)
+        self.items = 0
+        # Highest contact id and newest updated_at read from the table
+        self.watermark = 0
+        self.synced_at: Optional[datetime] = None
+        self.ready = False
+
+    @property
+    def memory_bytes(self) -> int:
+        return len(self._bits)
+
+    def estimated_false_positive_rate(self) -> float:
+        """Expected false positive rate at the current fill level"""
+        if not self.items:
+            return 0.0
+        return (1 - math.exp(-self.num_hashes * self.items / self.num_bits)) ** self.num_hashes
+
+    def _positions(self, key: str) -> List[int]:
+        # Double hashing: k positions from two 64-bit halves of one digest
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        return [(first + i * second) % self.num_bits for i in range(self.num_hashes)]
+
+    def _add(self, key: str) -> None:
+        added = False
+        for position in self._positions(key):
+            mask = 1 << (position & 7)
+            if not self._bits[position >> 3] & mask:
+                self._bits[position >> 3] |= mask
+                added = True
+        # Only count keys that weren't (probably) there yet, so shared phones
+        # and rows re-read after a restart don't inflate the fill estimate
+        if added:
+            self.items += 1
+
+    def _contains(self, key: str) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+    def add_contact(self, email: Optional[str], phone_number: Optional[str]) -> None:
+        """Register the identifiers of a new contact"""
+        if email:
+            self._add(f"email:{email.lower()}")
+        if phone_number:
+            self._add(f"phone:{phone_number}")
+
+    def might_contain(self, email: Optional[str], phone_number: Optional[str]) -> bool:
+        """False only when neither identifier has ever been stored"""
+        found = bool(
+            (email and self._contains(f"email:{email.lower()}"))
+            or (phone_number and self._contains(f"phone:{phone_number}"))
+        )
+        if found:
+            self.maybe_hits += 1
+            IDENTIFIER_FILTER_CHECKS.inc("maybe")
+        else:
+            self.definite_misses += 1
+            IDENTIFIER_FILTER_CHECKS.inc("miss")
+        return found
+
+    def record_false_positive(self) -> None:
+        """Report that a maybe-hit found no contact after all"""
+        self.false_positives += 1
+        IDENTIFIER_FILTER_CHECKS.inc("false_positive")
+
+    def observed_false_positive_rate(self) -> float:
+        """Share of checks for new identifiers that the filter failed to reject"""
+        negatives = self.false_positives + self.definite_misses
+        return self.false_positives / negatives if negatives else 0.0
+
+    async def hydrate(self, db: AsyncSession) -> None:
+        """Add every contact changed since the last sync and mark the filter ready
+
+        After a full build the filter is resized and rebuilt once if the
+        table holds more identifiers than it was sized for.
+        """
+        synced_at = await db.scalar(select(func.max(Contact.updated_at)))
+        if self.synced_at is not None and (synced_at is None or synced_at < self.synced_at):
+            # Restored or replaced since the file was saved: start over
+            self.reset(self.capacity)
+
+        condition = Contact.id > self.watermark
+        if self.synced_at is not None:
+            condition = or_(condition, Contact.updated_at > self.synced_at - CATCH_UP_MARGIN)
+        query = (
+            select(Contact.id, Contact.email, Contact.phone_number)
+            .where(condition)
+            .order_by(Contact.id)
+            .execution_options(yield_per=1000)
+        )
+        result = await db.stream(query)
+        async for contact_id, email, phone_number in result:
+            self.add_contact(email, phone_number)
+            self.watermark = max(self.watermark, contact_id)
+        self.synced_at = synced_at
+
+        if self.items > self.capacity:
+            self.reset(self.items * 2)
+            await self.hydrate(db)
+        self.ready = True
+
+    def save(self, path: str) -> None:
+        """Write the filter to ``path`` atomically"""
+        temporary_path = f"{path}.tmp"
+        with open(temporary_path, "wb") as file:
+            synced_at = 0
+            if self.synced_at is not None:
+                synced_at = (self.synced_at - datetime(1970, 1, 1)) // timedelta(microseconds=1)
+            file.write(self.HEADER.pack(
+                self.MAGIC, self.capacity, self.error_rate, self.num_bits,
+                self.num_hashes, self.items, self.watermark, self.database_id, synced_at
+            ))
+            file.write(self._bits)
+        os.replace(temporary_path, path)
+
+    def load(self, path: str) -> bool:
+        """Replace the filter with the one saved at ``path``
+
+        Returns False, leaving the filter empty, when there is no usable file:
+        missing, corrupt, built from another database, or sized for fewer
+        identifiers or a higher error rate than currently configured.
+        """
+        try:
+            with open(path, "rb") as file:
+                header = file.read(self.HEADER.size)
+                (magic, capacity, error_rate, num_bits, num_hashes, items, watermark,
+                 database_id, synced_at) = self.HEADER.unpack(header)
+                bits = bytearray(file.read())
+        except (OSError, struct.error):
+            return False
+        if magic != self.MAGIC or len(bits) != (num_bits + 7) // 8:
+            return False
+        if database_id != self.database_id:
+            return False
+        if capacity < self.capacity or error_rate > self.error_rate:
+            return False
+
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.num_bits = num_bits
+        self.num_hashes = num_hashes
+        self._bits = bits
+        self.items = items
+        self.watermark = watermark
+        self.synced_at = datetime(1970, 1, 1) + timedelta(microseconds=synced_at) if synced_at else None
+        self.ready = False
+        return True
+
+    def stats(self) -> dict:
+        """Size, fill and false positive figures for monitoring"""
+        return {
+            "ready": self.ready,
+            "items": self.items,
+            "capacity": self.capacity,
+            "memory_bytes": self.memory_bytes,
+            "hashes": self.num_hashes,
+            "definite_misses": self.definite_misses,
+            "maybe_hits": self.maybe_hits,
+            "false_positives": self.false_positives,
+            "estimated_false_positive_rate": round(self.estimated_false_positive_rate(), 6),
+            "observed_false_positive_rate": round(self.observed_false_positive_rate(), 6),
+        }
+
+
+# Process-wide filter shared by all requests
+identifier_filter = IdentifierFilter(
+    capacity=settings.identifier_filter_capacity,
+    error_rate=settings.identifier_filter_error_rate,
+    database_id=database_identity(settings.async_database_url)
+)
+
+
+# Dependency to get the shared filter, or None when it is disabled. It is
+# per process, so with several workers it would miss the others' inserts
+def get_identifier_filter() -> Optional[IdentifierFilter]:
+    return identifier_filter if settings.identifier_filter_enabled and settings.workers == 1 else None
+
+
+def _collect_filter_metrics() -> List[str]:
+    """Expose the filter's size and false positive rates on /metrics"""
+    return (
+        gauge_lines("identifier_filter_items", "Identifiers added to the negative-lookup filter", identifier_filter.items)
+        + gauge_lines("identifier_filter_memory_bytes", "Size of the negative-lookup filter's bit array",
+                      identifier_filter.memory_bytes)
+        + gauge_lines("identifier_filter_estimated_false_positive_rate",
+                      "Expected false positive rate of the negative-lookup filter at its fill level",
+                      identifier_filter.estimated_false_positive_rate())
+        + gauge_lines("identifier_filter_observed_false_positive_rate",
+                      "Share of lookups for new identifiers the negative-lookup filter failed to skip",
+                      identifier_filter.observed_false_positive_rate())
+    )
+
+
+registry.add_collector(_collect_filter_metrics)
@@ -0,0 +1,124 @@
+import asyncio
+import fcntl
+import hashlib
+import os
+from contextlib import asynccontextmanager
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config import settings
+from typing import Optional, Dict, List, Iterable, AsyncIterator
+
+
+def identifier_keys(emails: Iterable[Optional[str]], phone_numbers: Iterable[Optional[str]]) -> List[str]:
+    """Normalized, de-duplicated and sorted lock keys for a set of identifiers"""
+    keys = {f"email:{email.lower()}" for email in emails if email}
+    keys.update(f"phone:{phone_number}" for phone_number in phone_numbers if phone_number)
+    return sorted(keys)
+
+
+def advisory_lock_id(key: str) -> int:
+    """Stable signed 64-bit id for pg_advisory_xact_lock"""
+    digest = hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
+# Byte-range locks in the worker lock file; identifiers are hashed onto these
+LOCK_FILE_STRIPES = 65536
+# Wait between attempts at a byte-range lock another worker holds
+LOCK_FILE_POLL_SECONDS = 0.001
+
+
+class IdentifierLocks:
+    """Serialize identify calls that touch the same email or phone number
+
+    Up to three layers, all keyed by identifier so unrelated requests never
+    wait on each other:
+    - an asyncio lock per identifier inside this process
+    - on Postgres, transaction-scoped advisory locks so requests running in
+      other processes or hosts are serialized too
+    - on other databases, given a ``lock_path``, a byte-range lock per
+      identifier in that file, so worker processes on this host (run.py
+      with WORKERS > 1 on SQLite) are serialized as well. Without it SQLite
+      only serializes the writes, not the read that decided them.
+
+    Locks are always taken in sorted order to avoid deadlocks, and must be
+    held until the transaction commits or rolls back.
+    """
+
+    def __init__(self, lock_path: Optional[str] = None):
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._holders: Dict[str, int] = {}
+        self.lock_path = lock_path
+        self._lock_fd: Optional[int] = None
+
+    def __len__(self) -> int:
+        return len(self._locks)
+
+    @asynccontextmanager
+    async def hold(self, db: AsyncSession, keys: List[str]) -> AsyncIterator[None]:
+        """Hold every identifier lock for the duration of the block"""
+        registered: List[str] = []
+        held: List[str] = []
+        stripes: List[int] = []
+        try:
+            for key in keys:
+                lock = self._locks.get(key)
+                if lock is None:
+                    lock = self._locks[key] = asyncio.Lock()
+                self._holders[key] = self._holders.get(key, 0) + 1
+                registered.append(key)
+                await lock.acquire()
+                held.append(key)
+
+            if keys and db.bind.dialect.name == "postgresql":
+                # Released automatically when the transaction ends
+                await db.execute(
+                    text("SELECT pg_advisory_xact_lock(k) FROM unnest(CAST(:keys AS bigint[])) AS k"),
+                    {"keys": sorted(advisory_lock_id(key) for key in keys)}
+                )
+            elif keys and self.lock_path:
+                for stripe in sorted({advisory_lock_id(key) % LOCK_FILE_STRIPES for key in keys}):
+                    await self._lock_stripe(stripe)
+                    stripes.append(stripe)
+
+            yield
+        finally:
+            for stripe in stripes:
+                fcntl.lockf(self._lock_fd, fcntl.LOCK_UN, 1, stripe)
+            for key in reversed(held):
+                self._locks[key].release()
+            for key in registered:
+                self._holders[key] -= 1
+                if not self._holders[key]:
+                    # Nobody else holds or waits for it; keep the table bounded
+                    del self._holders[key]
+                    del self._locks[key]
+
+    async def _lock_stripe(self, stripe: int) -> None:
+        """Take one byte-range lock of the worker lock file without blocking the event loop"""
+        if self._lock_fd is None:
+            self._lock_fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o600)
+        while True:
+            try:
+                fcntl.lockf(self._lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB, 1, stripe)
+                return
+            except (BlockingIOError, PermissionError):
+                await asyncio.sleep(LOCK_FILE_POLL_SECONDS)
+
+
+def worker_lock_path() -> Optional[str]:
+    """Lock file shared by the workers of one run.py launch, if there are several"""
+    if settings.workers <= 1:
+        return None
+    # Imported here because the shared index pulls in the metrics registry
+    from app.services.shared_index import worker_file_path
+    return worker_file_path("locks")
+
+
+# Process-wide identifier lock table
+identifier_locks = IdentifierLocks(worker_lock_path())
+
+
+# Dependency to get the shared lock table, or None when locking is disabled
+def get_identifier_locks() -> Optional[IdentifierLocks]:
+    return identifier_locks if settings.identity_locking_enabled else None
@@ -0,0 +1,244 @@
+from sqlalchemy import select, Connection
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import Select
+from app.models.contact import Contact
+from app.config import settings
+from typing import Optional, Dict, List, Tuple
+
+
+class IdentityIndex:
+    """In-memory disjoint-set (union-find) index of contact clusters
+
+    Every contact id is a node. Nodes of the same cluster are joined with
+    union-by-rank, and lookups use path compression, so resolving an email or
+    phone number to its primary contact id costs O(α(n)).
+
+    The index is hydrated from the ``contacts`` table at startup and kept up
+    to date by ``IdentityService`` after each commit. It only reflects writes
+    made through this process, so a hit can be trusted (contacts are never
+    re-keyed) but a miss may be a row another process committed.
+    """
+
+    def __init__(self):
+        self._parent: Dict[int, int] = {}
+        self._rank: Dict[int, int] = {}
+        # Root node -> primary contact id of the cluster
+        self._primary: Dict[int, int] = {}
+        # Normalized identifier -> any contact id carrying it
+        self._emails: Dict[str, int] = {}
+        self._phones: Dict[str, int] = {}
+        # (email, phone) -> contact id holding exactly that pair
+        self._pairs: Dict[Tuple[str, str], int] = {}
+        # Rows waiting to be linked while a bulk load is in progress
+        self._pending_links: List[Tuple[int, int]] = []
+        self._pending_primaries: List[int] = []
+        self.ready = False
+
+    def __len__(self) -> int:
+        return len(self._parent)
+
+    @staticmethod
+    def normalize_email(email: Optional[str]) -> Optional[str]:
+        """Normalize an email the same way IdentityService does"""
+        return email.lower() if email else None
+
+    def clear(self) -> None:
+        """Drop every node and mark the index as not ready"""
+        self._parent.clear()
+        self._rank.clear()
+        self._primary.clear()
+        self._emails.clear()
+        self._phones.clear()
+        self._pairs.clear()
+        self.ready = False
+
+    def _make_set(self, node: int) -> None:
+        if node not in self._parent:
+            self._parent[node] = node
+            self._rank[node] = 0
+
+    def _find(self, node: int) -> int:
+        """Return the root of the node's set, compressing the path on the way"""
+        root = node
+        while self._parent[root] != root:
+            root = self._parent[root]
+
+        while self._parent[node] != root:
+            self._parent[node], node = root, self._parent[node]
+
+        return root
+
+    def _union(self, a: int, b: int) -> int:
+        """Join the sets of a and b by rank and return the new root"""
+        root_a = self._find(a)
+        root_b = self._find(b)
+        if root_a == root_b:
+            return root_a
+
+        if self._rank[root_a] < self._rank[root_b]:
+            root_a, root_b = root_b, root_a
+        self._parent[root_b] = root_a
+        if self._rank[root_a] == self._rank[root_b]:
+            self._rank[root_a] += 1
+
+        return root_a
+
+    def primary_of(self, contact_id: int) -> Optional[int]:
+        """Resolve any contact id to its primary contact id"""
+        if contact_id not in self._parent:
+            return None
+        return self._primary.get(self._find(contact_id))
+
+    def primary_for_email(self, email: Optional[str]) -> Optional[int]:
+        """Resolve an email to the primary contact id of its cluster"""
+        contact_id = self._emails.get(self.normalize_email(email)) if email else None
+        return self.primary_of(contact_id) if contact_id is not None else None
+
+    def primary_for_phone(self, phone_number: Optional[str]) -> Optional[int]:
+        """Resolve a phone number to the primary contact id of its cluster"""
+        contact_id = self._phones.get(phone_number) if phone_number else None
+        return self.primary_of(contact_id) if contact_id is not None else None
+
+    def contact_for_pair(self, email: Optional[str], phone_number: Optional[str]) -> Optional[int]:
+        """Return the contact holding exactly this email and phone, if any"""
+        if not email or not phone_number:
+            return None
+        return self._pairs.get((self.normalize_email(email), phone_number))
+
+    def add_contact(self, contact_id: int, email: Optional[str], phone_number: Optional[str], primary_id: int) -> None:
+        """Register a committed contact under its primary"""
+        email = self.normalize_email(email)
+
+        self._make_set(contact_id)
+        if primary_id == contact_id:
+            self._primary[self._find(contact_id)] = contact_id
+        else:
+            self._make_set(primary_id)
+            primary_root = self._find(primary_id)
+            cluster_primary = self._primary.get(primary_root, primary_id)
+            self._primary[self._union(contact_id, primary_id)] = cluster_primary
+
+        if email:
+            self._emails.setdefault(email, contact_id)
+        if phone_number:
+            self._phones.setdefault(phone_number, contact_id)
+        if email and phone_number:
+            self._pairs.setdefault((email, phone_number), contact_id)
+
+    def changed_primaries(self) -> Optional[List[int]]:
+        """Clusters changed by other processes; this index only sees its own writes"""
+        return []
+
+    def merge(self, older_primary_id: int, newer_primary_id: int) -> None:
+        """Fold the newer primary's cluster into the older primary's cluster"""
+        self._make_set(older_primary_id)
+        self._make_set(newer_primary_id)
+        self._primary[self._union(older_primary_id, newer_primary_id)] = older_primary_id
+
+    def split(self, erased: List[Tuple[int, Optional[str], Optional[str]]],
+              survivors: List[Tuple[int, Optional[str], Optional[str], int]]) -> None:
+        """Replace a cluster with what is left after erasing some of its contacts
+
+        ``erased`` holds (id, email, phone) of the erased contacts and
+        ``survivors`` (id, email, phone, primary id) of every other contact
+        of the cluster. Union-find can't unlink nodes, so the whole cluster
+        is dropped and the survivors are added back under their primaries.
+        """
+        contact_ids = {row[0] for row in erased} | {row[0] for row in survivors}
+        for contact_id, email, phone_number, *_ in [*erased, *survivors]:
+            email = self.normalize_email(email)
+            self._parent.pop(contact_id, None)
+            self._rank.pop(contact_id, None)
+            self._primary.pop(contact_id, None)
+            if email and self._emails.get(email) in contact_ids:
+                del self._emails[email]
+            if phone_number and self._phones.get(phone_number) in contact_ids:
+                del self._phones[phone_number]
+            if email and phone_number and self._pairs.get((email, phone_number)) in contact_ids:
+                del self._pairs[(email, phone_number)]
+
+        # Primaries first, so each secondary joins an existing set
+        for contact_id, email, phone_number, primary_id in sorted(survivors, key=lambda row: row[0] != row[3]):
+            self.add_contact(contact_id, email, phone_number, primary_id)
+
+    async def hydrate(self, db: AsyncSession) -> None:
+        """Rebuild the index from every active row of the contacts table
+
+        Rows are streamed so memory stays proportional to the index itself,
+        not to the result set.
+        """
+        self.begin_load()
+        result = await db.stream(hydration_query().execution_options(yield_per=1000))
+        async for row in result:
+            self.load_row(*row)
+        self.finish_load()
+
+    def hydrate_sync(self, connection: Connection) -> None:
+        """Rebuild the index over a synchronous connection (used by CLI tools)"""
+        self.begin_load()
+        result = connection.execute(hydration_query().execution_options(yield_per=1000))
+        for row in result:
+            self.load_row(*row)
+        self.finish_load()
+
+    def begin_load(self) -> None:
+        """Start a bulk load; rows are linked together in finish_load"""
+        self.clear()
+        self._pending_links = []
+        self._pending_primaries = []
+
+    def load_row(self, contact_id: int, email: Optional[str], phone_number: Optional[str],
+                 linked_id: Optional[int], link_precedence: str) -> None:
+        """Add one stored contact row during a bulk load"""
+        self._make_set(contact_id)
+        email = self.normalize_email(email)
+        if email:
+            self._emails.setdefault(email, contact_id)
+        if phone_number:
+            self._phones.setdefault(phone_number, contact_id)
+        if email and phone_number:
+            self._pairs.setdefault((email, phone_number), contact_id)
+
+        if linked_id is not None:
+            self._pending_links.append((contact_id, linked_id))
+        elif link_precedence == "primary":
+            self._pending_primaries.append(contact_id)
+
+    def finish_load(self) -> None:
+        """Join loaded rows into clusters and mark the index ready"""
+        for contact_id, linked_id in self._pending_links:
+            self._make_set(linked_id)
+            self._union(contact_id, linked_id)
+        for contact_id in self._pending_primaries:
+            self._primary[self._find(contact_id)] = contact_id
+
+        self._pending_links = []
+        self._pending_primaries = []
+        self.ready = True
+
+
+def hydration_query() -> Select:
+    """Columns needed to rebuild the index, for every active contact"""
+    return select(
+        Contact.id,
+        Contact.email,
+        Contact.phone_number,
+        Contact.linked_id,
+        Contact.link_precedence
+    ).where(Contact.deleted_at.is_(None)).order_by(Contact.id)
+
+
+# Process-wide index shared by all requests
+identity_index = IdentityIndex()
+
+
+# Dependency to get the shared index, or None when it is disabled. With
+# several workers it is the shared-memory index, so they all see each other's writes
+def get_identity_index() -> Optional[IdentityIndex]:
+    if not settings.identity_index_enabled:
+        return None
+    if settings.workers > 1:
+        # Imported here because the shared index builds on this module
+        from app.services.shared_index import shared_identity_index
+        return shared_identity_index
+    return identity_index
@@ -1,33 +1,218 @@
-from sqlalchemy import select, and_, or_
+from sqlalchemy import select, insert, update, and_
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.models.contact import Contact
+from sqlalchemy.orm.exc import StaleDataError
+from app.models.contact import Contact, ContactCluster, ContactMerge
 from app.schemas.response import ContactResponse, IdentifyResponse
-from typing import Optional, List
+from app.services.contact_graph import (
+    ContactGraph, active_identifier_filter, build_chain_query, load_contact_graph, summarize_cluster
+)
+from app.services.identity_index import IdentityIndex
+from app.services.contact_cache import ContactCache
+from app.services.identifier_locks import IdentifierLocks, identifier_keys
+from app.services.single_flight import SingleFlight
+from app.services.identifier_filter import IdentifierFilter
+from app.database import ReplicaRouter
+from app.metrics import track_request, observe_identify, timed_step, CHAIN_COMPRESSIONS
+from typing import Optional, List, Dict, Set, Tuple, Iterable, Callable, Awaitable, AsyncIterator, Any, TYPE_CHECKING
 from datetime import datetime
+from contextlib import AsyncExitStack
+import inspect
+import time
+
+if TYPE_CHECKING:
+    from app.services.group_commit import GroupCommitWriter
+
+# A unit of work runs this often when a concurrent writer changed a cluster
+# summary it had read (the summary's optimistic version check failed)
+STALE_SUMMARY_ATTEMPTS = 3
+
+class IdentifiersConflict(ValueError):
+    """The email and phone number belong to two customers that identify would merge"""
+
+class BrokenContactLink(Exception):
+    """A secondary's linked_id points at a contact that does not exist"""
 
 class IdentityService:
-    def __init__(self, db: AsyncSession):
+    def __init__(
+        self,
+        db: AsyncSession,
+        index: Optional[IdentityIndex] = None,
+        cache: Optional[ContactCache] = None,
+        locks: Optional[IdentifierLocks] = None,
+        replicas: Optional[ReplicaRouter] = None,
+        writer: Optional["GroupCommitWriter"] = None,
+        flights: Optional[SingleFlight] = None,
+        identifier_filter: Optional[IdentifierFilter] = None,
+        contact_ids: Optional[Callable[[], Awaitable[int]]] = None
+    ):
         self.db = db
+        # Optional in-memory identifier index; used only once it is hydrated
+        self.index = index
+        # Optional consolidated-response cache
+        self.cache = cache
+        # Optional identifier locks serializing concurrent calls for the same customer
+        self.locks = locks
+        # Optional read replica routing for pure reads
+        self.replicas = replicas
+        # Optional group-commit writer that applies and commits calls in micro-batches
+        self.writer = writer
+        # Optional table of in-flight calls, so identical concurrent calls run once
+        self.flights = flights
+        # Optional Bloom filter of known identifiers; a definite miss skips the lookup query
+        self.identifier_filter = identifier_filter
+        # Optional source of new contact ids; without it the database assigns them
+        self.contact_ids = contact_ids
+        # Primaries created or changed by this service; kept out of the cache
+        # and, once committed, away from a lagging replica
+        self._dirty_primaries: Set[int] = set()
+        # Cluster rows loaded for the current request (see load_contact_graph)
+        self.graph: Optional[ContactGraph] = None
+        # In-memory updates (e.g. index maintenance) waiting for the next commit
+        self._after_commit: List[Callable[[], Any]] = []
+        # Scenario (A-D) taken by the last resolved request, for metrics
+        self.scenario: Optional[str] = None
     
     async def identify_contact(self, email: Optional[str], phone_number: Optional[str]) -> IdentifyResponse:
         """
         Main entry point for identity reconciliation.
         
         Steps:
-        1. Find all matching contacts by email or phone
+        1. Load the matching contacts and their whole clusters in one query
         2. Determine if new contact creation is needed
         3. Handle linking logic (primary/secondary)
         4. Return consolidated response
+        
+        The whole call is a single unit of work: writes are only flushed and
+        the transaction is committed exactly once at the end. With identifier
+        locks, calls sharing an email or phone are serialized until commit.
+        With a flight table, identical concurrent calls share one execution.
         """
         # Normalize email to lowercase for case insensitivity
         if email:
             email = email.lower()
+        
+        started = time.perf_counter()
+        with track_request() as stats:
+            if self.flights is None:
+                response = await self._identify(email, phone_number)
+            else:
+                response, self.scenario = await self.flights.do(
+                    (email, phone_number), lambda: self._identify_with_scenario(email, phone_number)
+                )
+        observe_identify(
+            self.scenario, time.perf_counter() - started, stats,
+            1 + len(response.contact.secondaryContactIds)
+        )
+        return response
+    
+    async def _identify_with_scenario(self, email: Optional[str], phone_number: Optional[str]) -> Tuple[IdentifyResponse, str]:
+        """Run _identify and return the scenario along with the response, for coalesced calls"""
+        response = await self._identify(email, phone_number)
+        return response, self.scenario
+    
+    async def _identify(self, email: Optional[str], phone_number: Optional[str]) -> IdentifyResponse:
+        """Serve a request from the cache, or resolve it under its identifier locks"""
+        # Repeat customers whose identifiers all map to one cached cluster
+        if self.cache is not None:
+            await self._evict_remote_changes()
+            cached_contact = await self.cache.lookup(email, phone_number)
+            if cached_contact is not None:
+                self.scenario = "C"
+                return IdentifyResponse.from_contact(cached_contact)
+            
+        if self.writer is not None and not self._is_indexed_exact_match(email, phone_number):
+            # Inserts and links are applied by the writer; wait until they are committed
+            response, self.scenario = await self.writer.submit(email, phone_number)
+            return response
             
+        return await self._identify_unit_of_work(email, phone_number)
+    
+    def _index_can_answer(self, email: Optional[str], phone_number: Optional[str]) -> bool:
+        """Check whether the index alone may decide the scenario of a request
+
+        Only hits are trusted. Another worker, instance or tool may have
+        committed an identifier this process's index has not seen, so a miss
+        is re-checked in SQL by taking the graph path instead.
+        """
+        if self.index is None or not self.index.ready:
+            return False
+        return (
+            (not email or self.index.primary_for_email(email) is not None)
+            and (not phone_number or self.index.primary_for_phone(phone_number) is not None)
+        )
+    
+    def _is_indexed_exact_match(self, email: Optional[str], phone_number: Optional[str]) -> bool:
+        """Check whether the index already knows this exact pair, so nothing will be written"""
+        return (
+            self.index is not None and self.index.ready
+            and self.index.contact_for_pair(email, phone_number) is not None
+        )
+    
+    async def _identify_unit_of_work(self, email: Optional[str], phone_number: Optional[str]) -> IdentifyResponse:
+        """Resolve one request under its identifier locks and commit it as a single transaction
+        
+        If a concurrent writer changed a cluster summary this call read, the
+        transaction is rolled back and the request resolved again. Each
+        attempt takes the identifier locks afresh, since the rollback ends the
+        transaction that held the advisory locks on Postgres.
+        """
+        for attempt in range(STALE_SUMMARY_ATTEMPTS):
+            try:
+                async with AsyncExitStack() as stack:
+                    if self.locks is not None:
+                        await stack.enter_async_context(
+                            self.locks.hold(self.db, identifier_keys([email], [phone_number]))
+                        )
+                    return await self._resolve_and_commit(email, phone_number)
+            except StaleDataError:
+                self.graph = None
+                if attempt == STALE_SUMMARY_ATTEMPTS - 1:
+                    raise
+    
+    async def _resolve_and_commit(self, email: Optional[str], phone_number: Optional[str]) -> IdentifyResponse:
+        """Run one attempt of a request, rolling back if anything fails"""
+        try:
+            if self._index_can_answer(email, phone_number):
+                # Serve the read side from the in-memory index when it is available;
+                # a graph loaded by an earlier call on this service is out of date
+                self.graph = None
+                response = await self.identify_with_index(email, phone_number)
+            else:
+                # Load matched rows, their primaries and all siblings in one round trip
+                self.graph = await self._load_request_graph(email, phone_number)
+                response = await self.resolve_contact(email, phone_number)
+            await self.commit()
+            return response
+        except BaseException:
+            await self.rollback()
+            raise
+    
+    async def _load_request_graph(self, email: Optional[str], phone_number: Optional[str]) -> ContactGraph:
+        """Load the clusters of one request, without a query for never-seen identifiers"""
+        if self.identifier_filter is not None and self.identifier_filter.ready:
+            if not self.identifier_filter.might_contain(email, phone_number):
+                # Definitely a new customer: an empty graph leads straight to Scenario A
+                return ContactGraph([], [email], [phone_number])
+            graph = await load_contact_graph(self.db, [email], [phone_number], for_update=self.locks is not None)
+            if not graph.find_matching(email, phone_number):
+                self.identifier_filter.record_false_positive()
+            return graph
+        
+        return await load_contact_graph(self.db, [email], [phone_number], for_update=self.locks is not None)
+    
+    async def resolve_contact(self, email: Optional[str], phone_number: Optional[str]) -> IdentifyResponse:
+        """
+        Run the reconciliation scenarios against the loaded contact graph.
+        
+        Expects an already normalized email. Lookups fall back to SQL for any
+        identifier the graph was not loaded for.
+        """
         # Find matching contacts
         matching_contacts = await self.find_matching_contacts(email, phone_number)
         
         # Scenario A: No existing contacts
         if not matching_contacts:
+            self.scenario = "A"
             primary_contact = await self.create_primary_contact(email, phone_number)
         else:
             # Check if we have an exact match (both email and phone match the same contact)
@@ -35,6 +220,7 @@ class IdentityService:
             
             if exact_match:
                 # Scenario C: Exact match
+                self.scenario = "C"
                 primary_contact = await self.get_primary_contact(exact_match.id)
             else:
                 # Check if we have matches for both email and phone but to different primaries
@@ -44,9 +230,11 @@ class IdentityService:
                 if email_matches and phone_matches and \
                    (await self.get_primary_contact(email_matches[0].id)).id != (await self.get_primary_contact(phone_matches[0].id)).id:
                     # Scenario D: Link two separate primary contacts
+                    self.scenario = "D"
                     primary_contact = await self.link_primary_contacts(
                         await self.get_primary_contact(email_matches[0].id),
-                        await self.get_primary_contact(phone_matches[0].id)
+                        await self.get_primary_contact(phone_matches[0].id),
+                        email, phone_number
                     )
                     
                     # Create a new secondary contact if we have new info
@@ -68,24 +256,212 @@ class IdentityService:
                             await self.create_secondary_contact(email, phone_number, primary_contact.id)
                 else:
                     # Scenario B: Partial match (one field matches)
+                    self.scenario = "B"
                     existing_contact = matching_contacts[0]
                     primary_contact = await self.handle_partial_match(existing_contact, email, phone_number)
         
         # Get consolidated contact information
         consolidated_contact = await self.get_consolidated_contact(primary_contact.id)
-        return IdentifyResponse(contact=consolidated_contact)
+        return IdentifyResponse.from_contact(consolidated_contact)
     
-    async def find_matching_contacts(self, email: Optional[str], phone_number: Optional[str]) -> List[Contact]:
-        """Find contacts by email or phone"""
-        query = select(Contact).where(
-            and_(
-                Contact.deleted_at.is_(None),
-                or_(
-                    Contact.email == email if email else False,
-                    Contact.phone_number == phone_number if phone_number else False
+    async def identify_batch(self, pairs: List[Tuple[Optional[str], Optional[str]]]) -> List[IdentifyResponse]:
+        """
+        Identify many (email, phone) pairs in a single transaction.
+        
+        Results are identical to calling identify_contact for each pair in
+        order, but all clusters are loaded up front with set-based queries
+        and the whole batch is committed once. A batch that lost a summary
+        update to a concurrent writer is rolled back and run again; every
+        attempt is a fresh iter_identify_batch, which takes the identifier
+        locks again in its own transaction.
+        """
+        for attempt in range(STALE_SUMMARY_ATTEMPTS):
+            try:
+                return [response async for response in self.iter_identify_batch(pairs)]
+            except StaleDataError:
+                if attempt == STALE_SUMMARY_ATTEMPTS - 1:
+                    raise
+    
+    async def iter_identify_batch(self, pairs: List[Tuple[Optional[str], Optional[str]]]) -> AsyncIterator[IdentifyResponse]:
+        """
+        Yield each batch result as soon as it is resolved.
+        
+        Pairs are applied in arrival order against one in-memory contact graph
+        and written without committing; the transaction is committed after the
+        last pair, or rolled back if anything fails or the consumer stops early.
+        The identifier locks are held for exactly that transaction.
+        """
+        pairs = [(email.lower() if email else None, phone_number) for email, phone_number in pairs]
+        emails = [email for email, _ in pairs]
+        phone_numbers = [phone_number for _, phone_number in pairs]
+        
+        async with AsyncExitStack() as stack:
+            if self.locks is not None:
+                await stack.enter_async_context(
+                    self.locks.hold(self.db, identifier_keys(emails, phone_numbers))
+                )
+            try:
+                # Load every cluster touched by the batch with IN (...) queries
+                self.graph = await load_contact_graph(
+                    self.db, emails, phone_numbers, for_update=self.locks is not None
                 )
+                for email, phone_number in pairs:
+                    yield await self.resolve_contact(email, phone_number)
+                await self.commit()
+            except BaseException:
+                await self.rollback()
+                raise
+    
+    async def commit(self) -> None:
+        """Commit the session and apply in-memory updates queued for this commit"""
+        await self.db.commit()
+        if self.replicas is not None:
+            self.replicas.record_writes(self._dirty_primaries)
+        callbacks, self._after_commit = self._after_commit, []
+        for callback in callbacks:
+            result = callback()
+            if inspect.isawaitable(result):
+                await result
+    
+    async def rollback(self) -> None:
+        """Roll back the session and drop in-memory updates queued for the commit"""
+        await self.db.rollback()
+        self._after_commit.clear()
+    
+    async def identify_with_index(self, email: Optional[str], phone_number: Optional[str]) -> IdentifyResponse:
+        """
+        Identity reconciliation using the in-memory identifier index.
+        
+        Matching, exact-match detection and primary resolution are answered by
+        the index; the database is only used for writes and for building the
+        consolidated response. Expects an already normalized email.
+        """
+        email_primary_id = self.index.primary_for_email(email)
+        phone_primary_id = self.index.primary_for_phone(phone_number)
+        
+        if email_primary_id is None and phone_primary_id is None:
+            # Scenario A: No existing contacts
+            self.scenario = "A"
+            primary_contact = await self.create_primary_contact(email, phone_number)
+            primary_id = primary_contact.id
+        elif self.index.contact_for_pair(email, phone_number) is not None:
+            # Scenario C: Exact match
+            self.scenario = "C"
+            primary_id = self.index.primary_of(self.index.contact_for_pair(email, phone_number))
+        elif email_primary_id is not None and phone_primary_id is not None and email_primary_id != phone_primary_id:
+            # Scenario D: Link two separate primary contacts
+            # After linking both identifiers belong to the cluster, so no secondary is needed
+            self.scenario = "D"
+            primaries = await self._lock_primaries([email_primary_id, phone_primary_id])
+            if primaries is None:
+                return await self._identify_without_index(email, phone_number)
+            primary_contact = await self.link_primary_contacts(
+                primaries[email_primary_id], primaries[phone_primary_id], email, phone_number
             )
-        )
+            primary_id = primary_contact.id
+        else:
+            # Scenario B: Partial match, add a secondary if any identifier is new
+            self.scenario = "B"
+            primary_id = email_primary_id if email_primary_id is not None else phone_primary_id
+            if (email and email_primary_id is None) or (phone_number and phone_primary_id is None):
+                if await self._lock_primaries([primary_id]) is None:
+                    return await self._identify_without_index(email, phone_number)
+                await self.create_secondary_contact(email, phone_number, primary_id)
+        
+        # An exact match writes nothing, so its response may come from the replica
+        consolidated_contact = await self.get_consolidated_contact(primary_id, prefer_replica=self.scenario == "C")
+        return IdentifyResponse.from_contact(consolidated_contact)
+    
+    async def lookup_contact(self, email: Optional[str], phone_number: Optional[str]) -> Optional[IdentifyResponse]:
+        """
+        Resolve the customer behind an email and/or phone without writing.
+
+        Answers from the cache, then the index, and only then from a single
+        cluster query, preferring the read replica for the SQL; nothing is
+        inserted, linked, flattened or committed.
+        Returns None when no contact matches, and raises IdentifiersConflict
+        when the identifiers belong to two customers that identify_contact
+        would merge.
+        """
+        if email:
+            email = email.lower()
+
+        if self.cache is not None:
+            await self._evict_remote_changes()
+            cached_contact = await self.cache.lookup(email, phone_number)
+            if cached_contact is not None:
+                return IdentifyResponse.from_contact(cached_contact)
+
+        if self.identifier_filter is not None and self.identifier_filter.ready and \
+           not self.identifier_filter.might_contain(email, phone_number):
+            return None
+
+        if self._index_can_answer(email, phone_number):
+            primary_ids = {self.index.primary_for_email(email), self.index.primary_for_phone(phone_number)}
+            primary_ids.discard(None)
+        else:
+            primary_ids = None
+            if self.replicas is not None:
+                async with self.replicas.read_session() as replica_db:
+                    if replica_db is not None:
+                        graph = await load_contact_graph(replica_db, [email], [phone_number])
+                        replica_primary_ids = self._matched_primary_ids(graph, email, phone_number)
+                        # A lagging replica can miss new contacts and merges, so
+                        # only a single cluster this process didn't just change is trusted
+                        if len(replica_primary_ids) == 1 and not self.replicas.recently_written(replica_primary_ids):
+                            self.graph, primary_ids = graph, replica_primary_ids
+            if primary_ids is None:
+                self.graph = await load_contact_graph(self.db, [email], [phone_number])
+                primary_ids = self._matched_primary_ids(self.graph, email, phone_number)
+
+        if not primary_ids:
+            return None
+        if len(primary_ids) > 1:
+            raise IdentifiersConflict("Identifiers belong to different contacts")
+
+        consolidated_contact = await self.get_consolidated_contact(primary_ids.pop(), prefer_replica=True)
+        return IdentifyResponse.from_contact(consolidated_contact)
+
+    @staticmethod
+    def _matched_primary_ids(graph: ContactGraph, email: Optional[str], phone_number: Optional[str]) -> Set[int]:
+        """Primary ids of the clusters holding the email or phone in a loaded graph"""
+        primary_ids = set()
+        for contact in graph.find_matching(email, phone_number):
+            primary_contact = graph.get_primary(contact.id)
+            if primary_contact is None:
+                raise BrokenContactLink("Linked contact not found")
+            primary_ids.add(primary_contact.id)
+        return primary_ids
+    
+    async def _lock_primaries(self, primary_ids: List[int]) -> Optional[Dict[int, Contact]]:
+        """Load the primaries about to change, locked with FOR UPDATE on Postgres
+        
+        Returns them by id, or None if the index was stale and one of them is
+        no longer an active primary (merged or erased by another writer).
+        """
+        query = select(Contact).where(Contact.id.in_(primary_ids)).order_by(Contact.id)
+        if self.locks is not None and self.db.bind.dialect.name == "postgresql":
+            query = query.with_for_update()
+        primaries = {contact.id: contact for contact in (await self.db.execute(query)).scalars().all()}
+        for primary_id in primary_ids:
+            contact = primaries.get(primary_id)
+            if (contact is None or contact.link_precedence != "primary" or contact.linked_id is not None
+                    or contact.deleted_at is not None):
+                return None
+        return primaries
+    
+    async def _identify_without_index(self, email: Optional[str], phone_number: Optional[str]) -> IdentifyResponse:
+        """Resolve a request from the locked rows after the index turned out to be stale"""
+        self.graph = await load_contact_graph(self.db, [email], [phone_number], for_update=self.locks is not None)
+        return await self.resolve_contact(email, phone_number)
+    
+    @timed_step("find_matching_contacts")
+    async def find_matching_contacts(self, email: Optional[str], phone_number: Optional[str]) -> List[Contact]:
+        """Find contacts by email or phone"""
+        if self.graph is not None and self.graph.covers(email, phone_number):
+            return self.graph.find_matching(email, phone_number)
+            
+        query = select(Contact).where(active_identifier_filter([email], [phone_number]))
         result = await self.db.execute(query)
         return list(result.scalars().all())
     
@@ -99,37 +475,96 @@ class IdentityService:
                 return contact
         return None
     
-    async def create_primary_contact(self, email: Optional[str], phone_number: Optional[str]) -> Contact:
+    async def create_primary_contact(self, email: Optional[str], phone_number: Optional[str],
+                                     contact_id: Optional[int] = None) -> Contact:
         """Create a new primary contact when no matches found"""
-        primary_contact = Contact(
-            email=email,
-            phone_number=phone_number,
-            link_precedence="primary",
-            created_at=datetime.utcnow(),
-            updated_at=datetime.utcnow()
+        # INSERT ... RETURNING hands back the new row without a refresh
+        primary_contact = await self.db.scalar(
+            insert(Contact).values(
+                **await self._contact_id_value(contact_id),
+                email=email,
+                phone_number=phone_number,
+                link_precedence="primary",
+                created_at=datetime.utcnow(),
+                updated_at=datetime.utcnow()
+            ).returning(Contact)
         )
-        self.db.add(primary_contact)
-        await self.db.commit()
-        await self.db.refresh(primary_contact)
+        
+        # Start the materialized summary of the new cluster
+        self.db.add(ContactCluster(
+            primary_id=primary_contact.id,
+            emails=[email] if email else [],
+            phone_numbers=[phone_number] if phone_number else [],
+            secondary_ids=[]
+        ))
+        
+        if self.index is not None:
+            self._after_commit.append(
+                lambda: self.index.add_contact(primary_contact.id, email, phone_number, primary_contact.id)
+            )
+        if self.identifier_filter is not None:
+            self.identifier_filter.add_contact(email, phone_number)
+        self._dirty_primaries.add(primary_contact.id)
+        if self.graph is not None:
+            self.graph.add(primary_contact)
         return primary_contact
     
+    async def _contact_id_value(self, contact_id: Optional[int] = None) -> dict:
+        """The id column of a new contact, when ids are not left to the database"""
+        if contact_id is None and self.contact_ids is not None:
+            contact_id = await self.contact_ids()
+        return {"id": contact_id} if contact_id is not None else {}
+    
     async def create_secondary_contact(self, email: Optional[str], phone_number: Optional[str], primary_id: int) -> Contact:
         """Create a secondary contact linked to a primary"""
-        secondary_contact = Contact(
-            email=email,
-            phone_number=phone_number,
-            linked_id=primary_id,
-            link_precedence="secondary",
-            created_at=datetime.utcnow(),
-            updated_at=datetime.utcnow()
+        # INSERT ... RETURNING hands back the new row without a refresh
+        secondary_contact = await self.db.scalar(
+            insert(Contact).values(
+                **await self._contact_id_value(),
+                email=email,
+                phone_number=phone_number,
+                linked_id=primary_id,
+                link_precedence="secondary",
+                created_at=datetime.utcnow(),
+                updated_at=datetime.utcnow()
+            ).returning(Contact)
         )
-        self.db.add(secondary_contact)
-        await self.db.commit()
-        await self.db.refresh(secondary_contact)
+        if self.graph is not None:
+            self.graph.add(secondary_contact)
+        if self.identifier_filter is not None:
+            self.identifier_filter.add_contact(email, phone_number)
+        
+        # Append the newest member to the cluster summary
+        summary = await self.db.get(ContactCluster, primary_id)
+        if summary is None:
+            await self.update_cluster_summary(await self.get_primary_contact(primary_id))
+        else:
+            if email and email not in summary.emails:
+                summary.emails = summary.emails + [email]
+            if phone_number and phone_number not in summary.phone_numbers:
+                summary.phone_numbers = summary.phone_numbers + [phone_number]
+            summary.secondary_ids = summary.secondary_ids + [secondary_contact.id]
+        
+        if self.index is not None:
+            self._after_commit.append(
+                lambda: self.index.add_contact(secondary_contact.id, email, phone_number, primary_id)
+            )
+        self._invalidate_cached(primary_id)
         return secondary_contact
     
+    @timed_step("get_primary_contact")
     async def get_primary_contact(self, contact_id: int) -> Contact:
-        """Get the primary contact from any contact ID"""
+        """Get the primary contact from any contact ID
+        
+        Chains longer than one hop are flattened on the way (path compression),
+        so the next resolution of the same rows is a single hop.
+        """
+        if self.graph is not None and contact_id in self.graph:
+            path = self.graph.get_path(contact_id)
+            if path is not None:
+                await self.compress_path(path)
+                return path[-1]
+                
         contact = await self.db.get(Contact, contact_id)
         if not contact:
             raise ValueError("Contact not found")
@@ -138,23 +573,57 @@ class IdentityService:
         if contact.link_precedence == "primary":
             return contact
             
-        # Otherwise follow linked_id to find primary
-        while contact.linked_id is not None:
-            contact = await self.db.get(Contact, contact.linked_id)
-            if not contact:
-                raise ValueError("Linked contact not found")
-                
-        return contact
+        # Otherwise load the whole chain up to the root in a single recursive query
+        chain = {row.id: row for row in await self.db.scalars(build_chain_query(contact.linked_id))}
+        path = [contact]
+        while path[-1].linked_id is not None:
+            parent = chain.get(path[-1].linked_id)
+            if parent is None:
+                raise BrokenContactLink("Linked contact not found")
+            path.append(parent)
+        
+        await self.compress_path(path)
+        return path[-1]
+    
+    async def compress_path(self, path: List[Contact]) -> None:
+        """Repoint every row of a resolved chain straight at its root
+        
+        ``path`` runs from the resolved contact to the root primary. Rows more
+        than one hop away are relinked in the current transaction; since
+        responses only count a primary's direct secondaries, the root's
+        summary is rebuilt and its cached response invalidated. This turns a
+        graph-path exact match (Scenario C) over an unflattened chain into a
+        write, once per chain, because its response would otherwise miss the
+        deeper rows.
+        """
+        root = path[-1]
+        deep_rows = [contact for contact in path[:-1] if contact.linked_id != root.id]
+        if not deep_rows:
+            return
+        
+        for contact in deep_rows:
+            previous_linked_id = contact.linked_id
+            contact.linked_id = root.id
+            contact.updated_at = datetime.utcnow()
+            if self.graph is not None:
+                self.graph.relink(contact, previous_linked_id)
+        CHAIN_COMPRESSIONS.inc(amount=len(deep_rows))
+        
+        await self.update_cluster_summary(root)
+        self._invalidate_cached(root.id)
     
     async def get_secondary_contacts(self, primary_id: int) -> List[Contact]:
         """Get all secondary contacts for a primary contact"""
+        if self.graph is not None and primary_id in self.graph:
+            return self.graph.get_secondaries(primary_id)
+            
         query = select(Contact).where(
             and_(
                 Contact.linked_id == primary_id,
                 Contact.link_precedence == "secondary",
                 Contact.deleted_at.is_(None)
             )
-        )
+        ).order_by(Contact.created_at, Contact.id)
         result = await self.db.execute(query)
         return list(result.scalars().all())
     
@@ -184,8 +653,15 @@ class IdentityService:
             
         return primary_contact
     
-    async def link_primary_contacts(self, email_primary: Contact, phone_primary: Contact) -> Contact:
-        """Handle case where email matches one primary, phone matches another primary"""
+    @timed_step("link_primary_contacts")
+    async def link_primary_contacts(self, email_primary: Contact, phone_primary: Contact,
+                                    email: Optional[str] = None, phone_number: Optional[str] = None) -> Contact:
+        """Handle case where email matches one primary, phone matches another primary
+        
+        ``email`` and ``phone_number`` are the identifiers that tied the two
+        clusters together; they are recorded as the merge's evidence (see
+        ContactMerge).
+        """
         # Identify which primary is older (by created_at)
         if email_primary.created_at <= phone_primary.created_at:
             older_primary = email_primary
@@ -198,51 +674,148 @@ class IdentityService:
         newer_primary.linked_id = older_primary.id
         newer_primary.link_precedence = "secondary"
         newer_primary.updated_at = datetime.utcnow()
+        if self.graph is not None:
+            self.graph.relink(newer_primary, None)
         
         # Update ALL contacts linked to newer primary to link to older primary
-        secondary_contacts = await self.get_secondary_contacts(newer_primary.id)
-        for secondary in secondary_contacts:
-            secondary.linked_id = older_primary.id
-            secondary.updated_at = datetime.utcnow()
+        # with one set-based UPDATE; loaded objects are synchronized in place.
+        # A loaded graph holds the whole cluster, so an empty one needs no UPDATE.
+        in_graph = self.graph is not None and newer_primary.id in self.graph
+        moved_secondaries = self.graph.get_secondaries(newer_primary.id) if in_graph else []
+        if moved_secondaries or not in_graph:
+            await self.db.execute(
+                update(Contact)
+                .where(
+                    Contact.linked_id == newer_primary.id,
+                    Contact.link_precedence == "secondary",
+                    Contact.deleted_at.is_(None)
+                )
+                .values(linked_id=older_primary.id, updated_at=datetime.utcnow())
+                .execution_options(synchronize_session="evaluate")
+            )
+        for secondary in moved_secondaries:
+            self.graph.relink(secondary, newer_primary.id)
             
-        await self.db.commit()
-        await self.db.refresh(newer_primary)
+        if email and phone_number:
+            self.db.add(ContactMerge(email=email, phone_number=phone_number))
+            
+        # Rebuild the surviving cluster summary and drop the demoted one
+        await self.update_cluster_summary(older_primary)
+        newer_summary = await self.db.get(ContactCluster, newer_primary.id)
+        if newer_summary is not None:
+            await self.db.delete(newer_summary)
+            
+        if self.index is not None:
+            self._after_commit.append(lambda: self.index.merge(older_primary.id, newer_primary.id))
+        self._invalidate_cached(older_primary.id)
+        self._invalidate_cached(newer_primary.id)
         return older_primary
     
-    async def get_consolidated_contact(self, primary_id: int) -> ContactResponse:
-        """Build consolidated response for a primary contact"""
-        # Fetch primary contact
-        primary_contact = await self.db.get(Contact, primary_id)
-        if not primary_contact:
-            raise ValueError("Primary contact not found")
-            
-        # Fetch all secondary contacts
-        secondary_contacts = await self.get_secondary_contacts(primary_id)
+    async def update_cluster_summary(self, primary_contact: Contact) -> ContactCluster:
+        """Rewrite a cluster's materialized summary from its current members"""
+        secondary_contacts = await self.get_secondary_contacts(primary_contact.id)
+        emails, phone_numbers, secondary_ids = summarize_cluster(primary_contact, secondary_contacts)
         
-        # Collect unique emails (primary first, then secondaries by createdAt)
-        emails = []
-        if primary_contact.email:
-            emails.append(primary_contact.email)
-            
-        for secondary in sorted(secondary_contacts, key=lambda x: x.created_at):
-            if secondary.email and secondary.email not in emails:
-                emails.append(secondary.email)
-        
-        # Collect unique phone numbers (primary first, then secondaries by createdAt)
-        phone_numbers = []
-        if primary_contact.phone_number:
-            phone_numbers.append(primary_contact.phone_number)
+        summary = await self.db.get(ContactCluster, primary_contact.id)
+        if summary is None:
+            summary = ContactCluster(primary_id=primary_contact.id)
+            self.db.add(summary)
+        summary.emails = emails
+        summary.phone_numbers = phone_numbers
+        summary.secondary_ids = secondary_ids
+        return summary
+    
+    async def _evict_remote_changes(self) -> None:
+        """Drop cached responses of clusters that other worker processes changed"""
+        if self.index is None:
+            return
+        changed_primaries = self.index.changed_primaries()
+        if changed_primaries is None:
+            # Too many changes to list, so nothing cached can be trusted
+            await self.cache.clear()
+            return
+        for primary_id in changed_primaries:
+            await self.cache.invalidate(primary_id)
+    
+    def cluster_rewritten(
+        self,
+        primary_ids: Iterable[int],
+        erased: Iterable[Tuple[int, Optional[str], Optional[str]]] = (),
+        survivors: Iterable[Tuple[int, Optional[str], Optional[str], int]] = ()
+    ) -> None:
+        """Record clusters whose links were changed outside the identify scenarios
+
+        Cached responses of ``primary_ids`` are evicted once committed. When
+        contacts were erased, ``erased`` lists their (id, email, phone) and
+        ``survivors`` the (id, email, phone, primary id) of every contact left
+        in the affected clusters, for the index to apply after the commit.
+        """
+        for primary_id in primary_ids:
+            self._invalidate_cached(primary_id)
+        erased, survivors = list(erased), list(survivors)
+        if self.index is not None and erased:
+            self._after_commit.append(lambda: self.index.split(erased, survivors))
+
+    def _invalidate_cached(self, primary_id: int) -> None:
+        """Keep a changed cluster out of the cache now and evict it once committed"""
+        self._dirty_primaries.add(primary_id)
+        if self.cache is None:
+            return
+        self._after_commit.append(lambda: self.cache.invalidate(primary_id))
+    
+    @timed_step("get_consolidated_contact")
+    async def get_consolidated_contact(self, primary_id: int, prefer_replica: bool = False) -> ContactResponse:
+        """Build consolidated response for a primary contact
+        
+        With ``prefer_replica`` the summary row is read from the read replica
+        when the router allows it, falling back to the primary if the replica
+        doesn't have it yet.
+        """
+        use_cache = self.cache is not None and primary_id not in self._dirty_primaries
+        if use_cache:
+            cached_contact = await self.cache.get(primary_id)
+            if cached_contact is not None:
+                return cached_contact
+            cache_token = self.cache.begin_read(primary_id)
             
-        for secondary in sorted(secondary_contacts, key=lambda x: x.created_at):
-            if secondary.phone_number and secondary.phone_number not in phone_numbers:
-                phone_numbers.append(secondary.phone_number)
-        
-        # Collect all secondary IDs
-        secondary_contact_ids = [secondary.id for secondary in secondary_contacts]
-        
-        return ContactResponse(
-            primaryContatctId=primary_contact.id,
-            emails=emails,
-            phoneNumbers=phone_numbers,
-            secondaryContactIds=secondary_contact_ids
-        )
\ No newline at end of file
+        # Prefer rows already loaded for this request, then the materialized
+        # summary row, and only rebuild from the contacts table as a fallback
+        if self.graph is not None and primary_id in self.graph:
+            primary_contact = self.graph.contacts[primary_id]
+            emails, phone_numbers, secondary_contact_ids = summarize_cluster(
+                primary_contact, self.graph.get_secondaries(primary_id)
+            )
+        else:
+            summary = None
+            if prefer_replica:
+                summary = await self._read_replica_summary(primary_id)
+            if summary is None:
+                summary = await self.db.get(ContactCluster, primary_id)
+            if summary is not None:
+                emails = summary.emails
+                phone_numbers = summary.phone_numbers
+                secondary_contact_ids = summary.secondary_ids
+            else:
+                primary_contact = await self.db.get(Contact, primary_id)
+                if not primary_contact:
+                    raise ValueError("Primary contact not found")
+                secondary_contacts = await self.get_secondary_contacts(primary_id)
+                emails, phone_numbers, secondary_contact_ids = summarize_cluster(
+                    primary_contact, secondary_contacts
+                )
+        
+        consolidated_contact = ContactResponse.from_trusted(
+            primary_id, emails, phone_numbers, secondary_contact_ids
+        )
+        if use_cache:
+            await self.cache.store(consolidated_contact, cache_token)
+        return consolidated_contact
+    
+    async def _read_replica_summary(self, primary_id: int) -> Optional[ContactCluster]:
+        """Load a cluster summary from the replica, or None if the primary must be asked"""
+        if self.replicas is None or primary_id in self._dirty_primaries:
+            return None
+        async with self.replicas.read_session([primary_id]) as replica_db:
+            if replica_db is None:
+                return None
+            return await replica_db.get(ContactCluster, primary_id)
\ No newline at end of file
@@ -0,0 +1,400 @@
+import asyncio
+import hashlib
+from datetime import datetime
+from sqlalchemy import select, insert, update, delete, literal, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.sql import Select
+from app.config import settings
+from app.database import engine_options
+from app.models.contact import Base, Contact, ContactCluster, ContactMerge
+from app.models.directory import DirectoryBase, IdentifierEntry, ContactIdBlock, ShardMigration
+from app.schemas.response import IdentifyResponse
+from app.services.identity_service import IdentityService, IdentifiersConflict
+from typing import Optional, List, Dict, Any
+
+# A request retries this often when a concurrent one claimed the same identifier first
+MAX_ATTEMPTS = 3
+
+
+def directory_keys(email: Optional[str], phone_number: Optional[str]) -> List[str]:
+    """Directory identifiers of a request; expects an already normalized email"""
+    keys = []
+    if email:
+        keys.append(f"email:{email}")
+    if phone_number:
+        keys.append(f"phone:{phone_number}")
+    return keys
+
+
+class ClusterMoved(Exception):
+    """The cluster a request resolved to started moving before the request wrote to it"""
+
+
+def lock_primaries_query(primary_ids) -> Select:
+    """Lock the primary rows of clusters on their shard, in id order"""
+    return select(Contact.id).where(Contact.id.in_(sorted(primary_ids))).order_by(Contact.id).with_for_update()
+
+
+def cluster_members_query(primary_id: int) -> Select:
+    """Every row of a cluster, parents before the rows linked to them"""
+    members = (
+        select(Contact.id, literal(0).label("depth"))
+        .where(Contact.id == primary_id)
+        .cte("members", recursive=True)
+    )
+    members = members.union_all(
+        select(Contact.id, members.c.depth + 1)
+        .join(members, Contact.linked_id == members.c.id)
+    )
+    return select(Contact).join(members, Contact.id == members.c.id).order_by(members.c.depth, Contact.id)
+
+
+class ContactIdAllocator:
+    """Hand out contact ids that are unique across all shards
+
+    Ids are reserved from the directory in blocks, so most calls cost no
+    round trip.
+    """
+
+    def __init__(self, directory_factory: async_sessionmaker, block_size: int = 100):
+        self.directory_factory = directory_factory
+        self.block_size = block_size
+        self._next = 0
+        self._end = 0
+        self._lock = asyncio.Lock()
+
+    async def __call__(self) -> int:
+        async with self._lock:
+            if self._next >= self._end:
+                async with self.directory_factory() as db:
+                    end = await db.scalar(
+                        update(ContactIdBlock)
+                        .where(ContactIdBlock.name == "contacts")
+                        .values(next_id=ContactIdBlock.next_id + self.block_size)
+                        .returning(ContactIdBlock.next_id)
+                    )
+                    await db.commit()
+                self._next, self._end = end - self.block_size, end
+            contact_id = self._next
+            self._next += 1
+            return contact_id
+
+
+class ShardCoordinator:
+    """Identify customers across contacts stored on several databases
+
+    Each cluster lives on one shard, chosen by a hash of its primary id.
+    A directory database maps every email and phone to its cluster's
+    primary id and shard, so a request goes to exactly one shard. There it
+    runs through ``IdentityService`` unchanged, with contact ids taken from
+    the directory so they stay unique across shards.
+
+    Directory entries for new identifiers are committed before the shard
+    write. A crash in between leaves an entry pointing at a cluster that
+    doesn't have the identifier yet, which the next request for it fixes.
+
+    A merge of clusters on two shards moves the newer cluster to the older
+    primary's shard as a logged migration (see ShardMigration). The copy
+    and the merge are a single transaction on the target shard. The
+    directory then points at the target, and only after that is the source
+    copy deleted. Any step can be repeated, so an interrupted migration is
+    rolled forward by ``recover`` or by the next request that touches the
+    cluster.
+
+    Writes are fenced off the moving cluster: a request locks its cluster's
+    primary row on the shard and re-reads the directory before writing, and
+    a migration holds the same row lock on the source shard from the copy
+    until the directory points at the target. A request that finds the
+    cluster moving or moved starts over.
+    """
+
+    def __init__(self, shard_factories: List[async_sessionmaker], directory_factory: async_sessionmaker,
+                 id_block_size: int = 100):
+        self.shards = shard_factories
+        self.directory = directory_factory
+        self.contact_ids = ContactIdAllocator(directory_factory, id_block_size)
+        self._migration_lock = asyncio.Lock()
+
+    def shard_for(self, primary_id: int) -> int:
+        """Shard a cluster is placed on, by hash of its primary id"""
+        digest = hashlib.blake2b(str(primary_id).encode("utf-8"), digest_size=8).digest()
+        return int.from_bytes(digest, "little") % len(self.shards)
+
+    async def create_schema(self) -> None:
+        """Create the tables on every shard and the directory, and seed the id counter"""
+        for factory in self.shards:
+            async with factory() as db:
+                await (await db.connection()).run_sync(Base.metadata.create_all)
+                await db.commit()
+        async with self.directory() as db:
+            await (await db.connection()).run_sync(DirectoryBase.metadata.create_all)
+            if await db.get(ContactIdBlock, "contacts") is None:
+                db.add(ContactIdBlock(name="contacts", next_id=1))
+            await db.commit()
+
+    async def _entries(self, keys: List[str]) -> Dict[str, IdentifierEntry]:
+        async with self.directory() as db:
+            result = await db.execute(select(IdentifierEntry).where(IdentifierEntry.identifier.in_(keys)))
+            return {entry.identifier: entry for entry in result.scalars().all()}
+
+    async def _resolve_entries(self, keys: List[str]) -> Dict[str, IdentifierEntry]:
+        """Directory entries of the identifiers, after finishing any migration they wait for"""
+        entries = await self._entries(keys)
+        pending = {entry.migration_id for entry in entries.values() if entry.migration_id is not None}
+        if not pending:
+            return entries
+        for migration_id in pending:
+            await self.finish_migration(migration_id)
+        return await self._entries(keys)
+
+    async def identify(self, email: Optional[str], phone_number: Optional[str]) -> IdentifyResponse:
+        """Sharded counterpart of IdentityService.identify_contact"""
+        if email:
+            email = email.lower()
+        for attempt in range(MAX_ATTEMPTS):
+            try:
+                return await self._identify(email, phone_number)
+            except (IntegrityError, ClusterMoved):
+                # A concurrent request claimed one of the identifiers, or the
+                # cluster started moving to another shard; start over
+                if attempt == MAX_ATTEMPTS - 1:
+                    raise
+
+    async def _identify(self, email: Optional[str], phone_number: Optional[str]) -> IdentifyResponse:
+        keys = directory_keys(email, phone_number)
+        entries = await self._resolve_entries(keys)
+        clusters = {entry.primary_id: entry.shard for entry in entries.values()}
+        if not clusters:
+            return await self._create_cluster(email, phone_number, keys)
+
+        if len(set(clusters.values())) > 1:
+            # Scenario D across shards: bring both clusters onto one shard first
+            primary_id, shard = await self._merge_across_shards(clusters, email, phone_number)
+        else:
+            primary_id, shard = next(iter(clusters.items()))
+        missing = [key for key in keys if key not in entries]
+        if missing:
+            async with self.directory() as db:
+                db.add_all(IdentifierEntry(identifier=key, primary_id=primary_id, shard=shard) for key in missing)
+                await db.commit()
+
+        async with self.shards[shard]() as shard_db:
+            # Held until the write commits; a migration takes the same lock
+            await shard_db.execute(lock_primaries_query(clusters))
+            current = await self._entries(keys)
+            if any(entry.migration_id is not None or entry.shard != shard for entry in current.values()):
+                raise ClusterMoved()
+            response = await IdentityService(shard_db, contact_ids=self.contact_ids).identify_contact(
+                email, phone_number
+            )
+
+        # A merge on the shard, or an entry whose cluster never got written
+        result_primary_id = response.contact.primaryContatctId
+        stale_primary_ids = set(clusters) - {result_primary_id}
+        if stale_primary_ids:
+            async with self.directory() as db:
+                await db.execute(
+                    update(IdentifierEntry)
+                    .where(IdentifierEntry.primary_id.in_(stale_primary_ids))
+                    .values(primary_id=result_primary_id, shard=shard)
+                )
+                await db.commit()
+        return response
+
+    async def _create_cluster(self, email: Optional[str], phone_number: Optional[str], keys: List[str]) -> IdentifyResponse:
+        """Scenario A: claim the identifiers, then create the primary on its shard"""
+        primary_id = await self.contact_ids()
+        shard = self.shard_for(primary_id)
+        async with self.directory() as db:
+            db.add_all(IdentifierEntry(identifier=key, primary_id=primary_id, shard=shard) for key in keys)
+            await db.commit()
+
+        try:
+            async with self.shards[shard]() as shard_db:
+                service = IdentityService(shard_db, contact_ids=self.contact_ids)
+                await service.create_primary_contact(email, phone_number, contact_id=primary_id)
+                await service.commit()
+                return IdentifyResponse.from_contact(await service.get_consolidated_contact(primary_id))
+        except Exception:
+            # Don't leave the identifiers pointing at a cluster that doesn't exist
+            async with self.directory() as db:
+                await db.execute(delete(IdentifierEntry).where(IdentifierEntry.primary_id == primary_id))
+                await db.commit()
+            raise
+
+    async def lookup(self, email: Optional[str], phone_number: Optional[str]) -> Optional[IdentifyResponse]:
+        """Sharded counterpart of IdentityService.lookup_contact"""
+        if email:
+            email = email.lower()
+        entries = await self._resolve_entries(directory_keys(email, phone_number))
+        clusters = {entry.primary_id: entry.shard for entry in entries.values()}
+        if not clusters:
+            return None
+        if len(clusters) > 1:
+            raise IdentifiersConflict("Identifiers belong to different contacts")
+
+        primary_id, shard = clusters.popitem()
+        async with self.shards[shard]() as shard_db:
+            contact = await IdentityService(shard_db).get_consolidated_contact(primary_id)
+        return IdentifyResponse.from_contact(contact)
+
+    async def _merge_across_shards(self, clusters: Dict[int, int], email: Optional[str],
+                                   phone_number: Optional[str]) -> tuple:
+        """Log a migration of the newer cluster to the older one's shard and run it"""
+        primaries = []
+        for primary_id, shard in clusters.items():
+            async with self.shards[shard]() as shard_db:
+                primary = await shard_db.get(Contact, primary_id)
+            if primary is None:
+                raise ValueError("Primary contact not found")
+            primaries.append(primary)
+        older, newer = sorted(primaries, key=lambda contact: (contact.created_at, contact.id))
+
+        async with self.directory() as db:
+            migration = ShardMigration(
+                older_primary_id=older.id,
+                newer_primary_id=newer.id,
+                source_shard=clusters[newer.id],
+                target_shard=clusters[older.id],
+                email=email,
+                phone_number=phone_number,
+                state="prepared"
+            )
+            db.add(migration)
+            await db.flush()
+            # Requests for the moving cluster finish the migration before touching it
+            await db.execute(
+                update(IdentifierEntry)
+                .where(IdentifierEntry.primary_id == newer.id)
+                .values(migration_id=migration.id)
+            )
+            await db.commit()
+
+        await self.finish_migration(migration.id)
+        return older.id, clusters[older.id]
+
+    async def finish_migration(self, migration_id: int) -> None:
+        """Roll a cross-shard merge forward from whatever step it reached"""
+        async with self._migration_lock:
+            async with self.directory() as db:
+                migration = await db.get(ShardMigration, migration_id)
+            if migration is None or migration.state == "done":
+                return
+
+            if migration.state == "prepared":
+                async with self.shards[migration.source_shard]() as source_db:
+                    # Fence the moving cluster until the directory points at the target
+                    await source_db.execute(lock_primaries_query([migration.newer_primary_id]))
+                    await self._copy_and_merge(migration, source_db)
+                    async with self.directory() as db:
+                        await db.execute(
+                            update(IdentifierEntry)
+                            .where(IdentifierEntry.primary_id == migration.newer_primary_id)
+                            .values(primary_id=migration.older_primary_id, shard=migration.target_shard,
+                                    migration_id=None)
+                        )
+                        await self._set_state(db, migration, "copied")
+
+            await self._delete_from_source(migration)
+            async with self.directory() as db:
+                await self._set_state(db, migration, "done")
+
+    @staticmethod
+    async def _set_state(db: AsyncSession, migration: ShardMigration, state: str) -> None:
+        await db.execute(
+            update(ShardMigration)
+            .where(ShardMigration.id == migration.id)
+            .values(state=state, updated_at=datetime.utcnow())
+        )
+        await db.commit()
+        migration.state = state
+
+    async def _copy_and_merge(self, migration: ShardMigration, source_db: AsyncSession) -> None:
+        """Copy the newer cluster to the target shard and merge it there, in one transaction"""
+        async with self.shards[migration.target_shard]() as target_db:
+            if await target_db.get(Contact, migration.newer_primary_id) is not None:
+                # An earlier attempt already committed this step
+                return
+            result = await source_db.execute(cluster_members_query(migration.newer_primary_id))
+            contacts = result.scalars().all()
+            merges = (await source_db.execute(_merges_query(contacts))).scalars().all()
+            rows = [_column_values(contact) for contact in contacts]
+            if rows:
+                await target_db.execute(insert(Contact), rows)
+            # Earlier merges inside the moving cluster keep their evidence
+            if merges:
+                await target_db.execute(insert(ContactMerge), [
+                    {"email": merge.email, "phone_number": merge.phone_number, "created_at": merge.created_at}
+                    for merge in merges
+                ])
+
+            service = IdentityService(target_db, contact_ids=self.contact_ids)
+            await service.link_primary_contacts(
+                await target_db.get(Contact, migration.older_primary_id),
+                await target_db.get(Contact, migration.newer_primary_id),
+                migration.email, migration.phone_number
+            )
+            await service.commit()
+
+    async def _delete_from_source(self, migration: ShardMigration) -> None:
+        """Delete the source rows of the moved cluster that the target shard has"""
+        async with self.shards[migration.source_shard]() as source_db:
+            result = await source_db.execute(cluster_members_query(migration.newer_primary_id))
+            members = result.scalars().all()
+            async with self.shards[migration.target_shard]() as target_db:
+                copied_ids = set((await target_db.scalars(
+                    select(Contact.id).where(Contact.id.in_([contact.id for contact in members]))
+                )).all())
+            # Anything the copy didn't see stays put rather than being lost
+            contacts = [contact for contact in members if contact.id in copied_ids]
+            contact_ids = [contact.id for contact in contacts]
+            merges = (await source_db.execute(_merges_query(contacts))).scalars().all()
+            if merges:
+                await source_db.execute(delete(ContactMerge).where(ContactMerge.id.in_([merge.id for merge in merges])))
+            if len(contacts) == len(members):
+                await source_db.execute(
+                    delete(ContactCluster).where(ContactCluster.primary_id == migration.newer_primary_id)
+                )
+            if contact_ids:
+                await source_db.execute(delete(Contact).where(Contact.id.in_(contact_ids)))
+            await source_db.commit()
+
+    async def recover(self) -> int:
+        """Finish every interrupted migration; returns how many there were"""
+        async with self.directory() as db:
+            result = await db.execute(select(ShardMigration.id).where(ShardMigration.state != "done"))
+            migration_ids = list(result.scalars().all())
+        for migration_id in migration_ids:
+            await self.finish_migration(migration_id)
+        return len(migration_ids)
+
+
+def _merges_query(contacts: List[Contact]) -> Select:
+    """Merge evidence recorded for the identifiers of the given contacts"""
+    emails = [contact.email for contact in contacts if contact.email]
+    phone_numbers = [contact.phone_number for contact in contacts if contact.phone_number]
+    return select(ContactMerge).where(or_(ContactMerge.email.in_(emails), ContactMerge.phone_number.in_(phone_numbers)))
+
+
+def _column_values(contact: Contact) -> Dict[str, Any]:
+    return {column.key: getattr(contact, column.key) for column in Contact.__mapper__.column_attrs}
+
+
+def _session_factory(url: str) -> async_sessionmaker:
+    url = settings._with_async_driver(url)
+    return async_sessionmaker(create_async_engine(url, future=True, **engine_options(url)), expire_on_commit=False)
+
+
+# Sharded storage, when SHARD_URLS lists the shard databases
+shard_coordinator: Optional[ShardCoordinator] = None
+if settings.shard_urls.strip():
+    shard_coordinator = ShardCoordinator(
+        [_session_factory(url.strip()) for url in settings.shard_urls.split(",") if url.strip()],
+        _session_factory(settings.shard_directory_url or settings.async_database_url)
+    )
+
+
+# Dependency to get the shard coordinator, or None when storage isn't sharded
+def get_shard_coordinator() -> Optional[ShardCoordinator]:
+    return shard_coordinator
@@ -0,0 +1,399 @@
+import fcntl
+import hashlib
+import math
+import mmap
+import os
+import struct
+import tempfile
+from contextlib import contextmanager
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config import settings
+from app.metrics import registry, gauge_lines
+from app.services.identity_index import IdentityIndex, hydration_query
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+# Header: magic, then one unsigned 64-bit integer per field
+MAGIC = b"IDSHM001"
+FIELDS = ("slots", "ring_size", "sequence", "ready", "full", "entries", "contacts", "changes")
+HEADER_SIZE = len(MAGIC) + 8 * len(FIELDS)
+_FIELD_OFFSETS = {name: len(MAGIC) + 8 * position for position, name in enumerate(FIELDS)}
+_U64 = struct.Struct("<Q")
+# Change ring entry: primary id, pid of the writer
+RING_ENTRY = struct.Struct("<qQ")
+# Hash table slot: two halves of the key hash and the value; lo == 0 marks an empty slot
+SLOT = struct.Struct("<QQq")
+_VALUE = struct.Struct("<q")
+
+# Keep probe sequences short; the index reports itself full beyond this load
+MAX_LOAD = 0.7
+# Table entries per contact: its node plus email, phone and pair
+ENTRIES_PER_CONTACT = 4
+RING_SIZE = 4096
+# Reads retried this often against a concurrent writer before taking a shared lock
+OPTIMISTIC_READS = 100
+# Longest merge chain followed when resolving a primary
+MAX_HOPS = 64
+
+
+def default_shared_index_path() -> str:
+    """A file in /dev/shm (RAM-backed on Linux) or else the temp directory"""
+    directory = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    return os.path.join(directory, "bitespeed_identity_index")
+
+
+def worker_file_path(suffix: str) -> str:
+    """A file next to the shared index, common to the workers of one launch"""
+    return f"{settings.shared_index_path or default_shared_index_path()}.{suffix}"
+
+
+def _key(kind: str, value: str) -> Tuple[int, int]:
+    digest = hashlib.blake2b(f"{kind}:{value}".encode("utf-8"), digest_size=16).digest()
+    # The low half is never 0, which is what marks an empty slot
+    return int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+
+
+class SharedIdentityIndex:
+    """Identity index kept in one memory-mapped file shared by all workers
+
+    Drop-in replacement for ``IdentityIndex`` when run.py starts several
+    uvicorn workers: the index exists once in the page cache instead of once
+    per process, and every worker sees the others' inserts and merges as
+    soon as they are made.
+
+    The file holds an open-addressing hash table keyed by 128-bit hashes.
+    ``email:``, ``phone:`` and ``pair:`` keys map to a contact carrying the
+    identifier, like the dictionaries of ``IdentityIndex``. ``node:`` keys
+    map a contact to its primary at insert time, and a primary to itself or
+    to the primary it was merged into; following them resolves any contact
+    to its current primary.
+
+    Writes are single-writer: each update holds an exclusive ``flock`` on
+    the file and moves a sequence number to odd while it writes and back to
+    even after. Readers never lock; a read that overlapped a write sees the
+    sequence change and is retried (a seqlock). Updates also append the
+    primaries whose clusters changed to a ring in the file, which each
+    worker drains through ``changed_primaries`` to evict its own cached
+    responses.
+    """
+
+    def __init__(self, path: str, capacity: int = 250000):
+        self.path = path
+        self.slots = 1 << max(4, math.ceil(math.log2(capacity * ENTRIES_PER_CONTACT / MAX_LOAD)))
+        self._fd: Optional[int] = None
+        self._map: Optional[mmap.mmap] = None
+        # Last change sequence this worker has seen
+        self._seen_changes = 0
+
+    def attach(self) -> None:
+        """Map the file, creating and sizing it if this is the first worker"""
+        if self._map is not None:
+            return
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            if os.fstat(fd).st_size == 0:
+                os.ftruncate(fd, HEADER_SIZE + RING_SIZE * RING_ENTRY.size + self.slots * SLOT.size)
+                header = bytearray(HEADER_SIZE)
+                header[:len(MAGIC)] = MAGIC
+                _U64.pack_into(header, _FIELD_OFFSETS["slots"], self.slots)
+                _U64.pack_into(header, _FIELD_OFFSETS["ring_size"], RING_SIZE)
+                os.pwrite(fd, bytes(header), 0)
+            self._map = mmap.mmap(fd, 0)
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        if self._map[:len(MAGIC)] != MAGIC:
+            self._map.close()
+            self._map = None
+            os.close(fd)
+            raise ValueError(f"{self.path} is not a shared identity index")
+        self._fd = fd
+        # A file made by another worker or launcher decides the size
+        self.slots = self._field("slots")
+        self._mask = self.slots - 1
+        self._ring_size = self._field("ring_size")
+        self._ring = HEADER_SIZE
+        self._table = HEADER_SIZE + self._ring_size * RING_ENTRY.size
+        self._seen_changes = self._field("changes")
+
+    def detach(self) -> None:
+        if self._map is not None:
+            self._map.close()
+            os.close(self._fd)
+        self._map = None
+        self._fd = None
+
+    def _field(self, name: str) -> int:
+        return _U64.unpack_from(self._map, _FIELD_OFFSETS[name])[0]
+
+    def _set_field(self, name: str, value: int) -> None:
+        _U64.pack_into(self._map, _FIELD_OFFSETS[name], value)
+
+    @contextmanager
+    def _locked(self, operation: int) -> Iterator[None]:
+        fcntl.flock(self._fd, operation)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    @contextmanager
+    def _writing(self) -> Iterator[None]:
+        """Hold the writer lock and keep the sequence odd while writing"""
+        with self._locked(fcntl.LOCK_EX):
+            sequence = self._field("sequence")
+            # Left odd by a writer that died mid-write: skip to the next odd value
+            sequence += 2 if sequence & 1 else 1
+            self._set_field("sequence", sequence)
+            try:
+                yield
+            finally:
+                self._set_field("sequence", sequence + 1)
+
+    def _consistent(self, read: Callable[[], T]) -> T:
+        """Run a read that no write overlapped, retrying if one did"""
+        for _ in range(OPTIMISTIC_READS):
+            before = self._field("sequence")
+            if before & 1:
+                continue
+            result = read()
+            if self._field("sequence") == before:
+                return result
+        # A long write, or a writer that died mid-write: wait for the lock instead
+        with self._locked(fcntl.LOCK_SH):
+            return read()
+
+    def _lookup(self, key: Tuple[int, int]) -> Optional[int]:
+        hi, lo = key
+        index = hi & self._mask
+        while True:
+            slot_hi, slot_lo, value = SLOT.unpack_from(self._map, self._table + index * SLOT.size)
+            if slot_lo == 0:
+                return None
+            if slot_hi == hi and slot_lo == lo:
+                return value
+            index = (index + 1) & self._mask
+
+    def _store(self, key: Tuple[int, int], value: int, overwrite: bool = True) -> None:
+        hi, lo = key
+        index = hi & self._mask
+        while True:
+            offset = self._table + index * SLOT.size
+            slot_hi, slot_lo, _ = SLOT.unpack_from(self._map, offset)
+            if slot_lo == 0:
+                entries = self._field("entries")
+                if entries + 1 > self.slots * MAX_LOAD:
+                    # Out of room: every worker goes back to SQL lookups
+                    self._set_field("full", 1)
+                    self._set_field("ready", 0)
+                    return
+                SLOT.pack_into(self._map, offset, hi, lo, value)
+                self._set_field("entries", entries + 1)
+                return
+            if slot_hi == hi and slot_lo == lo:
+                if overwrite:
+                    _VALUE.pack_into(self._map, offset + 16, value)
+                return
+            index = (index + 1) & self._mask
+
+    def _resolve(self, contact_id: int) -> Optional[int]:
+        node = self._lookup(_key("node", str(contact_id)))
+        if not node:
+            return None
+        for _ in range(MAX_HOPS):
+            parent = self._lookup(_key("node", str(node)))
+            if parent is None or parent == node:
+                return node
+            node = parent
+        raise RuntimeError(f"Merge chain of contact {contact_id} is longer than {MAX_HOPS}")
+
+    def _record_change(self, primary_id: int) -> None:
+        changes = self._field("changes") + 1
+        RING_ENTRY.pack_into(self._map, self._ring + (changes % self._ring_size) * RING_ENTRY.size, primary_id, os.getpid())
+        self._set_field("changes", changes)
+
+    @property
+    def ready(self) -> bool:
+        return self._map is not None and self._field("ready") == 1
+
+    def __len__(self) -> int:
+        return self._field("contacts") if self._map is not None else 0
+
+    def clear(self) -> None:
+        """Mark the index as not ready for every worker"""
+        if self._map is not None:
+            with self._writing():
+                self._set_field("ready", 0)
+
+    def primary_of(self, contact_id: int) -> Optional[int]:
+        return self._consistent(lambda: self._resolve(contact_id))
+
+    def primary_for_email(self, email: Optional[str]) -> Optional[int]:
+        if not email:
+            return None
+        key = _key("email", IdentityIndex.normalize_email(email))
+        return self._consistent(lambda: self._resolve_identifier(key))
+
+    def primary_for_phone(self, phone_number: Optional[str]) -> Optional[int]:
+        if not phone_number:
+            return None
+        key = _key("phone", phone_number)
+        return self._consistent(lambda: self._resolve_identifier(key))
+
+    def _resolve_identifier(self, key: Tuple[int, int]) -> Optional[int]:
+        contact_id = self._lookup(key)
+        return self._resolve(contact_id) if contact_id else None
+
+    def contact_for_pair(self, email: Optional[str], phone_number: Optional[str]) -> Optional[int]:
+        if not email or not phone_number:
+            return None
+        key = _key("pair", f"{IdentityIndex.normalize_email(email)}\x00{phone_number}")
+        return self._consistent(lambda: self._lookup(key) or None)
+
+    def _add(self, contact_id: int, email: Optional[str], phone_number: Optional[str], parent_id: int) -> None:
+        email = IdentityIndex.normalize_email(email)
+        self._store(_key("node", str(contact_id)), parent_id)
+        if email:
+            self._store(_key("email", email), contact_id, overwrite=False)
+        if phone_number:
+            self._store(_key("phone", phone_number), contact_id, overwrite=False)
+        if email and phone_number:
+            self._store(_key("pair", f"{email}\x00{phone_number}"), contact_id, overwrite=False)
+        self._set_field("contacts", self._field("contacts") + 1)
+
+    def add_contact(self, contact_id: int, email: Optional[str], phone_number: Optional[str], primary_id: int) -> None:
+        """Register a committed contact under its primary"""
+        with self._writing():
+            if primary_id == contact_id:
+                self._add(contact_id, email, phone_number, contact_id)
+                return
+            self._store(_key("node", str(primary_id)), primary_id, overwrite=False)
+            # Point straight at the current primary to keep chains short
+            cluster_primary = self._resolve(primary_id)
+            self._add(contact_id, email, phone_number, cluster_primary)
+            self._record_change(cluster_primary)
+
+    def merge(self, older_primary_id: int, newer_primary_id: int) -> None:
+        """Fold the newer primary's cluster into the older primary's cluster"""
+        with self._writing():
+            self._store(_key("node", str(older_primary_id)), older_primary_id, overwrite=False)
+            self._store(_key("node", str(newer_primary_id)), older_primary_id)
+            self._record_change(older_primary_id)
+            self._record_change(newer_primary_id)
+
+    def split(self, erased: List[Tuple[int, Optional[str], Optional[str]]],
+              survivors: List[Tuple[int, Optional[str], Optional[str], int]]) -> None:
+        """Replace a cluster with what is left after erasing some of its contacts
+
+        Open addressing can't free slots, so keys of erased contacts and
+        identifiers are kept with the value 0, which reads as absent.
+        """
+        erased_ids = {contact_id for contact_id, _, _ in erased}
+        with self._writing():
+            for contact_id, email, phone_number in erased:
+                email = IdentityIndex.normalize_email(email)
+                if self._lookup(_key("node", str(contact_id))) == contact_id:
+                    self._record_change(contact_id)
+                self._store(_key("node", str(contact_id)), 0)
+                keys = [_key("email", email)] if email else []
+                if phone_number:
+                    keys.append(_key("phone", phone_number))
+                if email and phone_number:
+                    keys.append(_key("pair", f"{email}\x00{phone_number}"))
+                for key in keys:
+                    if self._lookup(key) in erased_ids:
+                        self._store(key, 0)
+            self._set_field("contacts", self._field("contacts") - len(erased))
+
+            # Survivors point at their new primary and carry their identifiers again
+            for contact_id, email, phone_number, primary_id in survivors:
+                email = IdentityIndex.normalize_email(email)
+                self._store(_key("node", str(contact_id)), primary_id)
+                if email:
+                    self._store(_key("email", email), contact_id)
+                if phone_number:
+                    self._store(_key("phone", phone_number), contact_id)
+                if email and phone_number:
+                    self._store(_key("pair", f"{email}\x00{phone_number}"), contact_id)
+            for primary_id in sorted({row[3] for row in survivors}):
+                self._record_change(primary_id)
+
+    async def hydrate(self, db: AsyncSession) -> None:
+        """Build the table from the contacts table, unless another worker already did"""
+        self.attach()
+        with self._locked(fcntl.LOCK_EX):
+            if self._field("ready"):
+                return
+            if self._field("full"):
+                raise RuntimeError(f"Shared identity index is full at {self._field('contacts')} contacts")
+            # Start over after a build another worker didn't finish
+            self._map[self._table:] = bytes(self.slots * SLOT.size)
+            self._set_field("entries", 0)
+            self._set_field("contacts", 0)
+
+            result = await db.stream(hydration_query().execution_options(yield_per=1000))
+            async for contact_id, email, phone_number, linked_id, _ in result:
+                self._add(contact_id, email, phone_number, linked_id if linked_id is not None else contact_id)
+            if self._field("full"):
+                raise RuntimeError(f"Shared identity index is full at {self._field('contacts')} contacts")
+            self._set_field("ready", 1)
+
+    def changed_primaries(self) -> Optional[List[int]]:
+        """Primaries whose clusters other workers changed since the last call
+
+        Returns None when more changes happened than the ring holds, in
+        which case every cached response must be considered stale.
+        """
+        if self._map is None:
+            return []
+        changes = self._field("changes")
+        if changes == self._seen_changes:
+            return []
+        start, self._seen_changes = self._seen_changes, changes
+        if changes - start > self._ring_size:
+            return None
+        own_pid = os.getpid()
+        changed = []
+        for sequence in range(start + 1, changes + 1):
+            primary_id, pid = RING_ENTRY.unpack_from(
+                self._map, self._ring + (sequence % self._ring_size) * RING_ENTRY.size
+            )
+            if pid != own_pid:
+                changed.append(primary_id)
+        # Entries may have been overwritten while they were read
+        if self._field("changes") - start > self._ring_size:
+            return None
+        return changed
+
+    def stats(self) -> Dict[str, float]:
+        """Size and fill of the shared table"""
+        entries = self._field("entries") if self._map is not None else 0
+        return {
+            "ready": self.ready,
+            "contacts": len(self),
+            "entries": entries,
+            "slots": self.slots,
+            "load_factor": round(entries / self.slots, 6),
+            "memory_bytes": HEADER_SIZE + RING_SIZE * RING_ENTRY.size + self.slots * SLOT.size,
+        }
+
+
+# Index shared by the workers of this server, mapped on first use
+shared_identity_index = SharedIdentityIndex(
+    settings.shared_index_path or default_shared_index_path(),
+    capacity=settings.shared_index_capacity
+)
+
+
+def _collect_shared_index_metrics() -> List[str]:
+    """Expose the shared index's fill on /metrics"""
+    stats = shared_identity_index.stats()
+    return (
+        gauge_lines("shared_identity_index_contacts", "Contacts in the shared-memory identity index", stats["contacts"])
+        + gauge_lines("shared_identity_index_load_factor", "Share of the shared-memory identity index's slots in use",
+                      stats["load_factor"])
+    )
+
+
+registry.add_collector(_collect_shared_index_metrics)
@@ -0,0 +1,81 @@
+import asyncio
+from app.config import settings
+from app.metrics import SINGLE_FLIGHT_CALLS
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+
+class _LeaderCancelled(Exception):
+    """The call doing the work was cancelled; waiting calls must retry"""
+
+
+class SingleFlight:
+    """Share one in-flight execution among concurrent calls with the same key
+
+    The first call for a key (the leader) runs the work; calls arriving
+    while it runs (followers) wait for it and receive the same result or
+    exception. Nothing is remembered once the leader finishes, so this only
+    collapses bursts and never serves stale data. If the leader is
+    cancelled, a waiting follower takes over and runs the work itself.
+    """
+
+    def __init__(self):
+        self._flights: Dict[Hashable, asyncio.Future] = {}
+        self.leaders = 0
+        self.followers = 0
+
+    def __len__(self) -> int:
+        return len(self._flights)
+
+    async def do(self, key: Hashable, work: Callable[[], Awaitable[Any]]) -> Any:
+        """Run ``work`` for ``key``, or wait for the run already in flight"""
+        while key in self._flights:
+            self.followers += 1
+            SINGLE_FLIGHT_CALLS.inc("follower")
+            try:
+                # Shielded so a cancelled follower doesn't cancel the shared result
+                return await asyncio.shield(self._flights[key])
+            except _LeaderCancelled:
+                continue
+
+        future = asyncio.get_running_loop().create_future()
+        self._flights[key] = future
+        self.leaders += 1
+        SINGLE_FLIGHT_CALLS.inc("leader")
+        try:
+            result = await work()
+        except asyncio.CancelledError:
+            self._finish(future, _LeaderCancelled())
+            raise
+        except BaseException as e:
+            self._finish(future, e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._flights[key]
+
+    @staticmethod
+    def _finish(future: asyncio.Future, error: BaseException) -> None:
+        future.set_exception(error)
+        # Mark it retrieved: without followers nobody else will look at it
+        future.exception()
+
+    def stats(self) -> Dict[str, Any]:
+        """Leader and follower counts and the share of calls that were coalesced"""
+        total = self.leaders + self.followers
+        return {
+            "leaders": self.leaders,
+            "followers": self.followers,
+            "in_flight": len(self._flights),
+            "coalescing_ratio": round(self.followers / total, 6) if total else 0.0,
+        }
+
+
+# Process-wide table of identify calls in flight
+identify_flights = SingleFlight()
+
+
+# Dependency to get the shared flight table, or None when coalescing is disabled
+def get_identify_flights() -> Optional[SingleFlight]:
+    return identify_flights if settings.identify_coalescing_enabled else None
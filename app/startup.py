@@ -0,0 +1,173 @@
+import asyncio
+import os
+import re
+import time
+from contextlib import AsyncExitStack, contextmanager
+from sqlalchemy import select, inspect, text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
+from app.models.contact import Base, Contact, ContactCluster
+from app.services.contact_cache import ContactCache
+from app.services.contact_graph import active_identifier_filter, build_cluster_query
+from app.services.identity_service import IdentityService
+from typing import Any, Dict, Iterator, List, Optional, Set
+
+# Migration scripts whose newest revision the database is expected to be at
+ALEMBIC_VERSIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "alembic", "versions")
+
+_REVISION_PATTERN = re.compile(r"^(revision|down_revision)\s*(?::[^=]*)?=\s*(.+)$", re.MULTILINE)
+
+# Identifiers no contact can carry, used to run the hot statements without matching rows
+WARMUP_EMAIL = "warmup@invalid"
+WARMUP_PHONE = "0"
+
+
+class StartupReport:
+    """Per-phase startup timings and the readiness state served by GET /ready
+
+    ``ready`` only turns True once warm-up has finished and the schema was
+    found usable, so load balancers can hold traffic back while
+    ``/health`` already answers.
+    """
+
+    def __init__(self):
+        self.phases: Dict[str, float] = {}
+        self.schema_status = "unchecked"
+        self.ready = False
+        self._started = time.perf_counter()
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Time one startup phase and log how long it took"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = round((time.perf_counter() - started) * 1000, 1)
+            print(f"Startup: {name} took {self.phases[name]:.1f} ms")
+
+    @property
+    def schema_usable(self) -> bool:
+        return self.schema_status in ("current", "unversioned")
+
+    def finish(self) -> None:
+        """Mark warm-up as done; the service is ready unless the schema is behind"""
+        total = round((time.perf_counter() - self._started) * 1000, 1)
+        self.ready = self.schema_usable
+        print(f"Startup: ready={self.ready} (schema {self.schema_status}) after {total:.1f} ms")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "status": "ready" if self.ready else "starting",
+            "schema": self.schema_status,
+            "phases_ms": dict(self.phases),
+        }
+
+
+def alembic_head_revisions(versions_dir: str = ALEMBIC_VERSIONS_DIR) -> Set[str]:
+    """Head revisions of the migration scripts, read without importing Alembic"""
+    revisions: Set[str] = set()
+    parents: Set[str] = set()
+    for name in os.listdir(versions_dir):
+        if not name.endswith(".py"):
+            continue
+        with open(os.path.join(versions_dir, name), encoding="utf-8") as handle:
+            assignments = dict(_REVISION_PATTERN.findall(handle.read()))
+        if "revision" in assignments:
+            revisions.add(assignments["revision"].strip("'\" "))
+            parents.update(re.findall(r"['\"]([^'\"]+)['\"]", assignments.get("down_revision", "")))
+    return revisions - parents
+
+
+async def check_schema_version(engine: AsyncEngine, create_if_unversioned: bool = False) -> str:
+    """Compare the database's Alembic revision with the migration scripts
+
+    Returns ``current`` or ``outdated`` (run ``alembic upgrade head``). A
+    database Alembic never touched is ``unmigrated``, unless
+    ``create_if_unversioned`` is set (local development only), in which case
+    its tables are created from the models and it is ``unversioned``. This
+    is one catalog lookup and one SELECT, unlike ``create_all``, which
+    inspects every table on every boot.
+    """
+    async with engine.connect() as conn:
+        versioned = await conn.run_sync(lambda sync_conn: inspect(sync_conn).has_table("alembic_version"))
+        if not versioned:
+            if not create_if_unversioned:
+                return "unmigrated"
+            await conn.run_sync(Base.metadata.create_all)
+            await conn.commit()
+            return "unversioned"
+        result = await conn.execute(text("SELECT version_num FROM alembic_version"))
+        applied = set(result.scalars().all())
+    return "current" if applied == alembic_head_revisions() else "outdated"
+
+
+async def prime_statements(session: AsyncSession, locking: bool = True) -> None:
+    """Run each hot identify statement once on the session's connection
+
+    Nothing matches, but SQLAlchemy's compiled cache and the driver's
+    per-connection prepared statements (asyncpg) are filled, so the first
+    real requests skip compilation. Without ``locking`` the FOR UPDATE
+    variants are left out, as a read-only replica rejects them.
+    """
+    for for_update in ((False, True) if locking else (False,)):
+        for emails, phone_numbers in (([WARMUP_EMAIL], [WARMUP_PHONE]), ([WARMUP_EMAIL], []), ([], [WARMUP_PHONE])):
+            await session.execute(build_cluster_query(emails, phone_numbers, for_update=for_update))
+    await session.execute(select(Contact).where(active_identifier_filter([WARMUP_EMAIL], [WARMUP_PHONE])))
+    await session.get(Contact, 0)
+    await session.get(ContactCluster, 0)
+    await session.rollback()
+
+
+async def warm_pool(session_factory: async_sessionmaker, connections: int, locking: bool = True) -> None:
+    """Open ``connections`` pool connections at once and prime each of them"""
+    async with AsyncExitStack() as stack:
+        sessions = [await stack.enter_async_context(session_factory()) for _ in range(max(connections, 1))]
+        # Checked out together so the pool really opens that many connections
+        await asyncio.gather(*(session.connection() for session in sessions))
+        for session in sessions:
+            await prime_statements(session, locking=locking)
+
+
+async def prefill_cache(session_factory: async_sessionmaker, cache: ContactCache, clusters: int) -> int:
+    """Cache the consolidated responses of the most recently updated clusters"""
+    async with session_factory() as session:
+        result = await session.execute(
+            select(ContactCluster.primary_id).order_by(ContactCluster.updated_at.desc()).limit(clusters)
+        )
+        primary_ids: List[int] = list(result.scalars().all())
+        service = IdentityService(session, cache=cache)
+        for primary_id in primary_ids:
+            await service.get_consolidated_contact(primary_id)
+    return len(primary_ids)
+
+
+async def run_warmup(
+    report: StartupReport,
+    session_factory: async_sessionmaker,
+    connections: int,
+    replica_factory: Optional[async_sessionmaker] = None,
+    cache: Optional[ContactCache] = None,
+    cache_clusters: int = 0
+) -> None:
+    """Warm the pools, statement caches and response cache, then mark the report ready
+
+    Every phase is best effort: a failure is logged and only costs the
+    latency it was meant to save.
+    """
+    phases = [("warm_pool", lambda: warm_pool(session_factory, connections))]
+    if replica_factory is not None:
+        phases.append(("warm_replica_pool", lambda: warm_pool(replica_factory, connections, locking=False)))
+    if cache is not None and cache_clusters > 0:
+        phases.append(("prefill_cache", lambda: prefill_cache(session_factory, cache, cache_clusters)))
+
+    for name, warm in phases:
+        with report.phase(name):
+            try:
+                await warm()
+            except Exception as e:
+                print(f"Warning: Startup phase {name} failed: {e}")
+    report.finish()
+
+
+# Process-wide startup state behind GET /ready
+startup_report = StartupReport()
@@ -0,0 +1,121 @@
+"""
+Before/after comparison of the POST /identify response serialization
+
+Builds consolidated contacts of several cluster sizes and times, per
+response, the CPU spent turning the service's data into response bytes:
+
+- before: validated ContactResponse/IdentifyResponse construction, then
+  FastAPI's response_model handling (validate again, dump to Python
+  objects) and JSONResponse's json.dumps
+- after: ``from_trusted``/``from_contact`` construction and
+  ``model_dump_json`` as done by ``json_response`` in the routes
+
+Both paths must produce identical bytes, including the historic
+``primaryContatctId`` key and non-ASCII emails; the run fails otherwise.
+
+Usage:
+    python -m benchmarks.serialize_identify [--iterations 20000] [--output serialize.json]
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute, serialize_response
+from app.api.routes import json_response
+from app.main import app
+from app.schemas.response import ContactResponse, IdentifyResponse
+
+# Members per cluster: a new customer, a typical one and a heavily merged one
+CLUSTER_SIZES = (1, 5, 50)
+
+
+def cluster_fields(size: int) -> Dict[str, Any]:
+    """The values get_consolidated_contact produces for a cluster of ``size`` contacts"""
+    return {
+        "primary_id": 1,
+        "emails": ["jörg@example.com"] + [f"customer-{i}@example.com" for i in range(1, size)],
+        "phone_numbers": [f"{5550000 + i}" for i in range(size)],
+        "secondary_ids": list(range(2, size + 1)),
+    }
+
+
+def identify_route() -> APIRoute:
+    return next(
+        route for route in app.routes
+        if isinstance(route, APIRoute) and route.path == "/api/identify" and "POST" in route.methods
+    )
+
+
+async def render_before(route: APIRoute, fields: Dict[str, Any]) -> bytes:
+    contact = ContactResponse(
+        primaryContatctId=fields["primary_id"],
+        emails=fields["emails"],
+        phoneNumbers=fields["phone_numbers"],
+        secondaryContactIds=fields["secondary_ids"]
+    )
+    content = await serialize_response(field=route.response_field, response_content=IdentifyResponse(contact=contact))
+    return JSONResponse(content).body
+
+
+async def render_after(route: APIRoute, fields: Dict[str, Any]) -> bytes:
+    contact = ContactResponse.from_trusted(
+        fields["primary_id"], fields["emails"], fields["phone_numbers"], fields["secondary_ids"]
+    )
+    return json_response(IdentifyResponse.from_contact(contact)).body
+
+
+async def time_path(render: Callable, route: APIRoute, fields: Dict[str, Any], iterations: int) -> float:
+    """CPU microseconds per response"""
+    started = time.process_time()
+    for _ in range(iterations):
+        await render(route, fields)
+    return (time.process_time() - started) / iterations * 1e6
+
+
+async def run(iterations: int) -> Dict[str, Any]:
+    route = identify_route()
+    results = {}
+    for size in CLUSTER_SIZES:
+        fields = cluster_fields(size)
+        before_body = await render_before(route, fields)
+        after_body = await render_after(route, fields)
+        if before_body != after_body:
+            raise AssertionError(f"Response bytes differ for a cluster of {size}:\n{before_body!r}\n{after_body!r}")
+        before = await time_path(render_before, route, fields, iterations)
+        after = await time_path(render_after, route, fields, iterations)
+        results[str(size)] = {
+            "bytes": len(after_body),
+            "before_us": round(before, 2),
+            "after_us": round(after, 2),
+            "saved_us": round(before - after, 2),
+        }
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Compare /identify response serialization paths")
+    parser.add_argument("--iterations", type=int, default=20000, help="Responses rendered per path and cluster size")
+    parser.add_argument("--output", help="Write JSON results to this file")
+    args = parser.parse_args(argv)
+
+    results = asyncio.run(run(args.iterations))
+    for size, result in results.items():
+        print(
+            f"== {size} contacts ({result['bytes']} bytes): {result['before_us']:.1f} -> "
+            f"{result['after_us']:.1f} CPU us/response ({result['saved_us']:.1f} saved)"
+        )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            json.dump({"iterations": args.iterations, "clusters": results}, handle, indent=2)
+        print(f"Results written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
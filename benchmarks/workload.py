@@ -0,0 +1,118 @@
+"""
+Workload generator for the /api/identify load benchmark
+
+Produces a deterministic stream of requests (for a given seed) that mixes
+the four identify scenarios in configurable ratios:
+
+- A: a brand-new customer (unseen email and phone)
+- B: a known email with a new phone number (partial match)
+- C: an exact repeat of an earlier order
+- D: the email of one customer with the phone of another (merge)
+
+The generator tracks clusters with a small union-find of its own, so merges
+always join two clusters that are still separate at generation time.
+"""
+
+import random
+from typing import Dict, Iterator, List, Optional, Tuple
+
+SCENARIOS = ("A", "B", "C", "D")
+
+DEFAULT_MIX = {"A": 0.2, "B": 0.2, "C": 0.5, "D": 0.1}
+
+# One benchmark request: (scenario, email, phone_number)
+Order = Tuple[str, Optional[str], Optional[str]]
+
+
+def parse_mix(value: str) -> Dict[str, float]:
+    """Parse ``A=0.2,B=0.2,C=0.5,D=0.1`` into normalized ratios"""
+    mix = {scenario: 0.0 for scenario in SCENARIOS}
+    for part in value.split(","):
+        if not part.strip():
+            continue
+        scenario, _, weight = part.partition("=")
+        scenario = scenario.strip().upper()
+        if scenario not in mix:
+            raise ValueError(f"Unknown scenario {scenario!r}, expected one of {', '.join(SCENARIOS)}")
+        mix[scenario] = float(weight)
+
+    total = sum(mix.values())
+    if total <= 0:
+        raise ValueError("Scenario mix must have a positive weight")
+    return {scenario: weight / total for scenario, weight in mix.items()}
+
+
+class Workload:
+    """Deterministic generator of identify requests"""
+
+    def __init__(self, mix: Optional[Dict[str, float]] = None, seed: int = 1):
+        self.mix = mix or DEFAULT_MIX
+        self.random = random.Random(seed)
+        self._next_customer = 0
+        self._next_phone = 0
+        # Cluster bookkeeping: customer -> parent customer
+        self._parent: List[int] = []
+        self._emails: List[List[str]] = []
+        self._phones: List[List[str]] = []
+        self._orders: List[Tuple[str, str]] = []
+
+    def _find(self, customer: int) -> int:
+        while self._parent[customer] != customer:
+            self._parent[customer] = self._parent[self._parent[customer]]
+            customer = self._parent[customer]
+        return customer
+
+    def _new_phone(self) -> str:
+        self._next_phone += 1
+        return f"9{self._next_phone:09d}"
+
+    def _new_customer(self) -> Order:
+        customer = self._next_customer
+        self._next_customer += 1
+        email, phone_number = f"customer{customer}@example.com", self._new_phone()
+        self._parent.append(customer)
+        self._emails.append([email])
+        self._phones.append([phone_number])
+        self._orders.append((email, phone_number))
+        return ("A", email, phone_number)
+
+    def seed_orders(self, customers: int) -> List[Order]:
+        """Orders creating the initial customers, sent before measuring"""
+        return [self._new_customer() for _ in range(customers)]
+
+    def next_order(self) -> Order:
+        """Pick a scenario by ratio and build a request for it"""
+        scenario = self.random.choices(SCENARIOS, weights=[self.mix[s] for s in SCENARIOS])[0]
+        if not self._orders or (scenario == "D" and self._next_customer < 2):
+            scenario = "A"
+
+        if scenario == "A":
+            return self._new_customer()
+
+        if scenario == "B":
+            customer = self.random.randrange(self._next_customer)
+            email, phone_number = self.random.choice(self._emails[customer]), self._new_phone()
+            self._phones[customer].append(phone_number)
+            self._orders.append((email, phone_number))
+            return ("B", email, phone_number)
+
+        if scenario == "C":
+            email, phone_number = self.random.choice(self._orders)
+            return ("C", email, phone_number)
+
+        # Scenario D: pick two customers still in different clusters
+        for _ in range(20):
+            first, second = self.random.sample(range(self._next_customer), 2)
+            first_root, second_root = self._find(first), self._find(second)
+            if first_root != second_root:
+                self._parent[second_root] = first_root
+                email = self.random.choice(self._emails[first])
+                phone_number = self.random.choice(self._phones[second])
+                self._orders.append((email, phone_number))
+                return ("D", email, phone_number)
+        # Everything is already one cluster; fall back to a new customer
+        return self._new_customer()
+
+    def orders(self, count: int) -> Iterator[Order]:
+        for _ in range(count):
+            yield self.next_order()
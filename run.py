@@ -3,10 +3,27 @@ import os
 from app.config import settings
 
 if __name__ == "__main__":
-    uvicorn.run(
-        "app.main:app",
-        host=settings.host,
-        port=settings.port,
-        reload=settings.debug,
-        log_level="info"
-    )
\ No newline at end of file
+    shared_index_path = None
+    if settings.workers > 1:
+        from app.services.shared_index import default_shared_index_path
+        # A fresh file per launch; the first worker to start builds the index into it
+        shared_index_path = settings.shared_index_path or f"{default_shared_index_path()}.{os.getpid()}"
+        if os.path.exists(shared_index_path):
+            os.remove(shared_index_path)
+        os.environ["SHARED_INDEX_PATH"] = shared_index_path
+
+    try:
+        uvicorn.run(
+            "app.main:app",
+            host=settings.host,
+            port=settings.port,
+            workers=settings.workers,
+            reload=settings.debug and settings.workers == 1,
+            log_level="info"
+        )
+    finally:
+        if shared_index_path:
+            # The index and the lock files the workers kept next to it
+            for path in (shared_index_path, f"{shared_index_path}.locks", f"{shared_index_path}.flattener"):
+                if os.path.exists(path):
+                    os.remove(path)
@@ -1,25 +1,29 @@
 import pytest
+import pytest_asyncio
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
 from app.models.contact import Base
 from app.database import get_db
+from app.metrics import count_statements
 
 # Create an in-memory SQLite database for testing
 @pytest.fixture(scope="session")
 def engine():
-    return create_async_engine(
+    engine = create_async_engine(
         "sqlite+aiosqlite:///:memory:",
         echo=True,
         future=True
     )
+    # Lets the per-request metrics see the test database's SQL
+    count_statements(engine)
+    return engine
 
 @pytest.fixture(scope="session")
 def tables(engine):
-    Base.metadata.create_all(engine)
+    # Schema creation needs the async connection, so it happens in db_session
     yield
-    Base.metadata.drop_all(engine)
 
-@pytest.fixture
+@pytest_asyncio.fixture
 async def db_session(engine, tables):
     async with engine.begin() as conn:
         # Create all tables
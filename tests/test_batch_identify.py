@@ -0,0 +1,80 @@
+import json
+import pytest
+from httpx import AsyncClient, ASGITransport
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from app.main import app
+from app.database import get_db, get_session_factory
+from app.models.contact import Contact
+from app.services.identity_index import get_identity_index
+from app.services.contact_cache import get_contact_cache
+from app.services.identity_service import IdentityService
+
+ORDERS = [
+    ("first@example.com", "1111111111"),
+    ("FIRST@example.com", "3333333333"),
+    ("second@example.com", "2222222222"),
+    ("first@example.com", "3333333333"),
+    ("second@example.com", "1111111111"),
+    (None, "2222222222"),
+]
+
+class TestBatchIdentify:
+    @pytest.mark.asyncio
+    async def test_batch_matches_sequential_calls(self, db_session: AsyncSession):
+        """Test that a batch gives the same answers as one call per order
+
+        The batch covers all four scenarios, including a partial match and a
+        merge that depend on contacts created earlier in the same batch.
+        """
+        results = await IdentityService(db_session).identify_batch(ORDERS)
+
+        first, partial, second, exact, merged, phone_only = [r.contact for r in results]
+        assert partial.primaryContatctId == first.primaryContatctId
+        assert partial.phoneNumbers == ["1111111111", "3333333333"]
+        assert second.primaryContatctId != first.primaryContatctId
+        assert exact == partial
+        assert merged.primaryContatctId == first.primaryContatctId
+        assert merged.emails == ["first@example.com", "second@example.com"]
+        assert merged.phoneNumbers == ["1111111111", "3333333333", "2222222222"]
+        assert phone_only == merged
+
+        # Everything was committed: a fresh sequential call sees the merged cluster
+        again = await IdentityService(db_session).identify_contact("second@example.com", "2222222222")
+        assert again.contact == merged
+        assert await db_session.scalar(select(func.count(Contact.id))) == 3
+
+    @pytest.mark.asyncio
+    async def test_batch_endpoints(self, db_session: AsyncSession):
+        """Test the JSON and NDJSON batch endpoints"""
+        session_factory = async_sessionmaker(db_session.bind, expire_on_commit=False)
+
+        async def override_get_db():
+            yield db_session
+
+        app.dependency_overrides[get_db] = override_get_db
+        app.dependency_overrides[get_session_factory] = lambda: session_factory
+        app.dependency_overrides[get_identity_index] = lambda: None
+        app.dependency_overrides[get_contact_cache] = lambda: None
+        try:
+            async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+                payload = {"items": [{"email": "a@example.com", "phoneNumber": "1"},
+                                     {"email": "b@example.com", "phoneNumber": "1"}]}
+                response = await client.post("/api/identify/batch", json=payload)
+                assert response.status_code == 200
+                batch = response.json()["results"]
+                assert batch[1]["contact"]["emails"] == ["a@example.com", "b@example.com"]
+
+                payload = {"items": [{"email": "c@example.com"}, {"phoneNumber": "1"}]}
+                response = await client.post("/api/identify/batch/stream", json=payload)
+                assert response.status_code == 200
+                assert response.headers["content-type"].startswith("application/x-ndjson")
+                lines = [json.loads(line) for line in response.text.splitlines()]
+                assert len(lines) == 2
+                assert lines[0]["contact"]["emails"] == ["c@example.com"]
+                assert lines[1]["contact"]["primaryContatctId"] == batch[0]["contact"]["primaryContatctId"]
+
+                response = await client.post("/api/identify/batch", json={"items": []})
+                assert response.status_code == 422
+        finally:
+            app.dependency_overrides.clear()
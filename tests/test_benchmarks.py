@@ -0,0 +1,46 @@
+import copy
+import pytest
+from benchmarks.load_identify import run_benchmark, compare_results
+from benchmarks.serialize_identify import run as run_serialization
+from benchmarks.workload import Workload, parse_mix
+
+class TestLoadBenchmark:
+    def test_workload_is_deterministic_and_follows_mix(self):
+        """Same seed gives the same orders, and scenario counts follow the ratios"""
+        mix = parse_mix("A=1,B=1,C=2")
+        first, second = Workload(mix, seed=7), Workload(mix, seed=7)
+        first.seed_orders(10)
+        second.seed_orders(10)
+        orders = list(first.orders(400))
+
+        assert orders == list(second.orders(400))
+        counts = {scenario: sum(1 for order in orders if order[0] == scenario) for scenario in "ABCD"}
+        assert counts["D"] == 0
+        assert 150 < counts["C"] < 250
+
+    @pytest.mark.asyncio
+    async def test_asgi_run_and_regression_check(self):
+        """A short in-process run produces per-scenario results that compare cleanly"""
+        results = await run_benchmark(requests=60, concurrency=4, seed_customers=10)
+
+        assert results["overall"]["count"] + results["overall"]["errors"] == 60
+        assert results["overall"]["errors"] == 0
+        assert sum(stats["count"] for stats in results["scenarios"].values()) == 60
+        histogram = results["scenarios"]["C"]["histogram"]
+        assert sum(histogram["counts"]) == results["scenarios"]["C"]["count"]
+        assert compare_results(results, results) == []
+
+        slower = copy.deepcopy(results)
+        slower["overall"]["throughput_rps"] /= 2
+        slower["scenarios"]["C"]["p99"] *= 2
+        regressions = compare_results(results, slower)
+        assert any(r.startswith("throughput") for r in regressions)
+        assert any(r.startswith("scenario C p99") for r in regressions)
+
+    @pytest.mark.asyncio
+    async def test_serialization_paths_produce_identical_bytes(self):
+        """The fast /identify serialization renders exactly what response_model did"""
+        results = await run_serialization(iterations=5)
+
+        assert set(results) == {"1", "5", "50"}
+        assert all(result["bytes"] > 0 for result in results.values())
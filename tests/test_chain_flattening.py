@@ -0,0 +1,127 @@
+import asyncio
+import pytest
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from app.metrics import CHAIN_COMPRESSIONS, CHAIN_MAX_DEPTH
+from app.models.contact import Contact, ContactCluster
+from app.services import chain_flattener
+from app.services.chain_flattener import flatten_chains, run_chain_flattener
+from app.services.identifier_locks import IdentifierLocks, identifier_keys
+from app.services.identity_service import IdentityService
+from datetime import datetime, timedelta
+
+
+async def add_chain(db_session: AsyncSession, prefix: str, length: int) -> list:
+    """Write a primary and ``length`` secondaries, each linked to the previous row"""
+    now = datetime.utcnow()
+    contacts = [Contact(email=f"{prefix}0@example.com", phone_number=f"{prefix}0",
+                        link_precedence="primary", created_at=now)]
+    db_session.add(contacts[0])
+    await db_session.flush()
+    for hop in range(1, length + 1):
+        contact = Contact(email=f"{prefix}{hop}@example.com", phone_number=f"{prefix}{hop}",
+                          linked_id=contacts[-1].id, link_precedence="secondary",
+                          created_at=now + timedelta(seconds=hop))
+        db_session.add(contact)
+        await db_session.flush()
+        contacts.append(contact)
+    await db_session.commit()
+    return contacts
+
+
+class TestChainFlattening:
+    @pytest.mark.asyncio
+    async def test_identify_compresses_traversed_chain(self, db_session: AsyncSession):
+        """Test that resolving a deep row repoints every visited row at the root
+
+        The response then lists the whole chain as direct secondaries.
+        """
+        chain = await add_chain(db_session, "a", 3)
+        compressions = CHAIN_COMPRESSIONS.value()
+
+        response = await IdentityService(db_session).identify_contact("a3@example.com", "a3")
+
+        db_session.expunge_all()
+        linked_ids = (await db_session.scalars(
+            select(Contact.linked_id).where(Contact.id.in_([c.id for c in chain[1:]]))
+        )).all()
+        assert linked_ids == [chain[0].id] * 3
+        assert response.contact.primaryContatctId == chain[0].id
+        assert response.contact.secondaryContactIds == [c.id for c in chain[1:]]
+        assert (await db_session.get(ContactCluster, chain[0].id)).secondary_ids == [c.id for c in chain[1:]]
+        assert CHAIN_COMPRESSIONS.value() - compressions == 2
+
+    @pytest.mark.asyncio
+    async def test_background_job_flattens_all_chains(self, db_session: AsyncSession):
+        """Test the flattening job against chains no request has touched"""
+        deep = await add_chain(db_session, "b", 4)
+        shallow = await add_chain(db_session, "c", 1)
+        session_factory = async_sessionmaker(db_session.bind, expire_on_commit=False)
+
+        assert await flatten_chains(session_factory, chunk_size=1) == 3
+        assert CHAIN_MAX_DEPTH.value() == 4
+
+        db_session.expunge_all()
+        rows = (await db_session.execute(select(Contact.id, Contact.linked_id).order_by(Contact.id))).all()
+        expected = {c.id: deep[0].id for c in deep[1:]}
+        expected.update({shallow[1].id: shallow[0].id})
+        assert {row.id: row.linked_id for row in rows if row.linked_id is not None} == expected
+        summary = await db_session.get(ContactCluster, deep[0].id)
+        assert summary.secondary_ids == [c.id for c in deep[1:]]
+
+        assert await flatten_chains(session_factory) == 0
+        assert CHAIN_MAX_DEPTH.value() == 1
+
+    @pytest.mark.asyncio
+    async def test_flattening_waits_for_a_concurrent_merge(self, db_session: AsyncSession):
+        """The job holds the clusters' identifier locks and re-reads them before relinking
+
+        A merge that demotes the root while the job waits leaves the chain to
+        the next run, which links it to the surviving primary.
+        """
+        older = Contact(email="old@example.com", phone_number="old", link_precedence="primary",
+                        created_at=datetime.utcnow() - timedelta(days=1))
+        db_session.add(older)
+        await db_session.commit()
+        chain = await add_chain(db_session, "d", 3)
+        session_factory = async_sessionmaker(db_session.bind, expire_on_commit=False)
+        locks = IdentifierLocks()
+
+        async with session_factory() as merging:
+            async with locks.hold(merging, identifier_keys([], ["d0"])):
+                flattening = asyncio.create_task(flatten_chains(session_factory, locks=locks))
+                await asyncio.sleep(0.05)
+                assert not flattening.done()
+                await IdentityService(merging).identify_contact("old@example.com", "d0")
+
+        assert await flattening == 0
+        assert await flatten_chains(session_factory, locks=locks) == 2
+
+        db_session.expunge_all()
+        linked_ids = (await db_session.scalars(
+            select(Contact.linked_id).where(Contact.id.in_([c.id for c in chain])).order_by(Contact.id)
+        )).all()
+        assert linked_ids == [older.id] * 4
+
+    @pytest.mark.asyncio
+    async def test_one_worker_flattens_at_a_time(self, tmp_path, monkeypatch):
+        """Only the job holding the lock file flattens; another takes over once it stops"""
+        runs = []
+        async def record_run(session_factory, cache=None, replicas=None, locks=None):
+            runs.append(asyncio.current_task().get_name())
+            return 0
+        monkeypatch.setattr(chain_flattener, "flatten_chains", record_run)
+
+        lock_path = str(tmp_path / "flattener")
+        first = asyncio.create_task(run_chain_flattener(None, 0.01, lock_path=lock_path), name="first")
+        await asyncio.sleep(0.02)
+        second = asyncio.create_task(run_chain_flattener(None, 0.01, lock_path=lock_path), name="second")
+        await asyncio.sleep(0.05)
+        assert set(runs) == {"first"}
+
+        first.cancel()
+        await asyncio.gather(first, return_exceptions=True)
+        await asyncio.sleep(0.05)
+        second.cancel()
+        await asyncio.gather(second, return_exceptions=True)
+        assert runs[-1] == "second"
@@ -0,0 +1,77 @@
+import asyncio
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import StatementCounter
+from app.schemas.response import ContactResponse
+from app.services.contact_cache import ContactCache, InMemoryCacheBackend
+from app.services.identity_service import IdentityService
+
+class TestContactCache:
+    @pytest.mark.asyncio
+    async def test_lru_and_ttl_eviction(self):
+        """Test that the in-memory backend evicts least recently used and expired entries"""
+        backend = InMemoryCacheBackend(max_entries=2, ttl_seconds=60)
+        await backend.set("a", 1)
+        await backend.set("b", 2)
+        assert await backend.get("a") == 1
+        await backend.set("c", 3)
+
+        assert await backend.get("b") is None
+        assert await backend.get("a") == 1
+        assert backend.evictions == 1
+
+        backend.ttl_seconds = 0.01
+        await backend.set("d", 4)
+        await asyncio.sleep(0.02)
+        assert await backend.get("d") is None
+        assert backend.expirations == 1
+
+    @pytest.mark.asyncio
+    async def test_store_refused_after_concurrent_invalidation(self):
+        """A response read before an invalidation must not be cached afterwards"""
+        cache = ContactCache(InMemoryCacheBackend())
+        response = ContactResponse(primaryContatctId=7, emails=["a@example.com"],
+                                   phoneNumbers=[], secondaryContactIds=[])
+        token = cache.begin_read(7)
+        await cache.invalidate(7)
+        await cache.store(response, token)
+
+        assert await cache.get(7) is None
+        assert cache.stats()["stale_writes"] == 1
+
+    @pytest.mark.asyncio
+    async def test_repeat_customer_served_without_sql(self, db_session: AsyncSession):
+        """Test that an unchanged cluster is answered from the cache
+
+        Once a cluster's response is cached, an exact repeat needs no SQL at all.
+        """
+        cache = ContactCache(InMemoryCacheBackend())
+        await IdentityService(db_session, cache=cache).identify_contact("test@example.com", "1234567890")
+        first = await IdentityService(db_session, cache=cache).identify_contact("test@example.com", "1234567890")
+
+        with StatementCounter(db_session.bind) as counter:
+            again = await IdentityService(db_session, cache=cache).identify_contact("TEST@example.com", "1234567890")
+
+        assert counter.statements == []
+        assert again.contact == first.contact
+        assert cache.stats()["hits"] >= 1
+
+    @pytest.mark.asyncio
+    async def test_merge_invalidates_both_primaries(self, db_session: AsyncSession):
+        """Test that linking two primaries drops both cached clusters"""
+        cache = ContactCache(InMemoryCacheBackend())
+        first = await IdentityService(db_session, cache=cache).identify_contact("first@example.com", "1111111111")
+        second = await IdentityService(db_session, cache=cache).identify_contact("second@example.com", "2222222222")
+        # Populate the cache for both clusters
+        await IdentityService(db_session, cache=cache).identify_contact("first@example.com", "1111111111")
+        await IdentityService(db_session, cache=cache).identify_contact("second@example.com", "2222222222")
+        assert await cache.get(first.contact.primaryContatctId) is not None
+        assert await cache.get(second.contact.primaryContatctId) is not None
+
+        merged = await IdentityService(db_session, cache=cache).identify_contact("first@example.com", "2222222222")
+
+        assert await cache.get(second.contact.primaryContatctId) is None
+        assert await cache.lookup("second@example.com", None) is None
+        repeat = await IdentityService(db_session, cache=cache).identify_contact("second@example.com", None)
+        assert repeat.contact == merged.contact
+        assert repeat.contact.emails == ["first@example.com", "second@example.com"]
@@ -0,0 +1,114 @@
+import pytest
+from sqlalchemy import create_engine, select, update
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.cli.backfill_clusters import backfill_clusters
+from app.database import StatementCounter
+from app.models.contact import Base, Contact, ContactCluster
+from app.services.identifier_locks import IdentifierLocks
+from app.services.identity_service import IdentityService
+from datetime import datetime, timedelta
+
+class TestContactClusters:
+    @pytest.mark.asyncio
+    async def test_summary_maintained_on_insert_and_merge(self, db_session: AsyncSession):
+        """Test that the summary row always matches the consolidated response
+
+        New primaries start a row, secondaries append to it, and a merge
+        rewrites the surviving row and drops the demoted one.
+        """
+        service = IdentityService(db_session)
+        first = await service.identify_contact("first@example.com", "1111111111")
+        await service.identify_contact("first@example.com", "3333333333")
+        second = await service.identify_contact("second@example.com", "2222222222")
+        merged = await service.identify_contact("first@example.com", "2222222222")
+
+        primary_id = first.contact.primaryContatctId
+        summary = await db_session.get(ContactCluster, primary_id)
+        assert summary.emails == merged.contact.emails
+        assert summary.phone_numbers == merged.contact.phoneNumbers
+        assert summary.secondary_ids == merged.contact.secondaryContactIds
+        assert summary.version == 3
+        assert await db_session.get(ContactCluster, second.contact.primaryContatctId) is None
+
+    @pytest.mark.asyncio
+    async def test_concurrent_summary_update_is_retried(self, db_session: AsyncSession, monkeypatch):
+        """A summary changed under a request fails its version check and the request runs again"""
+        first = await IdentityService(db_session).identify_contact("first@example.com", "1111111111")
+        primary_id = first.contact.primaryContatctId
+        create_secondary_contact = IdentityService.create_secondary_contact
+        calls = []
+
+        async def create_after_concurrent_write(self, email, phone_number, linked_primary_id):
+            contact = await create_secondary_contact(self, email, phone_number, linked_primary_id)
+            calls.append(contact.id)
+            if len(calls) == 1:
+                # Another writer bumps the summary between this call's read and its flush
+                with self.db.no_autoflush:
+                    await self.db.execute(
+                        update(ContactCluster.__table__)
+                        .where(ContactCluster.primary_id == primary_id)
+                        .values(version=ContactCluster.version + 1)
+                    )
+            return contact
+        monkeypatch.setattr(IdentityService, "create_secondary_contact", create_after_concurrent_write)
+        locks = IdentifierLocks()
+        hold = locks.hold
+        holds = []
+
+        def recording_hold(db, keys):
+            holds.append(keys)
+            return hold(db, keys)
+        locks.hold = recording_hold
+
+        response = await IdentityService(db_session, locks=locks).identify_contact("first@example.com", "2222222222")
+
+        assert len(calls) == 2
+        # The rollback ended the first attempt's transaction, so the retry locks again
+        assert len(holds) == 2
+        assert response.contact.phoneNumbers == ["1111111111", "2222222222"]
+        assert response.contact.secondaryContactIds == [calls[-1]]
+
+    @pytest.mark.asyncio
+    async def test_consolidated_contact_reads_single_row(self, db_session: AsyncSession):
+        """Without a loaded graph, the response comes from one summary lookup"""
+        service = IdentityService(db_session)
+        created = await service.identify_contact("test@example.com", "1234567890")
+        await service.identify_contact("other@example.com", "1234567890")
+
+        db_session.expunge_all()
+        with StatementCounter(db_session.bind) as counter:
+            consolidated = await IdentityService(db_session).get_consolidated_contact(created.contact.primaryContatctId)
+
+        assert counter.count == 1
+        assert "contact_clusters" in counter.statements[0]
+        assert consolidated.emails == ["test@example.com", "other@example.com"]
+
+    def test_backfill_rebuilds_summaries(self, tmp_path):
+        """Test the backfill command against rows written without summaries"""
+        database_url = f"sqlite:///{tmp_path / 'backfill.db'}"
+        engine = create_engine(database_url)
+        Base.metadata.create_all(engine)
+        now = datetime.utcnow()
+        with Session(engine) as session:
+            primary = Contact(email="a@example.com", phone_number="1", link_precedence="primary", created_at=now)
+            session.add(primary)
+            session.flush()
+            session.add_all([
+                Contact(email="b@example.com", phone_number="1", linked_id=primary.id,
+                        link_precedence="secondary", created_at=now + timedelta(seconds=2)),
+                Contact(email="a@example.com", phone_number="2", linked_id=primary.id,
+                        link_precedence="secondary", created_at=now + timedelta(seconds=1)),
+            ])
+            session.commit()
+
+        assert backfill_clusters(database_url, chunk_size=1) == 1
+        assert backfill_clusters(database_url, only_missing=True) == 0
+
+        with Session(engine) as session:
+            summary = session.scalars(select(ContactCluster)).one()
+            assert summary.emails == ["a@example.com", "b@example.com"]
+            assert summary.phone_numbers == ["1", "2"]
+            assert summary.secondary_ids == [2, 3]
+            assert summary.version == 1
+        engine.dispose()
@@ -0,0 +1,138 @@
+import asyncio
+import pytest
+from httpx import AsyncClient, ASGITransport
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from app.database import get_session_factory
+from app.main import app
+from app.models.contact import Contact, ContactCluster
+from app.services.contact_cache import ContactCache, InMemoryCacheBackend, get_contact_cache
+from app.services.contact_erasure import erase_contacts
+from app.services.identifier_locks import IdentifierLocks, identifier_keys
+from app.services.identity_index import IdentityIndex, get_identity_index
+from app.services.identity_service import IdentityService
+
+
+async def merged_cluster(db_session: AsyncSession) -> None:
+    """Contacts 1-4 in one cluster; 2 joined it through a merge, so no row bridges it"""
+    await IdentityService(db_session).identify_contact("doc@example.com", "1111111111")
+    await IdentityService(db_session).identify_contact("marty@example.com", "2222222222")
+    await IdentityService(db_session).identify_contact("doc@example.com", "2222222222")
+    await IdentityService(db_session).identify_contact("emmett@example.com", "1111111111")
+    await IdentityService(db_session).identify_contact("marty@example.com", "4444444444")
+
+
+class TestContactErasure:
+    @pytest.mark.asyncio
+    async def test_erasing_the_bridge_splits_the_cluster(self, db_session: AsyncSession):
+        """Each group left behind becomes its own cluster under its oldest contact"""
+        await merged_cluster(db_session)
+        session_factory = async_sessionmaker(db_session.bind, expire_on_commit=False)
+
+        assert await erase_contacts(session_factory, ["DOC@example.com"], []) == ([1], [2, 3])
+
+        db_session.expunge_all()
+        assert (await db_session.get(Contact, 1)).deleted_at is not None
+        assert await db_session.get(ContactCluster, 1) is None
+        marty = await IdentityService(db_session).lookup_contact("marty@example.com", None)
+        assert marty.contact.primaryContatctId == 2
+        assert marty.contact.phoneNumbers == ["2222222222", "4444444444"]
+        assert marty.contact.secondaryContactIds == [4]
+        emmett = await IdentityService(db_session).lookup_contact(None, "1111111111")
+        assert emmett.contact.primaryContatctId == 3
+        assert emmett.contact.secondaryContactIds == []
+        assert await IdentityService(db_session).lookup_contact("doc@example.com", None) is None
+
+    @pytest.mark.asyncio
+    async def test_erasing_a_leaf_keeps_merged_clusters_together(self, db_session: AsyncSession):
+        """The recorded merge still holds the remaining contacts together"""
+        await merged_cluster(db_session)
+        session_factory = async_sessionmaker(db_session.bind, expire_on_commit=False)
+
+        assert await erase_contacts(session_factory, ["emmett@example.com"], []) == ([3], [1])
+
+        db_session.expunge_all()
+        response = await IdentityService(db_session).lookup_contact("marty@example.com", None)
+        assert response.contact.primaryContatctId == 1
+        assert response.contact.emails == ["doc@example.com", "marty@example.com"]
+        assert response.contact.secondaryContactIds == [2, 4]
+
+    @pytest.mark.asyncio
+    async def test_links_alone_do_not_hold_a_cluster_together(self, db_session: AsyncSession):
+        """Contacts tied only through the erased email split even though both link to one primary"""
+        for email, phone in (("a@example.com", "1"), ("b@example.com", "1"), ("b@example.com", "2"),
+                             ("c@example.com", "2")):
+            await IdentityService(db_session).identify_contact(email, phone)
+        session_factory = async_sessionmaker(db_session.bind, expire_on_commit=False)
+
+        assert await erase_contacts(session_factory, ["b@example.com"], []) == ([2, 3], [1, 4])
+
+        db_session.expunge_all()
+        a = await IdentityService(db_session).lookup_contact("a@example.com", None)
+        c = await IdentityService(db_session).lookup_contact("c@example.com", None)
+        assert a.contact.primaryContatctId == 1 and a.contact.secondaryContactIds == []
+        assert c.contact.primaryContatctId == 4 and c.contact.emails == ["c@example.com"]
+
+    @pytest.mark.asyncio
+    async def test_chunks_keep_index_and_cache_in_step(self, db_session: AsyncSession):
+        """Chunked erasure leaves the index as a rebuild would and evicts changed clusters"""
+        await merged_cluster(db_session)
+        await IdentityService(db_session).identify_contact("biff@example.com", "5555555555")
+        session_factory = async_sessionmaker(db_session.bind, expire_on_commit=False)
+        index = IdentityIndex()
+        await index.hydrate(db_session)
+        cache = ContactCache(InMemoryCacheBackend())
+        await IdentityService(db_session, index=index, cache=cache).lookup_contact("doc@example.com", None)
+        assert await cache.get(1) is not None
+
+        erased = await erase_contacts(
+            session_factory, ["emmett@example.com", "doc@example.com"], ["5555555555"],
+            index=index, cache=cache, chunk_size=1
+        )
+        assert erased == ([1, 3, 5], [2])
+        assert await cache.get(1) is None
+
+        db_session.expunge_all()
+        rebuilt = IdentityIndex()
+        await rebuilt.hydrate(db_session)
+        assert len(index) == len(rebuilt) == 2
+        for email in ("doc@example.com", "marty@example.com", "emmett@example.com", "biff@example.com"):
+            assert index.primary_for_email(email) == rebuilt.primary_for_email(email)
+        for phone in ("1111111111", "2222222222", "4444444444", "5555555555"):
+            assert index.primary_for_phone(phone) == rebuilt.primary_for_phone(phone)
+        assert index.contact_for_pair("marty@example.com", "4444444444") == 4
+
+    @pytest.mark.asyncio
+    async def test_waits_for_identifier_locks(self, db_session: AsyncSession):
+        """A chunk doesn't start while an identify call holds one of its identifiers"""
+        await merged_cluster(db_session)
+        session_factory = async_sessionmaker(db_session.bind, expire_on_commit=False)
+        locks = IdentifierLocks()
+
+        async with locks.hold(db_session, identifier_keys(["emmett@example.com"], [])):
+            erasure = asyncio.create_task(
+                erase_contacts(session_factory, ["emmett@example.com"], [], locks=locks)
+            )
+            await asyncio.sleep(0.05)
+            assert not erasure.done()
+        assert await erasure == ([3], [1])
+        assert len(locks) == 0
+
+    @pytest.mark.asyncio
+    async def test_endpoint(self, db_session: AsyncSession):
+        """POST /api/contacts/erase erases and reports the clusters left behind"""
+        await merged_cluster(db_session)
+        session_factory = async_sessionmaker(db_session.bind, expire_on_commit=False)
+
+        app.dependency_overrides[get_session_factory] = lambda: session_factory
+        app.dependency_overrides[get_identity_index] = lambda: None
+        app.dependency_overrides[get_contact_cache] = lambda: None
+        try:
+            async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+                erased = await client.post("/api/contacts/erase", json={"phoneNumbers": ["1111111111"]})
+                empty = await client.post("/api/contacts/erase", json={})
+        finally:
+            app.dependency_overrides.clear()
+
+        assert erased.status_code == 200
+        assert erased.json() == {"erasedContactIds": [1, 3], "primaryContactIds": [2]}
+        assert empty.status_code == 422
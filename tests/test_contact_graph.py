@@ -0,0 +1,65 @@
+import pytest
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import StatementCounter
+from app.models.contact import Contact
+from app.services.contact_graph import build_cluster_query, load_contact_graph
+from app.services.identity_service import IdentityService
+from datetime import datetime, timedelta
+
+class TestContactGraph:
+    @pytest.mark.asyncio
+    async def test_loads_multi_hop_chain_and_siblings(self, db_session: AsyncSession):
+        """Test resolving a whole cluster from a single matched row
+
+        Older data can contain chains (secondary -> secondary -> primary).
+        Matching the deepest row should still return the root primary and
+        every sibling hanging off it.
+        """
+        now = datetime.utcnow()
+        root = Contact(email="root@example.com", phone_number="100", link_precedence="primary", created_at=now)
+        db_session.add(root)
+        await db_session.flush()
+        middle = Contact(email="middle@example.com", phone_number="200", linked_id=root.id,
+                         link_precedence="secondary", created_at=now + timedelta(seconds=1))
+        db_session.add(middle)
+        await db_session.flush()
+        leaf = Contact(email="leaf@example.com", phone_number="300", linked_id=middle.id,
+                       link_precedence="secondary", created_at=now + timedelta(seconds=2))
+        sibling = Contact(email="sibling@example.com", phone_number="400", linked_id=root.id,
+                          link_precedence="secondary", created_at=now + timedelta(seconds=3))
+        unrelated = Contact(email="other@example.com", phone_number="999", link_precedence="primary", created_at=now)
+        db_session.add_all([leaf, sibling, unrelated])
+        await db_session.commit()
+
+        graph = await load_contact_graph(db_session, ["leaf@example.com"], [])
+
+        assert sorted(graph.contacts) == sorted([root.id, middle.id, leaf.id, sibling.id])
+        assert graph.get_primary(leaf.id).id == root.id
+        assert [c.id for c in graph.find_matching("leaf@example.com", None)] == [leaf.id]
+        assert [c.id for c in graph.get_secondaries(root.id)] == [middle.id, sibling.id]
+
+    @pytest.mark.asyncio
+    async def test_merge_resolves_clusters_with_one_select(self, db_session: AsyncSession):
+        """Test that Scenario D reads both clusters in a single statement
+
+        Primary resolution, secondary lookup and the consolidated response
+        should all be served from the recursive CTE result set.
+        """
+        service = IdentityService(db_session)
+        await service.identify_contact("first@example.com", "1111111111")
+        await service.identify_contact("second@example.com", "2222222222")
+
+        with StatementCounter(db_session.bind) as counter:
+            result = await IdentityService(db_session).identify_contact("first@example.com", "2222222222")
+
+        selects = [s for s in counter.statements if s.lstrip().upper().startswith(("SELECT", "WITH"))]
+        cluster_selects = [s for s in selects if "RECURSIVE" in s.upper()]
+        assert len(cluster_selects) == 1
+        assert result.contact.emails == ["first@example.com", "second@example.com"]
+        assert result.contact.phoneNumbers == ["1111111111", "2222222222"]
+
+    def test_query_compiles_for_postgres(self):
+        """The cluster query should render as a recursive CTE on Postgres too"""
+        sql = str(build_cluster_query(["a@example.com"], ["123"]).compile(dialect=postgresql.dialect()))
+        assert "WITH RECURSIVE" in sql
@@ -0,0 +1,24 @@
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.contact import Contact
+from benchmarks.contact_indexes import explain, hot_queries
+
+class TestContactIndexes:
+    @pytest.mark.asyncio
+    async def test_hot_queries_use_tuned_indexes(self, db_session: AsyncSession):
+        """Identifier lookups hit the partial indexes and secondaries need no sort"""
+        index_names = {index.name for index in Contact.__table__.indexes}
+        assert index_names == {
+            "ix_contacts_active_email", "ix_contacts_active_phone_number", "ix_contacts_linked_id_created_at"
+        }
+
+        queries = hot_queries("a@example.com", "123", 1)
+        plans = await db_session.run_sync(
+            lambda session: {name: " | ".join(explain(session.connection(), query)) for name, query in queries.items()}
+        )
+
+        for name in ("find_matching_contacts", "cluster_query"):
+            assert "ix_contacts_active_email" in plans[name], plans[name]
+            assert "ix_contacts_active_phone_number" in plans[name], plans[name]
+        assert "ix_contacts_linked_id_created_at" in plans["get_secondary_contacts"]
+        assert "TEMP B-TREE" not in plans["get_secondary_contacts"]
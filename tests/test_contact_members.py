@@ -0,0 +1,92 @@
+import json
+import pytest
+from httpx import AsyncClient, ASGITransport
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from app.database import get_db, get_session_factory, get_read_session_factory, StatementCounter
+from app.main import app
+from app.models.contact import Contact
+from app.services.contact_members import list_members, iter_clusters
+from app.services.identity_service import IdentityService
+from datetime import datetime, timedelta
+
+async def shared_phone_cluster(db_session: AsyncSession, secondaries: int) -> int:
+    """One primary with many secondaries sharing its phone number"""
+    now = datetime.utcnow()
+    primary = Contact(email="office@example.com", phone_number="5550000",
+                      link_precedence="primary", created_at=now)
+    db_session.add(primary)
+    await db_session.flush()
+    db_session.add_all([
+        Contact(email=f"employee{number}@example.com", phone_number="5550000", linked_id=primary.id,
+                link_precedence="secondary", created_at=now + timedelta(seconds=number // 3 + 1))
+        for number in range(secondaries)
+    ])
+    await db_session.commit()
+    return primary.id
+
+class TestContactMembers:
+    @pytest.mark.asyncio
+    async def test_keyset_pages_cover_cluster_in_order(self, db_session: AsyncSession):
+        """Paging with nextCursor returns every member once, ordered by (created_at, id)"""
+        primary_id = await shared_phone_cluster(db_session, 25)
+
+        seen, cursor = [], None
+        while True:
+            with StatementCounter(db_session.bind, 2):
+                page = await list_members(db_session, primary_id, limit=7, cursor=cursor)
+            assert len(page.members) <= 7
+            seen.extend(page.members)
+            cursor = page.nextCursor
+            if cursor is None:
+                break
+
+        assert len(seen) == 26
+        assert seen[0].id == primary_id and seen[0].linkPrecedence == "primary"
+        keys = [(member.createdAt, member.id) for member in seen]
+        assert keys == sorted(keys) and len(set(keys)) == 26
+
+    @pytest.mark.asyncio
+    async def test_export_streams_every_cluster(self, db_session: AsyncSession):
+        """The export matches identify's consolidated view for every cluster"""
+        for email, phone_number in [("a@example.com", "111"), ("b@example.com", "222"),
+                                    ("a2@example.com", "111"), ("c@example.com", None)]:
+            await IdentityService(db_session).identify_contact(email, phone_number)
+        expected = [
+            (await IdentityService(db_session).identify_contact(email, None)).contact
+            for email in ("a@example.com", "b@example.com", "c@example.com")
+        ]
+        assert len(expected[0].secondaryContactIds) == 1
+
+        exported = [contact async for contact in iter_clusters(db_session, chunk_size=2)]
+        assert exported == expected
+
+    @pytest.mark.asyncio
+    async def test_endpoints(self, db_session: AsyncSession):
+        """Members endpoint pages and validates input; export endpoint streams NDJSON"""
+        primary_id = await shared_phone_cluster(db_session, 3)
+        session_factory = async_sessionmaker(db_session.bind, expire_on_commit=False)
+
+        async def override_get_db():
+            yield db_session
+
+        app.dependency_overrides[get_db] = override_get_db
+        app.dependency_overrides[get_session_factory] = lambda: session_factory
+        app.dependency_overrides[get_read_session_factory] = lambda: session_factory
+        try:
+            async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+                first = await client.get(f"/api/contacts/{primary_id}/members", params={"limit": 2})
+                second = await client.get(f"/api/contacts/{primary_id}/members",
+                                          params={"limit": 2, "cursor": first.json()["nextCursor"]})
+                missing = await client.get("/api/contacts/999999/members")
+                bad_cursor = await client.get(f"/api/contacts/{primary_id}/members", params={"cursor": "nope"})
+                export = await client.get("/api/contacts/export")
+        finally:
+            app.dependency_overrides.clear()
+
+        assert [m["id"] for m in first.json()["members"]][0] == primary_id
+        assert len(second.json()["members"]) == 2 and second.json()["nextCursor"] is None
+        assert missing.status_code == 404
+        assert bad_cursor.status_code == 400
+        assert export.headers["content-type"] == "application/x-ndjson"
+        lines = [json.loads(line) for line in export.text.splitlines()]
+        assert len(lines) == 1 and len(lines[0]["secondaryContactIds"]) == 3
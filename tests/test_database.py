@@ -0,0 +1,141 @@
+import pytest
+import pytest_asyncio
+from sqlalchemy import text, select, delete, insert
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from app.config import Settings
+from app.database import (
+    engine_options, instrument_pool, pool_metrics, InstrumentedAsyncPool, ReplicaRouter, StatementCounter
+)
+from app.metrics import count_statements
+from app.models.contact import Base
+from app.services.identity_service import IdentityService
+
+class TestDatabaseConfig:
+    def test_postgres_urls_use_asyncpg(self, monkeypatch):
+        """Plain and psycopg2 PostgreSQL URLs should be served by the async driver"""
+        monkeypatch.delenv("DATABASE_URL", raising=False)
+        for url in ("postgresql://u:p@db/app", "postgres://u:p@db/app", "postgresql+psycopg2://u:p@db/app"):
+            settings = Settings(database_url=url)
+            assert settings.async_database_url == "postgresql+asyncpg://u:p@db/app"
+            assert settings.sync_database_url == "postgresql://u:p@db/app"
+
+        assert Settings(read_replica_url="postgresql://u:p@replica/app").async_read_replica_url == \
+            "postgresql+asyncpg://u:p@replica/app"
+        assert Settings().async_read_replica_url == ""
+
+    def test_engine_options(self):
+        """Pool settings apply to server databases only, statement cache to asyncpg only"""
+        assert engine_options("sqlite+aiosqlite:///./bitespeed.db") == {}
+
+        options = engine_options("postgresql+asyncpg://u:p@db/app")
+        assert options["poolclass"] is InstrumentedAsyncPool
+        assert {"pool_size", "max_overflow", "pool_timeout", "pool_recycle", "pool_pre_ping"} <= set(options)
+        assert "statement_cache_size" in options["connect_args"]
+
+    @pytest.mark.asyncio
+    async def test_pool_metrics(self, tmp_path):
+        """Checkouts, waits and timeouts are recorded when the pool is exhausted"""
+        engine = create_async_engine(
+            f"sqlite+aiosqlite:///{tmp_path / 'pool.db'}",
+            poolclass=InstrumentedAsyncPool, pool_size=1, max_overflow=0, pool_timeout=0.1
+        )
+        instrument_pool(engine)
+        checkouts, timeouts = pool_metrics.checkouts, pool_metrics.timeouts
+        try:
+            async with engine.connect() as conn:
+                await conn.execute(text("SELECT 1"))
+                with pytest.raises(Exception):
+                    async with engine.connect() as other:
+                        await other.execute(text("SELECT 1"))
+                assert pool_metrics.snapshot(engine.pool)["checked_out"] == 1
+        finally:
+            await engine.dispose()
+
+        assert pool_metrics.checkouts == checkouts + 1
+        assert pool_metrics.timeouts == timeouts + 1
+        assert pool_metrics.wait_seconds_max >= 0.1
+
+
+@pytest_asyncio.fixture
+async def primary_and_replica(tmp_path):
+    """Two SQLite files standing in for a primary and its read replica"""
+    engines = []
+    for name in ("primary.db", "replica.db"):
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / name}")
+        count_statements(engine)
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        engines.append(engine)
+    yield [async_sessionmaker(engine, expire_on_commit=False) for engine in engines]
+    for engine in engines:
+        await engine.dispose()
+
+
+async def replicate(primary_factory, replica_factory) -> None:
+    """Copy every row of the primary to the replica, like a caught-up standby"""
+    async with primary_factory() as source, replica_factory() as target:
+        for table in Base.metadata.sorted_tables:
+            rows = [dict(row._mapping) for row in await source.execute(select(table))]
+            await target.execute(delete(table))
+            if rows:
+                await target.execute(insert(table), rows)
+        await target.commit()
+
+
+class TestReplicaRouting:
+    @pytest.mark.asyncio
+    async def test_lookup_reads_from_replica(self, primary_and_replica):
+        """A caught-up replica serves lookups without touching the primary"""
+        primary_factory, replica_factory = primary_and_replica
+        async with primary_factory() as db:
+            created = await IdentityService(db).identify_contact("test@example.com", "1234567890")
+        await replicate(primary_factory, replica_factory)
+        router = ReplicaRouter(replica_factory)
+
+        async with primary_factory() as db:
+            with StatementCounter(db.bind) as primary_counter:
+                found = await IdentityService(db, replicas=router).lookup_contact("test@example.com", None)
+        assert found == created
+        assert primary_counter.count == 0
+
+    @pytest.mark.asyncio
+    async def test_read_your_writes_and_lag_fall_back_to_primary(self, primary_and_replica):
+        """Clusters this process just changed, and lagging replicas, are read from the primary"""
+        primary_factory, replica_factory = primary_and_replica
+        router = ReplicaRouter(replica_factory, max_lag_seconds=1.0, lag_check_interval=0)
+        async with primary_factory() as db:
+            await IdentityService(db, replicas=router).identify_contact("test@example.com", "1234567890")
+        await replicate(primary_factory, replica_factory)
+        async with primary_factory() as db:
+            updated = await IdentityService(db, replicas=router).identify_contact("test@example.com", "5555555555")
+
+        async with primary_factory() as db:
+            found = await IdentityService(db, replicas=router).lookup_contact("test@example.com", None)
+        assert found == updated
+
+        # Without the write record, a stale replica answer is only avoided through its lag
+        router = ReplicaRouter(replica_factory, max_lag_seconds=1.0, lag_check_interval=0)
+        async with primary_factory() as db:
+            stale = await IdentityService(db, replicas=router).lookup_contact("test@example.com", None)
+        assert stale.contact.phoneNumbers == ["1234567890"]
+
+        async def lagging():
+            return 30.0
+
+        router.measure_lag = lagging
+        async with primary_factory() as db:
+            found = await IdentityService(db, replicas=router).lookup_contact("test@example.com", None)
+        assert found == updated
+        assert not await router.replica_usable()
+
+    @pytest.mark.asyncio
+    async def test_replica_miss_falls_back_to_primary(self, primary_and_replica):
+        """Contacts the replica hasn't received yet are still found"""
+        primary_factory, replica_factory = primary_and_replica
+        async with primary_factory() as db:
+            created = await IdentityService(db).identify_contact("new@example.com", None)
+
+        router = ReplicaRouter(replica_factory)
+        async with primary_factory() as db:
+            found = await IdentityService(db, replicas=router).lookup_contact("new@example.com", None)
+        assert found == created
@@ -0,0 +1,110 @@
+import asyncio
+import pytest
+from sqlalchemy import event, select, func
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from app.metrics import track_request
+from app.models.contact import Contact
+from app.services.group_commit import GroupCommitWriter
+from app.services.identity_service import IdentityService
+
+class TestGroupCommit:
+    @pytest.mark.asyncio
+    async def test_concurrent_calls_share_commits(self, db_session: AsyncSession):
+        """Concurrent identify calls are committed together and match sequential results"""
+        session_factory = async_sessionmaker(db_session.bind, expire_on_commit=False)
+        writer = GroupCommitWriter(session_factory, max_batch=8, max_delay_seconds=0.05)
+
+        request_stats = []
+        # Everything the engine runs, whichever task or context issues it
+        issued = {"statements": 0, "commits": 0}
+        engine = db_session.bind.sync_engine
+
+        def on_execute(*args):
+            issued["statements"] += 1
+
+        def on_commit(conn):
+            issued["commits"] += 1
+
+        async def identify(email, phone_number):
+            async with session_factory() as db:
+                with track_request() as stats:
+                    request_stats.append(stats)
+                    return await IdentityService(db, writer=writer).identify_contact(email, phone_number)
+
+        event.listen(engine, "before_cursor_execute", on_execute)
+        event.listen(engine, "commit", on_commit)
+        try:
+            responses = await asyncio.gather(*[
+                identify(f"user{number}@example.com", "5550000" if number % 2 else None)
+                for number in range(16)
+            ])
+        finally:
+            event.remove(engine, "before_cursor_execute", on_execute)
+            event.remove(engine, "commit", on_commit)
+            await writer.close()
+
+        assert writer.batches == 2
+        assert issued["commits"] == 2
+        # Each caller is credited with its share of its batch, not the writer's whole run
+        assert sum(stats.statements for stats in request_stats) == issued["statements"]
+        assert all(stats.commits == 1 for stats in request_stats)
+        assert max(stats.statements for stats in request_stats) < issued["statements"] / 2
+        primary_id = responses[1].contact.primaryContatctId
+        assert responses[-1].contact.primaryContatctId == primary_id
+        assert len(responses[-1].contact.emails) == 8
+        assert await db_session.scalar(select(func.count()).select_from(Contact)) == 16
+
+    @pytest.mark.asyncio
+    async def test_failing_call_does_not_fail_its_batch(self, db_session: AsyncSession, monkeypatch):
+        """A call that raises is retried alone; its batch neighbours still commit"""
+        session_factory = async_sessionmaker(db_session.bind, expire_on_commit=False)
+        writer = GroupCommitWriter(session_factory, max_batch=4, max_delay_seconds=0.05)
+        resolve_contact = IdentityService.resolve_contact
+
+        async def failing_resolve(self, email, phone_number):
+            if email == "bad@example.com":
+                raise RuntimeError("boom")
+            return await resolve_contact(self, email, phone_number)
+
+        monkeypatch.setattr(IdentityService, "resolve_contact", failing_resolve)
+        try:
+            results = await asyncio.gather(
+                writer.submit("good@example.com", None),
+                writer.submit("bad@example.com", None),
+                writer.submit("other@example.com", None),
+                return_exceptions=True
+            )
+        finally:
+            await writer.close()
+
+        assert isinstance(results[1], RuntimeError)
+        assert [response.contact.emails for response, _ in (results[0], results[2])] == \
+            [["good@example.com"], ["other@example.com"]]
+        assert results[0][1] == "A"
+        assert await db_session.scalar(select(func.count()).select_from(Contact)) == 2
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("stage", ["waiting", "applying"])
+    async def test_close_fails_calls_of_the_current_batch(self, db_session: AsyncSession, stage: str):
+        """Closing the writer mid-batch fails calls it already took off the queue instead of hanging them"""
+        session_factory = async_sessionmaker(db_session.bind, expire_on_commit=False)
+        writer = GroupCommitWriter(session_factory, max_batch=8, max_delay_seconds=60 if stage == "waiting" else 0)
+        applying = asyncio.Event()
+        if stage == "applying":
+            async def never_commits(pairs):
+                applying.set()
+                await asyncio.Event().wait()
+            writer._apply = never_commits
+
+        calls = [asyncio.create_task(writer.submit(f"user{number}@example.com", None)) for number in range(3)]
+        if stage == "applying":
+            await asyncio.wait_for(applying.wait(), 1)
+        else:
+            await asyncio.sleep(0.01)
+        # The first call (or the whole batch) is already off the queue
+        assert writer._queue.qsize() == (2 if stage == "waiting" else 0)
+        await writer.close()
+
+        results = await asyncio.wait_for(asyncio.gather(*calls, return_exceptions=True), 1)
+        assert all(isinstance(result, RuntimeError) for result in results)
+
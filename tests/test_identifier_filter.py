@@ -0,0 +1,118 @@
+import pytest
+from datetime import datetime, timedelta
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import StatementCounter
+from app.models.contact import Contact
+from app.services.identifier_filter import IdentifierFilter, database_identity
+from app.services.identity_service import IdentityService
+
+class TestIdentifierFilter:
+    def test_no_false_negatives_and_bounded_false_positives(self):
+        """Every added identifier is found; unseen ones are mostly rejected"""
+        identifier_filter = IdentifierFilter(capacity=4000, error_rate=0.01)
+        for number in range(2000):
+            identifier_filter.add_contact(f"user{number}@example.com", f"555{number:07d}")
+
+        assert all(identifier_filter.might_contain(f"USER{number}@example.com", None) for number in range(2000))
+        false_positives = sum(
+            identifier_filter.might_contain(f"new{number}@example.com", None) for number in range(10000)
+        )
+        assert false_positives / 10000 < 0.03
+        assert identifier_filter.estimated_false_positive_rate() < 0.03
+        assert identifier_filter.memory_bytes < 5000
+
+    def test_save_and_load(self, tmp_path):
+        """A saved filter is restored as is, unless it is too small for the settings"""
+        path = str(tmp_path / "filter.bin")
+        saved = IdentifierFilter(capacity=100)
+        saved.add_contact("known@example.com", "1234567890")
+        saved.watermark = 42
+        saved.save(path)
+
+        restored = IdentifierFilter(capacity=100)
+        assert restored.load(path)
+        assert restored.might_contain("known@example.com", None)
+        assert not restored.might_contain("unknown@example.com", None)
+        assert (restored.items, restored.watermark) == (2, 42)
+
+        assert not IdentifierFilter(capacity=1000).load(path)
+        assert not IdentifierFilter(capacity=100).load(str(tmp_path / "missing.bin"))
+
+    def test_file_from_another_database_is_refused(self, tmp_path):
+        """The saved database identity has to match; the password doesn't count"""
+        path = str(tmp_path / "filter.bin")
+        IdentifierFilter(capacity=100, database_id=database_identity("postgresql://app:old@db/contacts")).save(path)
+
+        assert IdentifierFilter(capacity=100, database_id=database_identity("postgresql://app:new@db/contacts")).load(path)
+        assert not IdentifierFilter(capacity=100, database_id=database_identity("postgresql://app:old@db/other")).load(path)
+
+    @pytest.mark.asyncio
+    async def test_new_customers_skip_lookup_query(self, db_session: AsyncSession):
+        """A definite miss goes straight to Scenario A; known identifiers still link"""
+        await IdentityService(db_session).identify_contact("first@example.com", "1111111111")
+        identifier_filter = IdentifierFilter(capacity=100)
+        await identifier_filter.hydrate(db_session)
+        await db_session.commit()
+
+        service = IdentityService(db_session, identifier_filter=identifier_filter)
+        with StatementCounter(db_session.bind) as counter:
+            created = await service.identify_contact("new@example.com", "2222222222")
+        assert service.scenario == "A"
+        assert not any("RECURSIVE" in statement for statement in counter.statements)
+
+        linked = await IdentityService(db_session, identifier_filter=identifier_filter).identify_contact(
+            "new@example.com", "1111111111"
+        )
+        assert linked.contact.primaryContatctId != created.contact.primaryContatctId
+        assert sorted(linked.contact.emails) == ["first@example.com", "new@example.com"]
+        assert identifier_filter.definite_misses == 1
+
+    @pytest.mark.asyncio
+    async def test_hydrate_catches_up_from_watermark(self, db_session: AsyncSession, tmp_path):
+        """After a restart only contacts newer than the saved watermark are read"""
+        first = await IdentityService(db_session).identify_contact("first@example.com", None)
+        identifier_filter = IdentifierFilter(capacity=100)
+        await identifier_filter.hydrate(db_session)
+        identifier_filter.save(str(tmp_path / "filter.bin"))
+        await IdentityService(db_session).identify_contact("second@example.com", None)
+
+        restored = IdentifierFilter(capacity=100)
+        assert restored.load(str(tmp_path / "filter.bin"))
+        assert restored.watermark == first.contact.primaryContatctId
+        await restored.hydrate(db_session)
+        assert restored.ready
+        assert restored.might_contain("second@example.com", None)
+        assert restored.items == 2
+
+    @pytest.mark.asyncio
+    async def test_catch_up_reads_late_commits_and_rebuilds_after_a_restore(self, db_session: AsyncSession, tmp_path):
+        """A lower id committed after the save is read; a table that went back in time is re-read in full"""
+        await IdentityService(db_session).identify_contact("first@example.com", None)
+        late = await IdentityService(db_session).identify_contact("late@example.com", None)
+        await IdentityService(db_session).identify_contact("third@example.com", None)
+        # Contact 2 stands for a transaction that took its id early but hadn't committed at the save
+        late_id = late.contact.primaryContatctId
+        await db_session.execute(update(Contact).where(Contact.id == late_id).values(email="hidden@example.com"))
+        await db_session.commit()
+        path = str(tmp_path / "filter.bin")
+        saved = IdentifierFilter(capacity=100)
+        await saved.hydrate(db_session)
+        saved.save(path)
+        await db_session.execute(update(Contact).where(Contact.id == late_id).values(email="late@example.com"))
+        await db_session.commit()
+
+        restored = IdentifierFilter(capacity=100)
+        assert restored.load(path) and restored.synced_at == saved.synced_at
+        await restored.hydrate(db_session)
+        assert restored.might_contain("late@example.com", None)
+
+        # The table's newest row is older than the file's: a restore or another table
+        await db_session.execute(update(Contact).values(updated_at=datetime.utcnow() - timedelta(days=1)))
+        await db_session.commit()
+        rebuilt = IdentifierFilter(capacity=100)
+        assert rebuilt.load(path)
+        rebuilt.add_contact("gone@example.com", None)
+        await rebuilt.hydrate(db_session)
+        assert not rebuilt.might_contain("gone@example.com", None)
+        assert rebuilt.might_contain("third@example.com", None)
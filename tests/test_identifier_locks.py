@@ -0,0 +1,123 @@
+import asyncio
+import multiprocessing
+import pytest
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from app.models.contact import Base, Contact
+from app.services.identifier_locks import IdentifierLocks, identifier_keys
+from app.services.identity_service import IdentityService
+
+def _hold_in_other_worker(lock_path: str, db_path: str, held, release) -> None:
+    """Hold one identifier's lock from a separate process until told to let go"""
+    async def hold():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+        async with AsyncSession(engine) as session:
+            async with IdentifierLocks(lock_path).hold(session, identifier_keys(["a@example.com"], [])):
+                held.set()
+                while not release.is_set():
+                    await asyncio.sleep(0.01)
+        await engine.dispose()
+    asyncio.run(hold())
+
+
+class TestIdentifierLocks:
+    @pytest.mark.asyncio
+    async def test_only_shared_identifiers_wait(self, db_session: AsyncSession):
+        """Test that calls block only on identifiers they share and the table shrinks back"""
+        locks = IdentifierLocks()
+        order = []
+
+        async def hold(keys, name, delay):
+            async with locks.hold(db_session, keys):
+                order.append(f"{name} start")
+                await asyncio.sleep(delay)
+                order.append(f"{name} end")
+
+        await asyncio.gather(
+            hold(identifier_keys(["A@example.com"], ["1"]), "first", 0.05),
+            hold(identifier_keys(["a@example.com"], []), "second", 0),
+            hold(identifier_keys(["b@example.com"], ["2"]), "other", 0),
+        )
+
+        # "other" ran while "first" held its locks; "second" had to wait for it
+        assert order.index("other end") < order.index("first end")
+        assert order.index("second start") > order.index("first end")
+        assert len(locks) == 0
+
+    @pytest.mark.asyncio
+    async def test_concurrent_identify_keeps_one_primary(self, tmp_path):
+        """Stress concurrent first orders and merges against one database file
+
+        Without locking, two requests for a brand-new customer can both see
+        no match and both create a primary. Every call here runs in its own
+        session, like separate HTTP requests.
+        """
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'locks.db'}")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        session_factory = async_sessionmaker(engine, expire_on_commit=False)
+        locks = IdentifierLocks()
+
+        async def identify(email, phone_number):
+            async with session_factory() as session:
+                service = IdentityService(session, locks=locks)
+                return await service.identify_contact(email, phone_number)
+
+        customers = 20
+        calls = []
+        for customer in range(customers):
+            email, phone_number = f"c{customer}@example.com", f"555{customer:04d}"
+            calls += [identify(email, phone_number) for _ in range(5)]
+            calls.append(identify(email, None))
+            calls.append(identify(f"alt{customer}@example.com", phone_number))
+            calls.append(identify(f"alt{customer}@example.com", f"777{customer:04d}"))
+
+        try:
+            await asyncio.gather(*calls)
+
+            async with session_factory() as session:
+                primaries = await session.scalar(
+                    select(func.count(Contact.id)).where(Contact.link_precedence == "primary")
+                )
+                for customer in range(customers):
+                    result = await IdentityService(session).identify_contact(
+                        f"c{customer}@example.com", None
+                    )
+                    assert result.contact.emails == [f"c{customer}@example.com", f"alt{customer}@example.com"]
+                    assert sorted(result.contact.phoneNumbers) == [f"555{customer:04d}", f"777{customer:04d}"]
+            assert primaries == customers
+            assert len(locks) == 0
+        finally:
+            await engine.dispose()
+
+    @pytest.mark.asyncio
+    async def test_lock_file_serializes_worker_processes(self, tmp_path):
+        """On SQLite, workers sharing a lock file wait for each other's identifiers"""
+        lock_path, db_path = str(tmp_path / "identity.locks"), str(tmp_path / "locks.db")
+        context = multiprocessing.get_context("fork")
+        held, release = context.Event(), context.Event()
+        process = context.Process(target=_hold_in_other_worker, args=(lock_path, db_path, held, release))
+        process.start()
+        assert held.wait(10)
+
+        engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+        locks = IdentifierLocks(lock_path)
+        try:
+            async with AsyncSession(engine) as session:
+                async with locks.hold(session, identifier_keys(["b@example.com"], [])):
+                    pass
+                waiting = asyncio.create_task(self._hold_briefly(locks, session))
+                await asyncio.sleep(0.1)
+                assert not waiting.done()
+                release.set()
+                await asyncio.wait_for(waiting, 10)
+        finally:
+            release.set()
+            process.join(10)
+            await engine.dispose()
+        assert process.exitcode == 0
+
+    @staticmethod
+    async def _hold_briefly(locks: IdentifierLocks, session: AsyncSession) -> None:
+        async with locks.hold(session, identifier_keys(["A@example.com"], [])):
+            pass
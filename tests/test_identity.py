@@ -1,6 +1,8 @@
 import pytest
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.services.identity_service import IdentityService
+from app.services.identity_index import IdentityIndex
+from app.database import StatementCounter
 from app.models.contact import Contact
 from datetime import datetime
 
@@ -164,4 +166,35 @@ class TestIdentityService:
         assert result1.contact.primaryContatctId == result2.contact.primaryContatctId
         assert "test@example.com" in result2.contact.emails  # Normalized to lowercase
         assert "1234567890" in result2.contact.phoneNumbers
-        assert "0987654321" in result2.contact.phoneNumbers
\ No newline at end of file
+        assert "0987654321" in result2.contact.phoneNumbers
+    
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("use_index", [False, True])
+    async def test_single_commit_per_identify_call(self, db_session: AsyncSession, use_index: bool):
+        """Test that every identify call is one unit of work
+        
+        Whatever the scenario, a call should commit exactly once and stay
+        within a small, fixed number of SQL statements (new rows come back
+        via INSERT ... RETURNING, so no refresh queries are needed). A merge
+        also inserts its ContactMerge evidence row, and writes through the
+        identifier index re-read the primaries they change.
+        """
+        service_calls = [
+            # (email, phone, max statements via the contact graph, via the index)
+            # for scenarios A, B, C, A, D
+            ("first@example.com", "1111111111", 3, 3),
+            ("first@example.com", "3333333333", 4, 4),
+            ("first@example.com", "3333333333", 1, 1),
+            ("second@example.com", "2222222222", 3, 3),
+            ("second@example.com", "1111111111", 7, 11),
+        ]
+        index = IdentityIndex()
+        if use_index:
+            await index.hydrate(db_session)
+        
+        for email, phone_number, graph_budget, index_budget in service_calls:
+            max_statements = index_budget if use_index else graph_budget
+            with StatementCounter(db_session.bind, max_statements, max_commits=1) as counter:
+                await IdentityService(db_session, index=index).identify_contact(email, phone_number)
+            
+            assert counter.commits == 1, (email, phone_number, counter.statements)
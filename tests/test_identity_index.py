@@ -0,0 +1,97 @@
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.services.identity_index import IdentityIndex
+from app.services.identity_service import IdentityService
+
+class TestIdentityIndex:
+    def test_union_find_resolves_to_cluster_primary(self):
+        """Test that merged clusters resolve every identifier to the older primary
+
+        Union-by-rank may pick either node as the set root, but the recorded
+        primary must always be the surviving (older) primary contact.
+        """
+        index = IdentityIndex()
+        index.add_contact(1, "first@example.com", "111", 1)
+        index.add_contact(2, "second@example.com", "222", 2)
+        index.add_contact(3, "third@example.com", "222", 2)
+
+        index.merge(1, 2)
+
+        assert index.primary_for_email("FIRST@example.com") == 1
+        assert index.primary_for_email("third@example.com") == 1
+        assert index.primary_for_phone("222") == 1
+        assert index.contact_for_pair("second@example.com", "222") == 2
+        assert index.contact_for_pair("second@example.com", "111") is None
+        assert index.primary_for_email("unknown@example.com") is None
+
+    @pytest.mark.asyncio
+    async def test_hydrate_from_contacts_table(self, db_session: AsyncSession):
+        """Test rebuilding the index from rows written by the SQL path"""
+        service = IdentityService(db_session)
+        first = await service.identify_contact("first@example.com", "1111111111")
+        await service.identify_contact("second@example.com", "2222222222")
+        await service.identify_contact("first@example.com", "2222222222")
+
+        index = IdentityIndex()
+        await index.hydrate(db_session)
+
+        assert index.ready
+        assert index.primary_for_email("second@example.com") == first.contact.primaryContatctId
+        assert index.primary_for_phone("2222222222") == first.contact.primaryContatctId
+
+    @pytest.mark.asyncio
+    async def test_index_path_matches_sql_path(self, db_session: AsyncSession):
+        """Test that the index-backed read side gives the same answers
+
+        Runs the four scenarios through a service backed by a hydrated index
+        and checks the consolidated responses.
+        """
+        index = IdentityIndex()
+        await index.hydrate(db_session)
+        service = IdentityService(db_session, index=index)
+
+        first = await service.identify_contact("first@example.com", "1111111111")
+        second = await service.identify_contact("second@example.com", "2222222222")
+        partial = await service.identify_contact("first@example.com", "3333333333")
+        exact = await service.identify_contact("first@example.com", "3333333333")
+        merged = await service.identify_contact("second@example.com", "1111111111")
+
+        primary_id = first.contact.primaryContatctId
+        assert partial.contact.primaryContatctId == primary_id
+        assert exact.contact == partial.contact
+        assert merged.contact.primaryContatctId == primary_id
+        assert merged.contact.emails == ["first@example.com", "second@example.com"]
+        assert merged.contact.phoneNumbers == ["1111111111", "2222222222", "3333333333"]
+        assert second.contact.primaryContatctId in merged.contact.secondaryContactIds
+        assert index.primary_for_phone("2222222222") == primary_id
+
+    @pytest.mark.asyncio
+    async def test_stale_primary_falls_back_to_sql(self, db_session: AsyncSession):
+        """Test that a write the index believes goes to a primary that was merged away uses the SQL path"""
+        await IdentityService(db_session).identify_contact("doc@example.com", "1111111111")
+        await IdentityService(db_session).identify_contact("marty@example.com", "2222222222")
+        index = IdentityIndex()
+        await index.hydrate(db_session)
+        # Merged by a writer that doesn't update this index
+        await IdentityService(db_session).identify_contact("doc@example.com", "2222222222")
+        assert index.primary_for_email("marty@example.com") == 2
+
+        partial = await IdentityService(db_session, index=index).identify_contact("marty@example.com", "3333333333")
+        merged = await IdentityService(db_session, index=index).identify_contact("marty@example.com", "1111111111")
+
+        assert partial.contact.primaryContatctId == merged.contact.primaryContatctId == 1
+        assert partial.contact.secondaryContactIds == [2, 3]
+        assert merged.contact.phoneNumbers == ["1111111111", "2222222222", "3333333333"]
+
+    @pytest.mark.asyncio
+    async def test_miss_is_rechecked_when_another_process_wrote(self, db_session: AsyncSession):
+        """Test that two processes with their own index don't both create a primary for one email"""
+        first_process, second_process = IdentityIndex(), IdentityIndex()
+        await first_process.hydrate(db_session)
+        await second_process.hydrate(db_session)
+
+        first = await IdentityService(db_session, index=first_process).identify_contact("a@example.com", "1")
+        second = await IdentityService(db_session, index=second_process).identify_contact("a@example.com", "2")
+
+        assert second.contact.primaryContatctId == first.contact.primaryContatctId
+        assert second.contact.phoneNumbers == ["1", "2"]
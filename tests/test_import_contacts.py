@@ -0,0 +1,115 @@
+import json
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+from app.cli import import_contacts as importer
+from app.cli.import_contacts import import_contacts, load_chunk_index
+from app.models.contact import Base, Contact
+
+class TestImportContacts:
+    def test_import_builds_clusters_like_identify(self, tmp_path):
+        """Test that a CSV import follows the identify_contact scenarios
+
+        Covers a new primary, a partial match, an exact repeat and a merge of
+        two primaries where the older one survives.
+        """
+        database_url = f"sqlite:///{tmp_path / 'import.db'}"
+        engine = create_engine(database_url)
+        Base.metadata.create_all(engine)
+
+        source = tmp_path / "orders.csv"
+        source.write_text(
+            "email,phoneNumber,timestamp\n"
+            "first@example.com,111,2021-01-01T00:00:00Z\n"
+            "FIRST@example.com,333,2021-01-02T00:00:00Z\n"
+            "first@example.com,333,2021-01-03T00:00:00Z\n"
+            "second@example.com,222,2021-01-04T00:00:00Z\n"
+            "second@example.com,111,2021-01-05T00:00:00Z\n"
+        )
+
+        assert import_contacts(str(source), database_url, chunk_size=2) == 5
+
+        with Session(engine) as session:
+            contacts = session.scalars(select(Contact).order_by(Contact.id)).all()
+        assert [(c.email, c.phone_number, c.link_precedence, c.linked_id) for c in contacts] == [
+            ("first@example.com", "111", "primary", None),
+            ("first@example.com", "333", "secondary", 1),
+            ("second@example.com", "222", "secondary", 1),
+        ]
+        engine.dispose()
+
+    def test_resume_from_checkpoint(self, tmp_path):
+        """Test that a second run only processes records after the checkpoint"""
+        database_url = f"sqlite:///{tmp_path / 'import.db'}"
+        engine = create_engine(database_url)
+        Base.metadata.create_all(engine)
+
+        source = tmp_path / "orders.ndjson"
+        source.write_text("\n".join(json.dumps(record) for record in [
+            {"email": "a@example.com", "phoneNumber": "1", "timestamp": "2020-01-01T00:00:00"},
+            {"email": "b@example.com", "phoneNumber": "2", "timestamp": "2020-01-02T00:00:00"},
+        ]) + "\n")
+        import_contacts(str(source), database_url)
+
+        with open(source, "a") as handle:
+            handle.write(json.dumps({"email": "c@example.com", "phoneNumber": "2",
+                                     "timestamp": "2020-01-03T00:00:00"}) + "\n")
+        assert import_contacts(str(source), database_url) == 3
+
+        checkpoint = json.loads((tmp_path / "orders.ndjson.checkpoint").read_text())
+        assert checkpoint["records_done"] == 3
+        with Session(engine) as session:
+            contacts = session.scalars(select(Contact).order_by(Contact.id)).all()
+        assert [(c.email, c.linked_id) for c in contacts] == [
+            ("a@example.com", None), ("b@example.com", None), ("c@example.com", 2)
+        ]
+        engine.dispose()
+
+    def test_rows_inserted_during_the_import_keep_their_ids(self, tmp_path, monkeypatch):
+        """Each chunk picks its ids when it starts, past rows the service wrote since the last one"""
+        database_url = f"sqlite:///{tmp_path / 'import.db'}"
+        engine = create_engine(database_url)
+        Base.metadata.create_all(engine)
+        save_checkpoint = importer.save_checkpoint
+
+        def save_and_insert(checkpoint_path, source_path, records_done):
+            save_checkpoint(checkpoint_path, source_path, records_done)
+            with Session(engine) as session:
+                session.add(Contact(email=f"live{records_done}@example.com", link_precedence="primary"))
+                session.commit()
+
+        monkeypatch.setattr(importer, "save_checkpoint", save_and_insert)
+        source = tmp_path / "orders.csv"
+        source.write_text(
+            "email,phoneNumber,timestamp\n"
+            "a@example.com,1,2020-01-01T00:00:00Z\n"
+            "b@example.com,2,2020-01-02T00:00:00Z\n"
+        )
+        assert import_contacts(str(source), database_url, chunk_size=1) == 2
+
+        with Session(engine) as session:
+            emails = session.scalars(select(Contact.email).order_by(Contact.id)).all()
+        assert emails == ["a@example.com", "live1@example.com", "b@example.com", "live2@example.com"]
+        engine.dispose()
+
+    def test_chunk_loads_only_touched_clusters(self, tmp_path):
+        """Test that a chunk is resolved against the clusters it touches, not the whole table"""
+        database_url = f"sqlite:///{tmp_path / 'import.db'}"
+        engine = create_engine(database_url)
+        Base.metadata.create_all(engine)
+
+        source = tmp_path / "orders.csv"
+        source.write_text("email,phoneNumber,timestamp\n" + "".join(
+            f"user{number}@example.com,{number},2021-01-01T00:00:{number:02d}Z\n" for number in range(10)
+        ) + "user0@example.com,100,2021-01-02T00:00:00Z\n")
+        import_contacts(str(source), database_url, chunk_size=4)
+
+        with engine.connect() as connection:
+            index, primary_created_at = load_chunk_index(connection, [
+                ("user0@example.com", "7", None),
+                ("new@example.com", None, None),
+            ])
+        assert len(index) == 3
+        assert set(primary_created_at) == {1, 8}
+        assert index.primary_for_phone("100") == 1
+        assert index.primary_for_email("user5@example.com") is None
+        engine.dispose()
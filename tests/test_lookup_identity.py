@@ -0,0 +1,88 @@
+import pytest
+from httpx import AsyncClient, ASGITransport
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import get_db, StatementCounter
+from app.main import app
+from app.services.contact_cache import ContactCache, InMemoryCacheBackend, get_contact_cache
+from app.services.identity_index import IdentityIndex, get_identity_index
+from app.models.contact import Contact
+from app.services.contact_graph import ContactGraph
+from app.services.identity_service import IdentityService, IdentifiersConflict, BrokenContactLink
+
+class TestLookupIdentity:
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("with_index", [False, True])
+    async def test_lookup_matches_identify_without_writing(self, db_session: AsyncSession, with_index: bool):
+        """Test that lookups return the identify response and issue only SELECTs"""
+        await IdentityService(db_session).identify_contact("first@example.com", "1111111111")
+        expected = await IdentityService(db_session).identify_contact("second@example.com", "1111111111")
+        await IdentityService(db_session).identify_contact("other@example.com", "2222222222")
+        index = None
+        if with_index:
+            index = IdentityIndex()
+            await index.hydrate(db_session)
+
+        service = IdentityService(db_session, index=index)
+        with StatementCounter(db_session.bind, 3, max_commits=0) as counter:
+            found = await service.lookup_contact("SECOND@example.com", None)
+            unknown = await service.lookup_contact("new@example.com", "3333333333")
+            with pytest.raises(IdentifiersConflict):
+                await service.lookup_contact("first@example.com", "2222222222")
+
+        assert found == expected
+        assert unknown is None
+        assert all(query.lstrip().upper().startswith(("SELECT", "WITH")) for query in counter.statements)
+        assert not db_session.new and not db_session.dirty
+
+    @pytest.mark.asyncio
+    async def test_cache_hit_skips_database(self, db_session: AsyncSession):
+        """Test that a cached cluster is served without any SQL"""
+        cache = ContactCache(InMemoryCacheBackend())
+        expected = await IdentityService(db_session, cache=cache).identify_contact("test@example.com", "1234567890")
+        await IdentityService(db_session, cache=cache).lookup_contact("test@example.com", "1234567890")
+
+        with StatementCounter(db_session.bind, 0):
+            found = await IdentityService(db_session, cache=cache).lookup_contact("test@example.com", None)
+        assert found == expected
+
+    @pytest.mark.asyncio
+    async def test_endpoint(self, db_session: AsyncSession):
+        """GET /api/identity answers 200, 404, 409 and 422 without creating contacts"""
+        await IdentityService(db_session).identify_contact("known@example.com", "1111111111")
+        await IdentityService(db_session).identify_contact("other@example.com", "2222222222")
+        db_session.add(Contact(email="orphan@example.com", linked_id=9999, link_precedence="secondary"))
+        await db_session.commit()
+
+        async def override_get_db():
+            yield db_session
+
+        app.dependency_overrides[get_db] = override_get_db
+        app.dependency_overrides[get_identity_index] = lambda: None
+        app.dependency_overrides[get_contact_cache] = lambda: None
+        try:
+            async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+                found = await client.get("/api/identity", params={"phone": "1111111111"})
+                missing = await client.get("/api/identity", params={"email": "new@example.com"})
+                conflict = await client.get("/api/identity", params={"email": "known@example.com", "phone": "2222222222"})
+                empty = await client.get("/api/identity")
+                orphan = await client.get("/api/identity", params={"email": "orphan@example.com"})
+                missing_again = await client.get("/api/identity", params={"email": "new@example.com"})
+        finally:
+            app.dependency_overrides.clear()
+
+        assert found.status_code == 200
+        assert found.json()["contact"]["emails"] == ["known@example.com"]
+        assert missing.status_code == 404 and missing_again.status_code == 404
+        assert conflict.status_code == 409
+        assert empty.status_code == 422
+        # A secondary whose primary is gone is never part of a loaded cluster
+        assert orphan.status_code == 404
+
+    def test_broken_link_is_not_a_conflict(self):
+        """A chain that leaves the loaded graph is a data error, not an identifier conflict"""
+        orphan = Contact(id=2, email="orphan@example.com", linked_id=1, link_precedence="secondary")
+        graph = ContactGraph([orphan], ["orphan@example.com"], [])
+
+        with pytest.raises(BrokenContactLink) as excinfo:
+            IdentityService._matched_primary_ids(graph, "orphan@example.com", None)
+        assert not isinstance(excinfo.value, ValueError)
@@ -0,0 +1,77 @@
+import time
+import pytest
+from httpx import AsyncClient, ASGITransport
+from sqlalchemy.ext.asyncio import AsyncSession
+from app import metrics
+from app.main import app
+from app.metrics import Histogram, count_statements, observe_identify, track_request
+from app.services.identity_service import IdentityService
+
+class TestMetrics:
+    @pytest.mark.asyncio
+    async def test_identify_records_scenarios_and_sql(self, db_session: AsyncSession):
+        """Each scenario gets its latency, SQL statement and commit observations"""
+        count_statements(db_session.bind)
+        before = {s: metrics.IDENTIFY_DURATION.count(s) for s in "ABCD"}
+        statements_before = metrics.STATEMENTS_PER_REQUEST.sum("A")
+        commits_before = metrics.COMMITS_PER_REQUEST.sum("A")
+        steps_before = metrics.STEP_DURATION.count("get_consolidated_contact")
+
+        orders = [
+            ("A", "first@example.com", "1111111111"),
+            ("B", "first@example.com", "3333333333"),
+            ("C", "first@example.com", "1111111111"),
+            ("A", "second@example.com", "2222222222"),
+            ("D", "first@example.com", "2222222222"),
+        ]
+        for scenario, email, phone_number in orders:
+            service = IdentityService(db_session)
+            await service.identify_contact(email, phone_number)
+            assert service.scenario == scenario
+
+        assert {s: metrics.IDENTIFY_DURATION.count(s) - before[s] for s in "ABCD"} == {"A": 2, "B": 1, "C": 1, "D": 1}
+        assert metrics.STATEMENTS_PER_REQUEST.sum("A") - statements_before >= 2
+        assert metrics.COMMITS_PER_REQUEST.sum("A") - commits_before == 2
+        assert metrics.STEP_DURATION.count("get_consolidated_contact") - steps_before == 5
+
+    @pytest.mark.asyncio
+    async def test_metrics_endpoint(self, db_session: AsyncSession):
+        """/metrics serves the Prometheus text format including pool gauges"""
+        await IdentityService(db_session).identify_contact("first@example.com", "1111111111")
+
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+            response = await client.get("/metrics")
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+        body = response.text
+        assert "# TYPE identify_request_duration_seconds histogram" in body
+        assert 'identify_request_duration_seconds_bucket{scenario="A",le="+Inf"}' in body
+        assert 'identify_step_duration_seconds_count{step="find_matching_contacts"}' in body
+        assert "identify_cluster_size_count" in body
+        assert "db_pool_checkouts" in body
+
+    def test_instrumentation_overhead(self):
+        """Recording one request's metrics should cost only a few microseconds"""
+        histogram = Histogram("overhead_seconds", "test", metrics.LATENCY_BUCKETS, ("step",))
+        iterations = 20000
+
+        started = time.perf_counter()
+        for _ in range(iterations):
+            with track_request() as stats:
+                step_started = time.perf_counter()
+                histogram.observe(time.perf_counter() - step_started, "find_matching_contacts")
+            observe_identify("C", 0.001, stats, 3)
+        per_request = (time.perf_counter() - started) / iterations
+
+        assert per_request < 20e-6
+
+    def test_missing_scenario_gets_a_label(self):
+        """A call without a recorded scenario is counted as unknown, not as None"""
+        before = metrics.IDENTIFY_DURATION.count(metrics.UNKNOWN_SCENARIO)
+        with track_request() as stats:
+            pass
+        observe_identify(None, 0.001, stats, 1)
+
+        assert metrics.IDENTIFY_DURATION.count(metrics.UNKNOWN_SCENARIO) - before == 1
+        assert 'scenario="None"' not in metrics.registry.render()
@@ -0,0 +1,170 @@
+import pytest
+import pytest_asyncio
+from httpx import AsyncClient, ASGITransport
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from app.main import app
+from app.models.contact import Contact
+from app.models.directory import IdentifierEntry, ShardMigration
+from app.services.identity_service import IdentityService
+from app.services.sharding import ShardCoordinator, get_shard_coordinator
+
+
+@pytest_asyncio.fixture
+async def coordinator(tmp_path):
+    """Three shards and a directory, each its own SQLite file"""
+    engines = [create_async_engine(f"sqlite+aiosqlite:///{tmp_path / name}.db") for name in
+               ("shard0", "shard1", "shard2", "directory")]
+    factories = [async_sessionmaker(engine, expire_on_commit=False) for engine in engines]
+    coordinator = ShardCoordinator(factories[:3], factories[3], id_block_size=10)
+    await coordinator.create_schema()
+    yield coordinator
+    for engine in engines:
+        await engine.dispose()
+
+
+async def _contact_ids(coordinator: ShardCoordinator, shard: int) -> list:
+    async with coordinator.shards[shard]() as db:
+        return list((await db.execute(select(Contact.id).order_by(Contact.id))).scalars().all())
+
+
+async def _migration_states(coordinator: ShardCoordinator) -> list:
+    async with coordinator.directory() as db:
+        return list((await db.execute(select(ShardMigration.state))).scalars().all())
+
+
+class TestShardCoordinator:
+    @pytest.mark.asyncio
+    async def test_answers_like_the_unsharded_service(self, coordinator: ShardCoordinator, db_session: AsyncSession):
+        """Every scenario, including merges on one and across two shards, gives the same responses"""
+        requests = [
+            ("doc@example.com", "1111111111"),
+            ("marty@example.com", "2222222222"),
+            ("doc@example.com", "3333333333"),
+            ("biff@example.com", "4444444444"),
+            ("marty@example.com", "1111111111"),
+            ("biff@example.com", "3333333333"),
+            ("MARTY@example.com", None),
+        ]
+        for email, phone in requests:
+            expected = await IdentityService(db_session).identify_contact(email, phone)
+            assert await coordinator.identify(email, phone) == expected
+
+        # Contacts 1 and 2 share a shard; 4 was moved over from another one
+        assert coordinator.shard_for(1) == coordinator.shard_for(2) != coordinator.shard_for(4)
+        assert await _migration_states(coordinator) == ["done"]
+        assert await _contact_ids(coordinator, coordinator.shard_for(1)) == [1, 2, 3, 4]
+        assert await _contact_ids(coordinator, coordinator.shard_for(4)) == []
+
+        lookup = await coordinator.lookup("biff@example.com", None)
+        assert lookup == await IdentityService(db_session).lookup_contact("biff@example.com", None)
+        assert await coordinator.lookup("nobody@example.com", None) is None
+
+    @pytest.mark.asyncio
+    async def test_new_clusters_are_placed_by_primary_id(self, coordinator: ShardCoordinator):
+        """Each primary and its secondaries live on the shard its id hashes to"""
+        for number in range(12):
+            await coordinator.identify(f"user{number}@example.com", f"55500{number}")
+        await coordinator.identify("user0@example.com", "5559999")
+
+        for shard in range(3):
+            async with coordinator.shards[shard]() as db:
+                for contact in (await db.execute(select(Contact))).scalars().all():
+                    assert coordinator.shard_for(contact.linked_id or contact.id) == shard
+        async with coordinator.directory() as db:
+            assert await db.scalar(select(func.count()).select_from(IdentifierEntry)) == 25
+
+    @pytest.mark.asyncio
+    async def test_merge_interrupted_before_the_copy_is_finished_by_the_next_request(
+        self, coordinator: ShardCoordinator, monkeypatch
+    ):
+        """A migration left prepared is rolled forward by a request for the moving cluster"""
+        await coordinator.identify("doc@example.com", "1111111111")
+        await coordinator.identify("marty@example.com", "2222222222")
+        await coordinator.identify("biff@example.com", "4444444444")
+
+        async def crash(migration, source_db):
+            raise RuntimeError("shard went away")
+        monkeypatch.setattr(coordinator, "_copy_and_merge", crash)
+        with pytest.raises(RuntimeError):
+            await coordinator.identify("biff@example.com", "1111111111")
+        assert await _migration_states(coordinator) == ["prepared"]
+        monkeypatch.undo()
+
+        response = await coordinator.lookup("biff@example.com", None)
+        assert response.contact.primaryContatctId == 1
+        assert response.contact.emails == ["doc@example.com", "biff@example.com"]
+        assert await _migration_states(coordinator) == ["done"]
+        assert await _contact_ids(coordinator, coordinator.shard_for(3)) == []
+
+    @pytest.mark.asyncio
+    async def test_merge_interrupted_after_the_copy_is_finished_by_recovery(
+        self, coordinator: ShardCoordinator, monkeypatch
+    ):
+        """A migration left copied only needs the source rows deleted, which recover does"""
+        await coordinator.identify("doc@example.com", "1111111111")
+        await coordinator.identify("marty@example.com", "2222222222")
+        await coordinator.identify("biff@example.com", "4444444444")
+
+        async def crash(migration):
+            raise RuntimeError("shard went away")
+        monkeypatch.setattr(coordinator, "_delete_from_source", crash)
+        with pytest.raises(RuntimeError):
+            await coordinator.identify("biff@example.com", "1111111111")
+        assert await _migration_states(coordinator) == ["copied"]
+        # The directory already points at the merged cluster
+        assert (await coordinator.lookup("biff@example.com", None)).contact.primaryContatctId == 1
+        assert await _contact_ids(coordinator, coordinator.shard_for(3)) == [3]
+        monkeypatch.undo()
+
+        assert await coordinator.recover() == 1
+        assert await coordinator.recover() == 0
+        assert await _migration_states(coordinator) == ["done"]
+        assert await _contact_ids(coordinator, coordinator.shard_for(3)) == []
+        assert await _contact_ids(coordinator, coordinator.shard_for(1)) == [1, 2, 3]
+
+    @pytest.mark.asyncio
+    async def test_request_that_raced_a_migration_starts_over(self, coordinator: ShardCoordinator, monkeypatch):
+        """A request that resolved the cluster before it started moving doesn't write to the source shard"""
+        await coordinator.identify("doc@example.com", "1111111111")
+        await coordinator.identify("marty@example.com", "2222222222")
+        await coordinator.identify("biff@example.com", "4444444444")
+        stale_entries = await coordinator._entries(["email:biff@example.com", "phone:5555555555"])
+
+        async def crash(migration, source_db):
+            raise RuntimeError("shard went away")
+        monkeypatch.setattr(coordinator, "_copy_and_merge", crash)
+        with pytest.raises(RuntimeError):
+            await coordinator.identify("biff@example.com", "1111111111")
+        monkeypatch.undo()
+
+        resolve_entries = coordinator._resolve_entries
+        calls = []
+        async def resolve_before_the_migration(keys):
+            calls.append(keys)
+            return stale_entries if len(calls) == 1 else await resolve_entries(keys)
+        monkeypatch.setattr(coordinator, "_resolve_entries", resolve_before_the_migration)
+
+        response = await coordinator.identify("biff@example.com", "5555555555")
+        assert len(calls) == 2
+        assert response.contact.primaryContatctId == 1
+        assert "5555555555" in response.contact.phoneNumbers
+        assert await _migration_states(coordinator) == ["done"]
+        assert await _contact_ids(coordinator, coordinator.shard_for(3)) == []
+        assert await _contact_ids(coordinator, coordinator.shard_for(1)) == [1, 2, 3, 4]
+
+    @pytest.mark.asyncio
+    async def test_endpoints_writing_to_the_default_database_are_unavailable(self, coordinator: ShardCoordinator):
+        """Batch and erase endpoints answer 501 instead of writing outside the shards"""
+        app.dependency_overrides[get_shard_coordinator] = lambda: coordinator
+        try:
+            async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+                items = {"items": [{"email": "doc@example.com", "phoneNumber": "1111111111"}]}
+                batch = await client.post("/api/identify/batch", json=items)
+                stream = await client.post("/api/identify/batch/stream", json=items)
+                erase = await client.post("/api/contacts/erase", json={"emails": ["doc@example.com"]})
+        finally:
+            app.dependency_overrides.clear()
+
+        assert batch.status_code == stream.status_code == erase.status_code == 501
+        assert await _contact_ids(coordinator, 0) == await _contact_ids(coordinator, 1) == []
@@ -0,0 +1,140 @@
+import multiprocessing
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.services.contact_cache import ContactCache, InMemoryCacheBackend
+from app.services.identity_index import IdentityIndex
+from app.services.identity_service import IdentityService
+from app.services.shared_index import SharedIdentityIndex
+
+
+def _write_from_other_worker(path: str) -> None:
+    """Add a secondary and merge two clusters from a separate process"""
+    index = SharedIdentityIndex(path)
+    index.attach()
+    index.add_contact(1000, "late@example.com", "1111111111", 1)
+    index.merge(1, 3)
+
+
+class TestSharedIdentityIndex:
+    @pytest.mark.asyncio
+    async def test_answers_like_the_process_local_index(self, db_session: AsyncSession, tmp_path):
+        """Hydrated from the same rows, both indexes resolve every identifier alike"""
+        service = IdentityService(db_session)
+        await service.identify_contact("lorraine@hillvalley.edu", "123456")
+        await service.identify_contact("mcfly@hillvalley.edu", "123456")
+        await service.identify_contact("george@hillvalley.edu", "919191")
+        await service.identify_contact("biff@hillvalley.edu", "717171")
+        await service.identify_contact("george@hillvalley.edu", "717171")
+
+        local = IdentityIndex()
+        await local.hydrate(db_session)
+        shared = SharedIdentityIndex(str(tmp_path / "index"), capacity=100)
+        await shared.hydrate(db_session)
+
+        assert shared.ready and len(shared) == len(local) == 4
+        for email in ("lorraine@hillvalley.edu", "MCFLY@hillvalley.edu", "george@hillvalley.edu", "biff@hillvalley.edu"):
+            assert shared.primary_for_email(email) == local.primary_for_email(email)
+        for phone in ("123456", "919191", "717171", "000000"):
+            assert shared.primary_for_phone(phone) == local.primary_for_phone(phone)
+        assert shared.contact_for_pair("george@hillvalley.edu", "717171") == local.contact_for_pair(
+            "george@hillvalley.edu", "717171"
+        )
+        assert shared.contact_for_pair("george@hillvalley.edu", "123456") is None
+
+        shared.merge(1, 3)
+        local.merge(1, 3)
+        assert shared.primary_for_phone("717171") == local.primary_for_phone("717171") == 1
+        shared.detach()
+
+    @pytest.mark.asyncio
+    async def test_identify_with_shared_index(self, db_session: AsyncSession, tmp_path):
+        """The service runs all four scenarios on the shared index with the same results"""
+        shared = SharedIdentityIndex(str(tmp_path / "index"), capacity=100)
+        await shared.hydrate(db_session)
+        service = IdentityService(db_session, index=shared)
+
+        first = await service.identify_contact("doc@example.com", "1111111111")
+        await service.identify_contact("marty@example.com", "2222222222")
+        partial = await IdentityService(db_session, index=shared).identify_contact("doc@example.com", "3333333333")
+        merged = await IdentityService(db_session, index=shared).identify_contact("marty@example.com", "1111111111")
+        exact = await IdentityService(db_session, index=shared).identify_contact("doc@example.com", "3333333333")
+
+        primary_id = first.contact.primaryContatctId
+        assert partial.contact.primaryContatctId == merged.contact.primaryContatctId == primary_id
+        assert merged.contact.emails == ["doc@example.com", "marty@example.com"]
+        assert exact == await IdentityService(db_session).identify_contact("doc@example.com", "3333333333")
+        shared.detach()
+
+    @pytest.mark.asyncio
+    async def test_other_workers_writes_are_seen_and_evict_the_cache(self, db_session: AsyncSession, tmp_path):
+        """Writes from another process show up at once and evict this worker's cached clusters"""
+        for email, phone in (("one@example.com", "1111111111"), ("two@example.com", "2222222222"),
+                             ("three@example.com", "3333333333")):
+            await IdentityService(db_session).identify_contact(email, phone)
+        path = str(tmp_path / "index")
+        shared = SharedIdentityIndex(path, capacity=100)
+        await shared.hydrate(db_session)
+        cache = ContactCache(InMemoryCacheBackend())
+        await IdentityService(db_session, index=shared, cache=cache).lookup_contact("three@example.com", None)
+        assert await cache.get(3) is not None
+
+        process = multiprocessing.get_context("fork").Process(target=_write_from_other_worker, args=(path,))
+        process.start()
+        process.join(10)
+        assert process.exitcode == 0
+
+        assert shared.primary_for_email("late@example.com") == 1
+        assert shared.primary_for_email("three@example.com") == 1
+        await IdentityService(db_session, index=shared, cache=cache).lookup_contact("two@example.com", None)
+        assert await cache.get(3) is None
+        assert shared.changed_primaries() == []
+        shared.detach()
+
+    @pytest.mark.asyncio
+    async def test_miss_is_rechecked_in_sql(self, db_session: AsyncSession, tmp_path):
+        """A contact another worker committed but hasn't indexed yet is matched, not duplicated"""
+        shared = SharedIdentityIndex(str(tmp_path / "index"), capacity=100)
+        await shared.hydrate(db_session)
+        # Committed by "another worker" whose index update hasn't landed yet
+        await IdentityService(db_session).identify_contact("doc@example.com", "1111111111")
+        assert shared.primary_for_email("doc@example.com") is None
+
+        response = await IdentityService(db_session, index=shared).identify_contact("doc@example.com", "2222222222")
+
+        assert response.contact.primaryContatctId == 1
+        assert response.contact.secondaryContactIds == [2]
+        assert shared.primary_for_phone("2222222222") == 1
+        shared.detach()
+
+    @pytest.mark.asyncio
+    async def test_split_forgets_erased_identifiers(self, db_session: AsyncSession, tmp_path):
+        """After a split, erased identifiers read as absent and survivors resolve to their new primaries"""
+        shared = SharedIdentityIndex(str(tmp_path / "index"), capacity=100)
+        shared.attach()
+        shared.add_contact(1, "doc@example.com", "1111111111", 1)
+        shared.add_contact(2, "marty@example.com", "2222222222", 1)
+        shared.add_contact(3, "emmett@example.com", "1111111111", 1)
+        shared.changed_primaries()
+
+        shared.split([(1, "doc@example.com", "1111111111")],
+                     [(2, "marty@example.com", "2222222222", 2), (3, "emmett@example.com", "1111111111", 3)])
+
+        assert shared.primary_for_email("doc@example.com") is None
+        assert shared.primary_of(1) is None
+        assert shared.contact_for_pair("doc@example.com", "1111111111") is None
+        assert shared.primary_for_phone("1111111111") == shared.primary_for_email("emmett@example.com") == 3
+        assert shared.primary_for_email("marty@example.com") == 2
+        assert len(shared) == 2
+        shared.detach()
+
+    @pytest.mark.asyncio
+    async def test_full_index_falls_back_to_sql(self, db_session: AsyncSession, tmp_path):
+        """A table too small for the contacts never reports ready"""
+        for number in range(10):
+            await IdentityService(db_session).identify_contact(f"user{number}@example.com", f"55500{number}")
+        shared = SharedIdentityIndex(str(tmp_path / "index"), capacity=1)
+
+        with pytest.raises(RuntimeError):
+            await shared.hydrate(db_session)
+        assert not shared.ready
+        shared.detach()
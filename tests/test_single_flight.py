@@ -0,0 +1,67 @@
+import asyncio
+import pytest
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from app.models.contact import Contact
+from app.services.identity_service import IdentityService
+from app.services.single_flight import SingleFlight
+
+class TestSingleFlight:
+    @pytest.mark.asyncio
+    async def test_followers_share_result_and_errors(self):
+        """Concurrent calls with one key run the work once; errors reach every caller"""
+        flights = SingleFlight()
+        runs = []
+
+        async def work():
+            runs.append(1)
+            await asyncio.sleep(0.01)
+            return "result"
+
+        async def failing():
+            await asyncio.sleep(0.01)
+            raise ValueError("boom")
+
+        results = await asyncio.gather(*[flights.do("key", work) for _ in range(5)], flights.do("other", work))
+        assert results == ["result"] * 6
+        assert len(runs) == 2
+        assert flights.stats()["coalescing_ratio"] == round(4 / 6, 6)
+
+        errors = await asyncio.gather(*[flights.do("bad", failing) for _ in range(3)], return_exceptions=True)
+        assert all(isinstance(error, ValueError) for error in errors)
+        assert len(flights) == 0
+
+    @pytest.mark.asyncio
+    async def test_follower_takes_over_from_cancelled_leader(self):
+        """A cancelled leader doesn't cancel the calls waiting on it"""
+        flights = SingleFlight()
+
+        async def work():
+            await asyncio.sleep(0.01)
+            return "result"
+
+        leader = asyncio.create_task(flights.do("key", work))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flights.do("key", work))
+        await asyncio.sleep(0)
+        leader.cancel()
+
+        assert await follower == "result"
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+
+    @pytest.mark.asyncio
+    async def test_identical_identify_calls_run_once(self, db_session: AsyncSession):
+        """A burst of identical identify calls creates one contact and shares its response"""
+        session_factory = async_sessionmaker(db_session.bind, expire_on_commit=False)
+        flights = SingleFlight()
+
+        async def identify():
+            async with session_factory() as db:
+                return await IdentityService(db, flights=flights).identify_contact("Retry@example.com", "1234567890")
+
+        responses = await asyncio.gather(*[identify() for _ in range(10)])
+
+        assert all(response == responses[0] for response in responses)
+        assert flights.leaders == 1 and flights.followers == 9
+        assert await db_session.scalar(select(func.count()).select_from(Contact)) == 1
@@ -0,0 +1,68 @@
+import pytest
+from httpx import AsyncClient, ASGITransport
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from app.main import app
+from app.database import StatementCounter
+from app.services.contact_cache import ContactCache, InMemoryCacheBackend
+from app.services.identity_service import IdentityService
+from app.startup import StartupReport, alembic_head_revisions, check_schema_version, run_warmup, startup_report
+
+class TestStartup:
+    @pytest.mark.asyncio
+    async def test_schema_version_check(self, db_session: AsyncSession):
+        """The check tells unversioned, current and outdated databases apart"""
+        engine = db_session.bind
+        (head,) = alembic_head_revisions()
+
+        assert await check_schema_version(engine) == "unmigrated"
+        assert await check_schema_version(engine, create_if_unversioned=True) == "unversioned"
+        try:
+            async with engine.begin() as conn:
+                await conn.execute(text("CREATE TABLE alembic_version (version_num VARCHAR(32) NOT NULL)"))
+                await conn.execute(text("INSERT INTO alembic_version VALUES (:head)"), {"head": head})
+            assert await check_schema_version(engine) == "current"
+
+            async with engine.begin() as conn:
+                await conn.execute(text("UPDATE alembic_version SET version_num = '3f9c2a7d41b6'"))
+            assert await check_schema_version(engine) == "outdated"
+        finally:
+            async with engine.begin() as conn:
+                await conn.execute(text("DROP TABLE alembic_version"))
+
+    @pytest.mark.asyncio
+    async def test_warmup_times_phases_and_prefills_cache(self, db_session: AsyncSession):
+        """Warm-up records every phase, fills the cache and only then reports ready"""
+        response = await IdentityService(db_session).identify_contact("test@example.com", "1234567890")
+        session_factory = async_sessionmaker(db_session.bind, expire_on_commit=False)
+        cache = ContactCache(InMemoryCacheBackend())
+        report = StartupReport()
+        report.schema_status = "current"
+
+        assert not report.ready
+        await run_warmup(report, session_factory, 2, cache=cache, cache_clusters=10)
+
+        assert report.ready
+        assert set(report.phases) == {"warm_pool", "prefill_cache"}
+        with StatementCounter(db_session.bind, 0):
+            cached = await cache.get(response.contact.primaryContatctId)
+        assert cached == response.contact
+
+        outdated = StartupReport()
+        outdated.schema_status = "outdated"
+        await run_warmup(outdated, session_factory, 1)
+        assert not outdated.ready
+
+    @pytest.mark.asyncio
+    async def test_ready_endpoint(self, monkeypatch):
+        """/ready answers 503 until warm-up is done, while /health always answers"""
+        monkeypatch.setattr(startup_report, "ready", False)
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+            starting = await client.get("/ready")
+            health = await client.get("/health")
+            monkeypatch.setattr(startup_report, "ready", True)
+            ready = await client.get("/ready")
+
+        assert starting.status_code == 503 and starting.json()["status"] == "starting"
+        assert health.status_code == 200
+        assert ready.status_code == 200 and ready.json()["status"] == "ready"
@@ -0,0 +1,126 @@
+import asyncio
+import pytest
+from httpx import AsyncClient, ASGITransport
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from app.database import get_db, get_read_session_factory, StatementCounter, StatementBudgetExceeded
+from app.main import app
+from app.metrics import SQLStatsHeaders
+from app.models.contact import Contact
+from app.services.contact_cache import get_contact_cache
+from app.services.identity_index import IdentityIndex, get_identity_index
+from app.services.identity_service import IdentityService
+from datetime import datetime, timedelta
+
+class TestStatementBudget:
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("use_index", [False, True])
+    async def test_merge_cost_does_not_grow_with_cluster_size(self, db_session: AsyncSession, use_index: bool):
+        """Merging a primary with many secondaries re-links them in one UPDATE"""
+        async def merge_with_secondaries(name: str, secondaries: int) -> int:
+            await IdentityService(db_session).identify_contact(f"{name}-old@example.com", f"{name}-1")
+            await IdentityService(db_session).identify_contact(f"{name}-new@example.com", f"{name}-2")
+            for number in range(secondaries):
+                await IdentityService(db_session).identify_contact(f"{name}-new@example.com", f"{name}-3-{number}")
+
+            index = IdentityIndex()
+            if use_index:
+                await index.hydrate(db_session)
+            with StatementCounter(db_session.bind, 11, max_commits=1) as counter:
+                result = await IdentityService(db_session, index=index).identify_contact(
+                    f"{name}-old@example.com", f"{name}-2"
+                )
+
+            assert len(result.contact.secondaryContactIds) == secondaries + 1
+            linked_ids = set(await db_session.scalars(
+                select(Contact.linked_id).where(Contact.email == f"{name}-new@example.com")
+            ))
+            assert linked_ids == {result.contact.primaryContatctId}
+            return counter.count
+
+        small = await merge_with_secondaries("small", 0)
+        large = await merge_with_secondaries("large", 20)
+        # Only the re-link UPDATE itself may be skipped for an empty cluster
+        assert large <= small + 1
+
+    @pytest.mark.asyncio
+    async def test_primary_of_deep_chain_is_one_query(self, db_session: AsyncSession):
+        """Resolving a secondary at the end of a long chain loads the chain in one statement
+
+        The first resolution also flattens the chain, which costs a few more
+        statements once; after that the same lookup is a single query.
+        """
+        now = datetime.utcnow()
+        contact = Contact(email="root@example.com", link_precedence="primary", created_at=now)
+        db_session.add(contact)
+        await db_session.flush()
+        root_id = contact.id
+        for depth in range(1, 6):
+            contact = Contact(email=f"hop{depth}@example.com", linked_id=contact.id,
+                              link_precedence="secondary", created_at=now + timedelta(seconds=depth))
+            db_session.add(contact)
+            await db_session.flush()
+        await db_session.commit()
+
+        service = IdentityService(db_session)
+        with StatementCounter(db_session.bind, 6):
+            primary = await service.get_primary_contact(contact.id)
+            await service.commit()
+        assert primary.id == root_id
+
+        with StatementCounter(db_session.bind, 1):
+            primary = await IdentityService(db_session).get_primary_contact(contact.id)
+        assert primary.id == root_id
+
+    @pytest.mark.asyncio
+    async def test_budget_failures_and_task_isolation(self, db_session: AsyncSession):
+        """Exceeding a budget fails with the offending SQL; other tasks are not counted"""
+        @StatementCounter(db_session.bind, 1)
+        async def two_queries():
+            await db_session.execute(select(Contact.id))
+            await db_session.execute(select(Contact.email))
+
+        with pytest.raises(StatementBudgetExceeded, match="2 SQL statements issued, budget is 1") as excinfo:
+            await two_queries()
+        assert "contacts.email" in str(excinfo.value)
+
+        async def other_request():
+            async with db_session.bind.connect() as conn:
+                for _ in range(5):
+                    await conn.execute(select(Contact.id))
+
+        other = asyncio.create_task(other_request())
+        with StatementCounter(db_session.bind, 0) as counter:
+            await other
+        assert counter.count == 0
+
+        with pytest.raises(StatementBudgetExceeded, match="1 commits issued, budget is 0"):
+            with StatementCounter(db_session.bind, max_commits=0):
+                await IdentityService(db_session).identify_contact("a@example.com", "1")
+
+    @pytest.mark.asyncio
+    async def test_sql_stats_headers(self, db_session: AsyncSession):
+        """The opt-in middleware reports statements and commits, except on streamed responses"""
+        async def override_get_db():
+            yield db_session
+
+        session_factory = async_sessionmaker(db_session.bind, expire_on_commit=False)
+        app.dependency_overrides[get_db] = override_get_db
+        app.dependency_overrides[get_read_session_factory] = lambda: session_factory
+        app.dependency_overrides[get_identity_index] = lambda: None
+        app.dependency_overrides[get_contact_cache] = lambda: None
+        try:
+            transport = ASGITransport(app=SQLStatsHeaders(app))
+            async with AsyncClient(transport=transport, base_url="http://test") as client:
+                response = await client.post("/api/identify", json={"email": "a@example.com", "phoneNumber": "1"})
+                streamed = await client.get("/api/contacts/export")
+        finally:
+            app.dependency_overrides.clear()
+
+        assert response.status_code == 200
+        assert response.headers["X-SQL-Statements"] == "3"
+        assert response.headers["X-SQL-Commits"] == "1"
+        assert streamed.status_code == 200
+        assert "X-SQL-Statements" not in streamed.headers
+        # Off unless SQL_STATS_HEADERS is set
+        assert not any(middleware.cls is SQLStatsHeaders for middleware in app.user_middleware)